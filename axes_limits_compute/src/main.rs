@@ -3,6 +3,7 @@ use std::{
     fs::File,
     io::{Read, Write, read_to_string, stdin},
     path::{Path, PathBuf},
+    time::Instant,
 };
 
 use bevy_color::{ColorToComponents, Laba, LinearRgba, Oklaba, Oklcha, Xyza};
@@ -26,7 +27,161 @@ fn max_opt<T: Ord>(lhs: Option<T>, rhs: T) -> Option<T> {
     }
 }
 
+// Whether the color at `voxel` of the `size`³ grid is inside of the sRGB gamut.
+// Voxels outside of the grid are not.
+fn in_gamut(transfer: TransferFunc, size: u32, voxel: [i64; 3]) -> bool {
+    if voxel.iter().any(|&c| c < 0 || c >= size as i64) {
+        return false;
+    }
+    let max_value = size as f32 - 1.0;
+    let color = voxel.map(|c| c as f32 / max_value);
+    !transfer(color).into_iter().any(|x| x < 0.0 || x > 1.0)
+}
+
+const FACE_NEIGHBORS: [[i64; 3]; 6] = [
+    [1, 0, 0],
+    [-1, 0, 0],
+    [0, 1, 0],
+    [0, -1, 0],
+    [0, 0, 1],
+    [0, 0, -1],
+];
+
+fn all_neighbors() -> Vec<[i64; 3]> {
+    let mut result = Vec::with_capacity(26);
+    for x in -1..=1 {
+        for y in -1..=1 {
+            for z in -1..=1 {
+                if [x, y, z] != [0, 0, 0] {
+                    result.push([x, y, z]);
+                }
+            }
+        }
+    }
+    result
+}
+
+fn offset(voxel: [i64; 3], delta: [i64; 3]) -> [i64; 3] {
+    [
+        voxel[0] + delta[0],
+        voxel[1] + delta[1],
+        voxel[2] + delta[2],
+    ]
+}
+
+// In gamut voxels next to an out of gamut one, or to the edge of the grid.
+fn is_boundary(transfer: TransferFunc, size: u32, voxel: [i64; 3]) -> bool {
+    in_gamut(transfer, size, voxel)
+        && FACE_NEIGHBORS
+            .iter()
+            .any(|&delta| !in_gamut(transfer, size, offset(voxel, delta)))
+}
+
+// One bit per voxel of the grid, 135 MB for 1024 segments.
+struct VoxelSet {
+    size: usize,
+    bits: Vec<u64>,
+}
+
+impl VoxelSet {
+    fn new(size: u32) -> Self {
+        let size = size as usize;
+        Self {
+            size,
+            bits: vec![0; (size * size * size).div_ceil(64)],
+        }
+    }
+
+    // Returns whether the voxel wasn't in the set yet, like `HashSet::insert`.
+    fn insert(&mut self, voxel: [i64; 3]) -> bool {
+        let i = (voxel[0] as usize * self.size + voxel[1] as usize) * self.size + voxel[2] as usize;
+        let bit = 1u64 << (i % 64);
+        let inserted = self.bits[i / 64] & bit == 0;
+        self.bits[i / 64] |= bit;
+        inserted
+    }
+}
+
+// Minimum and maximum of both axes of every slice are always reached on the
+// boundary of the gamut, so instead of evaluating all `segments`³ colors of
+// the grid, this walks the boundary voxels only, which are O(segments²).
+//
+// Starting from the boundary voxels found from a coarse lattice, every
+// neighbour of a boundary voxel is tested, breadth first, until no new one is
+// found. Run with `--verify` to compare against evaluating every color.
 fn compute_axes_limits(transfer: TransferFunc, segments: u32) -> Vec<f32> {
+    let size = segments;
+    let neighbors = all_neighbors();
+
+    // Walks from every in gamut voxel of the lattice to the boundary.
+    let step = (size as usize / 8).max(1);
+    let lattice = (0..size as i64)
+        .step_by(step)
+        .flat_map(|x| {
+            (0..size as i64)
+                .step_by(step)
+                .flat_map(move |y| (0..size as i64).step_by(step).map(move |z| [x, y, z]))
+        })
+        .collect::<Vec<_>>();
+    let seeds = lattice
+        .into_par_iter()
+        .filter(|&voxel| in_gamut(transfer, size, voxel))
+        .map(|mut voxel| {
+            while in_gamut(transfer, size, offset(voxel, [1, 0, 0])) {
+                voxel[0] += 1;
+            }
+            voxel
+        })
+        .collect::<Vec<_>>();
+
+    let mut visited = VoxelSet::new(size);
+    let mut frontier = seeds
+        .into_iter()
+        .filter(|&voxel| visited.insert(voxel))
+        .collect::<Vec<_>>();
+
+    // Minimum x, maximum x, minimum y, maximum y of every slice, in voxels.
+    let mut limits = vec![[u32::MAX, 0, u32::MAX, 0]; 3 * size as usize];
+    while !frontier.is_empty() {
+        for voxel in &frontier {
+            let [i, j, k] = voxel.map(|c| c as u32);
+            for (locked_index, locked, x, y) in [(0, i, j, k), (1, j, i, k), (2, k, i, j)] {
+                let data = &mut limits[(locked_index * size + locked) as usize];
+                data[0] = data[0].min(x);
+                data[1] = data[1].max(x);
+                data[2] = data[2].min(y);
+                data[3] = data[3].max(y);
+            }
+        }
+
+        let mut candidates = Vec::new();
+        for voxel in &frontier {
+            for &delta in &neighbors {
+                let neighbor = offset(*voxel, delta);
+                if neighbor.iter().all(|&c| c >= 0 && c < size as i64) && visited.insert(neighbor) {
+                    candidates.push(neighbor);
+                }
+            }
+        }
+        frontier = candidates
+            .into_par_iter()
+            .filter(|&voxel| is_boundary(transfer, size, voxel))
+            .collect();
+    }
+
+    let max_value = size as f32 - 1.0;
+    limits
+        .into_iter()
+        .flat_map(|data| {
+            // Same as the brute force for slices without any color in gamut.
+            let data = if data[0] == u32::MAX { [0; 4] } else { data };
+            data.map(|x| x as f32 / max_value)
+        })
+        .collect()
+}
+
+// Evaluates every color of the grid, only used to verify `compute_axes_limits`.
+fn compute_axes_limits_brute_force(transfer: TransferFunc, segments: u32) -> Vec<f32> {
     let mut result = vec![[0.0f32, 0.0, 0.0, 0.0]; 3 * segments as usize];
     result.par_iter_mut().enumerate().for_each(|(i, data)| {
         let mut min_x = None;
@@ -158,27 +313,213 @@ fn get_axes_limit_segments(plugin: &Path) -> Result<u32, Box<dyn Error>> {
     Ok(u32::from_str_radix(&line[start + 1..].trim(), 10)?)
 }
 
+// Bitwise CRC-32 (IEEE), same as Python's `zlib.crc32`.
+fn crc32(bytes: &[u8]) -> u32 {
+    let mut crc = !0u32;
+    for &byte in bytes {
+        crc ^= byte as u32;
+        for _ in 0..8 {
+            crc = if crc & 1 != 0 {
+                (crc >> 1) ^ 0xEDB8_8320
+            } else {
+                crc >> 1
+            };
+        }
+    }
+    !crc
+}
+
+// One section of the limits file: model name, primary channel and its floats.
+type Section = (String, u8, Vec<u8>);
+
+// Layout is described in `extended_color_selector/axes_limits.py`.
+fn encode_file(segments: u32, sections: &[Section]) -> Vec<u8> {
+    const HEADER_SIZE: usize = 20;
+    const ENTRY_SIZE: usize = 24;
+
+    let mut directory = Vec::new();
+    let mut offset = HEADER_SIZE + sections.len() * ENTRY_SIZE;
+    for (model, primary, data) in sections {
+        let mut name = [0u8; 8];
+        name[..model.len()].copy_from_slice(model.as_bytes());
+        directory.extend_from_slice(&name);
+        directory.extend_from_slice(&[*primary, 0, 0, 0]);
+        directory.extend_from_slice(&(offset as u32).to_le_bytes());
+        directory.extend_from_slice(&(data.len() as u32).to_le_bytes());
+        directory.extend_from_slice(&crc32(data).to_le_bytes());
+        offset += data.len();
+    }
+
+    let mut file = Vec::with_capacity(offset);
+    file.extend_from_slice(b"ECSLIMIT");
+    file.extend_from_slice(&2u16.to_le_bytes());
+    file.push(if cfg!(target_endian = "big") { 1 } else { 0 });
+    file.push(sections.len() as u8);
+    file.extend_from_slice(&segments.to_le_bytes());
+    file.extend_from_slice(&crc32(&directory).to_le_bytes());
+    file.extend_from_slice(&directory);
+    for (_, _, data) in sections {
+        file.extend_from_slice(data);
+    }
+    file
+}
+
+fn read_u32(bytes: &[u8], at: usize) -> Option<u32> {
+    Some(u32::from_le_bytes(bytes.get(at..at + 4)?.try_into().ok()?))
+}
+
+// Sections of an existing version 2 file baked with `segments` in this byte
+// order, or why the file can't be reused.
+fn read_sections(path: &Path, segments: u32) -> Result<Vec<Section>, String> {
+    let bytes = std::fs::read(path).map_err(|e| format!("unable to read it: {}", e))?;
+    let native = if cfg!(target_endian = "big") { 1 } else { 0 };
+    if bytes.len() < 20 || &bytes[..8] != b"ECSLIMIT" {
+        return Err("it has no header".to_string());
+    }
+    if bytes[8..10] != 2u16.to_le_bytes() {
+        return Err("it isn't a version 2 file".to_string());
+    }
+    if bytes[10] & 1 != native {
+        return Err("it was baked in the other byte order".to_string());
+    }
+    let file_segments = read_u32(&bytes, 12).unwrap();
+    if file_segments != segments {
+        return Err(format!(
+            "it was baked with {} segments instead of {}",
+            file_segments, segments
+        ));
+    }
+
+    let count = bytes[11] as usize;
+    let directory = bytes
+        .get(20..20 + count * 24)
+        .ok_or("its directory is truncated")?;
+    if read_u32(&bytes, 16) != Some(crc32(directory)) {
+        return Err("its directory is corrupted".to_string());
+    }
+
+    directory
+        .chunks(24)
+        .map(|entry| {
+            let name = String::from_utf8_lossy(&entry[..8])
+                .trim_end_matches('\0')
+                .to_string();
+            let offset = read_u32(entry, 12).unwrap() as usize;
+            let length = read_u32(entry, 16).unwrap() as usize;
+            let data = bytes
+                .get(offset..offset + length)
+                .filter(|data| Some(crc32(data)) == read_u32(entry, 20))
+                .ok_or(format!("section {} {} is corrupted", name, entry[8]))?;
+            Ok((name, entry[8], data.to_vec()))
+        })
+        .collect()
+}
+
 fn main() {
     let plugin_dir = find_plugin_dir().unwrap();
     println!("Found plugin directory: {:?}", &plugin_dir);
-    let mut file = File::create(plugin_dir.join("axes_limits.bytes")).unwrap();
     let segments = get_axes_limit_segments(&plugin_dir).unwrap();
     println!("Found segments in config: {}", segments);
 
-    for (transfer, name) in [
-        (oklab_transfer as TransferFunc, "OkLab"),
-        (xyz_transfer, "XYZ"),
-        (lab_transfer, "LAB"),
-        (oklch_transfer, "OkLch"),
-    ] {
+    // Names of the `ColorModel` members, as written in the directory.
+    let models = [
+        (oklab_transfer as TransferFunc, "Oklab"),
+        (xyz_transfer, "Xyz"),
+        (lab_transfer, "Lab"),
+        (oklch_transfer, "Oklch"),
+    ];
+    let args = std::env::args().collect::<Vec<_>>();
+    let verify = args.iter().any(|arg| arg == "--verify");
+    // `--model <name>` rebakes only the sections of that model, and keeps the
+    // others of the existing file. Can be repeated.
+    let selected = args
+        .windows(2)
+        .filter(|pair| pair[0] == "--model")
+        .map(|pair| pair[1].as_str())
+        .collect::<Vec<_>>();
+    if let Some(unknown) = selected
+        .iter()
+        .find(|name| !models.iter().any(|(_, model)| model == *name))
+    {
+        panic!("Unknown color model {}", unknown);
+    }
+
+    let path = plugin_dir.join("axes_limits.bytes");
+    // Rebaking only some models must not drop the others, so the existing
+    // file has to be reused as a whole.
+    let mut sections = if selected.is_empty() {
+        Vec::new()
+    } else {
+        match read_sections(&path, segments) {
+            Ok(sections) => sections
+                .into_iter()
+                .filter(|(name, _, _)| !selected.contains(&name.as_str()))
+                .collect(),
+            Err(reason) => panic!(
+                "Unable to rebake only some models, {:?} can't be reused: {}. \
+                 Run without --model to rebake every model.",
+                path, reason
+            ),
+        }
+    };
+
+    for (transfer, name) in models {
+        if !selected.is_empty() && !selected.contains(&name) {
+            continue;
+        }
+
         println!("Computing for {} color model.", name);
-        let limits = compute_axes_limits(transfer, segments + 1)
+        let start = Instant::now();
+        let limits = compute_axes_limits(transfer, segments + 1);
+        println!("Computed {} in {:.2?}.", name, start.elapsed());
+
+        if verify {
+            let start = Instant::now();
+            let expected = compute_axes_limits_brute_force(transfer, segments + 1);
+            let mismatches = limits
+                .iter()
+                .zip(&expected)
+                .filter(|(lhs, rhs)| lhs != rhs)
+                .count();
+            println!(
+                "Brute force computed {} in {:.2?}, {} mismatching limits.",
+                name,
+                start.elapsed(),
+                mismatches
+            );
+        }
+
+        let limits = limits
             .into_par_iter()
             .flat_map(|x| x.to_ne_bytes())
             .collect::<Vec<_>>();
-        file.write(&limits).unwrap();
+        let length = limits.len() / 3;
+        for primary in 0..3 {
+            sections.push((
+                name.to_string(),
+                primary as u8,
+                limits[primary * length..(primary + 1) * length].to_vec(),
+            ));
+        }
     }
 
+    // Same order as `ColorModel`, whichever models were rebaked.
+    let position = |name: &str| {
+        models
+            .iter()
+            .position(|(_, model)| *model == name)
+            .unwrap_or(models.len())
+    };
+    sections.sort_by_key(|(name, primary, _)| (position(name), *primary));
+
+    // Replaced at once, an interrupted write never leaves a half written file.
+    let temporary = plugin_dir.join("axes_limits.bytes.tmp");
+    File::create(&temporary)
+        .unwrap()
+        .write_all(&encode_file(segments, &sections))
+        .unwrap();
+    std::fs::rename(&temporary, &path).unwrap();
+
     println!("Done! Now you can close this window!");
 
     // Pause the program.
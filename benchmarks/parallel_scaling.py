@@ -0,0 +1,115 @@
+# Scaling of `parallelTransferColorModelArray` from 1 to N workers.
+#
+#     python benchmarks/parallel_scaling.py --colors 4000000 --output scaling.json
+#
+# Each backend converts the same random buffer with 1, 2, 4, ... workers up to
+# `--max-workers` (all cores by default). Speedups are relative to the serial
+# backend. Pool startup isn't timed, every configuration is warmed up first.
+
+import argparse
+import json
+import os
+import sys
+import time
+
+# Also sets up the Krita stub and offscreen Qt before the plugin is imported.
+from run_benchmarks import environment
+
+from extended_color_selector.models import ColorModel
+from extended_color_selector.batch_conversion import np
+from extended_color_selector.config import PARALLEL_SHARD_SIZE
+from extended_color_selector.parallel_conversion import (
+    ConversionBackend,
+    parallelTransferColorModelArray,
+    canUseProcesses,
+    shutdownPools,
+)
+
+
+def workerCounts(maxWorkers: int) -> list[int]:
+    counts = []
+    n = 1
+    while n < maxWorkers:
+        counts.append(n)
+        n *= 2
+    return counts + [maxWorkers]
+
+
+def timeConversion(
+    colors, fromModel: ColorModel, toModel: ColorModel, workers: int, backend, repeat: int
+) -> float:
+    # One shard per worker, so that every process of the pool is started.
+    parallelTransferColorModelArray(
+        colors[: PARALLEL_SHARD_SIZE * workers],
+        fromModel,
+        toModel,
+        workers=workers,
+        backend=backend,
+    )
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parallelTransferColorModelArray(
+            colors, fromModel, toModel, workers=workers, backend=backend
+        )
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Scaling of parallel color conversions from 1 to N workers."
+    )
+    parser.add_argument("--colors", type=int, default=1 << 22)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--from-model", default="Rgb", choices=[m.name for m in ColorModel])
+    parser.add_argument("--to-model", default="Okhsl", choices=[m.name for m in ColorModel])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    if np is None:
+        print("NumPy is required for parallel conversions.")
+        return 1
+
+    fromModel, toModel = ColorModel[args.from_model], ColorModel[args.to_model]
+    colors = np.random.default_rng(0).random((args.colors, 3))
+
+    serial = timeConversion(colors, fromModel, toModel, 1, ConversionBackend.Serial, args.repeat)
+    print(f"{args.colors} colors {fromModel.name} -> {toModel.name}, serial {serial:.3f} s")
+
+    backends = [ConversionBackend.Thread]
+    if canUseProcesses():
+        backends.append(ConversionBackend.Process)
+
+    results = {"serial": serial}
+    for backend in backends:
+        for workers in workerCounts(args.max_workers):
+            seconds = timeConversion(
+                colors, fromModel, toModel, workers, backend, args.repeat
+            )
+            results[f"{backend.name.lower()}/{workers}"] = seconds
+            print(
+                f"{backend.name:<8} {workers:>3} workers {seconds:8.3f} s "
+                f"{serial / seconds:6.2f}x"
+            )
+    shutdownPools()
+
+    if args.output != None:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "environment": environment(),
+                    "colors": args.colors,
+                    "fromModel": fromModel.name,
+                    "toModel": toModel.name,
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
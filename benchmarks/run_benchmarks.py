@@ -0,0 +1,331 @@
+# Micro-benchmarks of the plugin's color math, runnable without Krita.
+#
+#     python benchmarks/run_benchmarks.py --output before.json
+#     python benchmarks/run_benchmarks.py --baseline before.json
+#
+# Krita is replaced by `stubs/krita.py` and Qt runs offscreen, so this works on
+# any machine with PyQt5. Every benchmark reports the best time per item over
+# `--repeat` runs. With `--baseline`, benchmarks slower than the baseline by more
+# than `--threshold` are listed and the exit code is 1.
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import timeit
+from pathlib import Path
+from typing import Callable
+
+ROOT = Path(__file__).resolve().parent.parent
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, str(Path(__file__).resolve().parent / "stubs"))
+sys.path.insert(0, str(ROOT))
+
+from PyQt5.QtWidgets import QApplication
+
+APP = QApplication.instance() or QApplication(sys.argv[:1])
+
+from extended_color_selector.models import (
+    ColorModel,
+    WheelShape,
+    transferColorModel,
+    computeMaxSaturation,
+    findCusp,
+    findGamutIntersection,
+    get_Cs,
+)
+from extended_color_selector.gamut_clipping import (
+    mapAxesToLimited,
+    unmapAxesFromLimited,
+)
+
+RESULTS_VERSION = 1
+SAMPLES = 256
+RING_THICKNESS = 0.1
+
+
+class Benchmark:
+    def __init__(self, name: str, func: Callable[[], None], items: int) -> None:
+        self.name = name
+        self.func = func
+        self.items = items
+
+    # Best seconds per item over `repeat` runs of at least `minTime` seconds each.
+    def measure(self, repeat: int, minTime: float) -> float:
+        timer = timeit.Timer(self.func)
+        number = 1
+        while True:
+            if timer.timeit(number) >= minTime:
+                break
+            number *= 2
+        return min(timer.repeat(repeat, number)) / number / self.items
+
+
+def randomColors(rng: random.Random) -> list[tuple[float, float, float]]:
+    return [(rng.random(), rng.random(), rng.random()) for _ in range(SAMPLES)]
+
+
+def transferBenchmarks(rng: random.Random) -> list[Benchmark]:
+    colors = randomColors(rng)
+    references = randomColors(rng)
+    work = list(zip(colors, references))
+
+    def make(fromModel: ColorModel, toModel: ColorModel):
+        def run():
+            for color, reference in work:
+                transferColorModel(color, fromModel, toModel, reference)
+
+        return run
+
+    return [
+        Benchmark(
+            f"transfer/{fromModel.name}->{toModel.name}",
+            make(fromModel, toModel),
+            SAMPLES,
+        )
+        for fromModel in ColorModel
+        for toModel in ColorModel
+    ]
+
+
+def gamutBenchmarks(rng: random.Random) -> list[Benchmark]:
+    hues = [rng.random() * 2 * math.pi for _ in range(SAMPLES)]
+    ab = [(math.cos(h), math.sin(h)) for h in hues]
+    lightness = [rng.uniform(0.01, 0.99) for _ in range(SAMPLES)]
+    work = list(zip(ab, lightness))
+
+    def maxSaturation():
+        for a, b in ab:
+            computeMaxSaturation(a, b)
+
+    def cusp():
+        for a, b in ab:
+            findCusp(a, b)
+
+    def intersection():
+        for (a, b), L in work:
+            findGamutIntersection(a, b, L, 1, L)
+
+    def cs():
+        for (a, b), L in work:
+            get_Cs(L, a, b)
+
+    benchmarks = [
+        Benchmark("gamut/computeMaxSaturation", maxSaturation, SAMPLES),
+        Benchmark("gamut/findCusp", cusp, SAMPLES),
+        Benchmark("gamut/findGamutIntersection", intersection, SAMPLES),
+        Benchmark("gamut/get_Cs", cs, SAMPLES),
+    ]
+
+    axes = [(rng.random(), (rng.random(), rng.random())) for _ in range(SAMPLES)]
+
+    def make(colorModel: ColorModel, primary: int, mapper):
+        def run():
+            for primaryValue, secondary in axes:
+                mapper(colorModel, primary, primaryValue, secondary)
+
+        return run
+
+    for colorModel in ColorModel:
+        if not colorModel.isNotSrgbBased():
+            continue
+        for mapper in (mapAxesToLimited, unmapAxesFromLimited):
+            benchmarks.append(
+                Benchmark(
+                    f"gamut/{mapper.__name__}/{colorModel.name}",
+                    make(colorModel, 0, mapper),
+                    SAMPLES,
+                )
+            )
+    return benchmarks
+
+
+def shapeBenchmarks(rng: random.Random) -> list[Benchmark]:
+    points = [(rng.uniform(-1, 1), rng.uniform(-1, 1)) for _ in range(SAMPLES)]
+    coords = [(rng.random(), rng.random()) for _ in range(SAMPLES)]
+    values = [rng.random() for _ in range(SAMPLES)]
+
+    benchmarks = []
+    for shape in WheelShape:
+
+        def colorCoord(shape=shape):
+            for p in points:
+                shape.getColorCoord(p, RING_THICKNESS)
+
+        def pos(shape=shape):
+            for c in coords:
+                shape.getPos(c, RING_THICKNESS)
+
+        def ringValue(shape=shape):
+            for p in points:
+                shape.getRingValue(p, 0.5)
+
+        def ringPos(shape=shape):
+            for v in values:
+                shape.getRingPos(v, RING_THICKNESS, 0.5)
+
+        benchmarks += [
+            Benchmark(f"shape/{shape.name}/getColorCoord", colorCoord, SAMPLES),
+            Benchmark(f"shape/{shape.name}/getPos", pos, SAMPLES),
+            Benchmark(f"shape/{shape.name}/getRingValue", ringValue, SAMPLES),
+            Benchmark(f"shape/{shape.name}/getRingPos", ringPos, SAMPLES),
+        ]
+    return benchmarks
+
+
+BENCHMARK_GROUPS: list[Callable[[random.Random], list[Benchmark]]] = [
+    transferBenchmarks,
+    gamutBenchmarks,
+    shapeBenchmarks,
+]
+
+
+def collectBenchmarks(seed: int) -> list[Benchmark]:
+    benchmarks = []
+    for group in BENCHMARK_GROUPS:
+        benchmarks += group(random.Random(seed))
+    return benchmarks
+
+
+def gitRevision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "revision": gitRevision(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def formatTime(seconds: float) -> str:
+    if seconds < 1e-6:
+        return f"{seconds * 1e9:8.1f} ns"
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:8.2f} us"
+    return f"{seconds * 1e3:8.2f} ms"
+
+
+# Returns names of the benchmarks more than `threshold` slower than in `baseline`.
+def compareWithBaseline(results: dict, baseline: dict, threshold: float) -> list[str]:
+    if baseline.get("version") != RESULTS_VERSION:
+        print(
+            f"Baseline results version {baseline.get('version')} != {RESULTS_VERSION}, "
+            "comparing anyway."
+        )
+
+    regressions = []
+    previous = baseline.get("results", {})
+    print(f"{'benchmark':<48} {'baseline':>11} {'current':>11} {'ratio':>7}")
+    for name, current in results.items():
+        if name not in previous:
+            print(f"{name:<48} {'-':>11} {formatTime(current['perItem']):>11}     new")
+            continue
+
+        ratio = current["perItem"] / previous[name]["perItem"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  SLOWER"
+            regressions.append(name)
+        elif ratio < 1 / (1 + threshold):
+            flag = "  faster"
+        print(
+            f"{name:<48} {formatTime(previous[name]['perItem']):>11} "
+            f"{formatTime(current['perItem']):>11} {ratio:7.2f}{flag}"
+        )
+
+    for name in previous:
+        if name not in results:
+            print(f"{name:<48} missing from this run")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmarks of the plugin's color math."
+    )
+    parser.add_argument("--output", type=Path, help="write results as JSON to this file")
+    parser.add_argument("--baseline", type=Path, help="JSON results to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative slowdown reported as a regression (default 0.1)",
+    )
+    parser.add_argument(
+        "--filter", default="", help="only run benchmarks whose name contains this"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.05,
+        help="minimum seconds per timed run (default 0.05)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for benchmark in collectBenchmarks(args.seed):
+        if args.filter not in benchmark.name:
+            continue
+        perItem = benchmark.measure(args.repeat, args.min_time)
+        results[benchmark.name] = {"perItem": perItem, "items": benchmark.items}
+        if args.baseline == None:
+            print(f"{benchmark.name:<48} {formatTime(perItem)}")
+
+    if args.output != None:
+        args.output.write_text(
+            json.dumps(
+                {
+                    "version": RESULTS_VERSION,
+                    "environment": environment(),
+                    "settings": {
+                        "repeat": args.repeat,
+                        "minTime": args.min_time,
+                        "seed": args.seed,
+                        "samples": SAMPLES,
+                    },
+                    "results": results,
+                },
+                indent=2,
+            )
+        )
+
+    if args.baseline != None:
+        baseline = json.loads(args.baseline.read_text())
+        baseline["results"] = {
+            name: result
+            for name, result in baseline.get("results", {}).items()
+            if args.filter in name
+        }
+        regressions = compareWithBaseline(results, baseline, args.threshold)
+        if len(regressions) > 0:
+            print(f"{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
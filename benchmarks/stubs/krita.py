@@ -0,0 +1,88 @@
+# Just enough of Krita's Python API for the plugin to import outside of Krita.
+#
+# Settings always read back their default and nothing is ever registered, so
+# importing `extended_color_selector` with this on `sys.path` gives the default
+# configuration without touching the user's Krita settings. The plugin only
+# imports its color math under the stub, not the docker and the selectors.
+
+import builtins
+
+from PyQt5.QtCore import QObject
+from PyQt5.QtGui import QIcon
+from PyQt5.QtWidgets import QAction, QDockWidget
+
+
+# Tells the plugin it's not running in Krita.
+KRITA_STUB = True
+
+
+class Krita(QObject):
+    _instance = None
+
+    @staticmethod
+    def instance() -> "Krita":
+        if Krita._instance == None:
+            Krita._instance = Krita()
+        return Krita._instance
+
+    def readSetting(self, group: str, name: str, defaultValue: str) -> str:
+        return defaultValue
+
+    def writeSetting(self, group: str, name: str, value: str):
+        pass
+
+    def icon(self, name: str) -> QIcon:
+        return QIcon()
+
+    def action(self, name: str) -> QAction:
+        return QAction(name)
+
+    def activeWindow(self):
+        return None
+
+    def addDockWidgetFactory(self, factory):
+        pass
+
+    def addExtension(self, extension):
+        pass
+
+    def getAppDataLocation(self) -> str:
+        return ""
+
+
+class DockWidget(QDockWidget):
+    def canvasChanged(self, canvas):
+        pass
+
+
+class DockWidgetFactoryBase:
+    DockTornOff = 0
+    DockTop = 1
+    DockBottom = 2
+    DockRight = 3
+    DockLeft = 4
+    DockMinimized = 5
+
+
+class DockWidgetFactory(DockWidgetFactoryBase):
+    def __init__(self, id: str, area: int, widgetClass):
+        self.id = id
+        self.area = area
+        self.widgetClass = widgetClass
+
+
+class Extension(QObject):
+    def setup(self):
+        pass
+
+    def createActions(self, window):
+        pass
+
+
+class Window(QObject):
+    pass
+
+
+# Like the real module, make `Krita` usable from modules that never import it.
+builtins.Krita = Krita
+builtins.Application = Krita.instance()
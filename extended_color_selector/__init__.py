@@ -1,2 +1,18 @@
-from .extended_color_selector import *
-from .portable_color_selector import *
+from importlib.util import find_spec
+import multiprocessing
+
+
+# Outside of Krita, under the stub of the benchmarks, and in worker processes
+# of `parallel_conversion`, only the color math is needed and there's no docker
+# to register.
+def inKrita() -> bool:
+    if find_spec("krita") == None or multiprocessing.parent_process() != None:
+        return False
+    import krita  # type: ignore
+
+    return not getattr(krita, "KRITA_STUB", False)
+
+
+if inKrita():
+    from .extended_color_selector import *
+    from .portable_color_selector import *
@@ -0,0 +1,570 @@
+from collections.abc import Callable
+from pathlib import Path
+from typing import TypeVar
+import array
+import math
+import struct
+import sys
+import zlib
+
+from .models import ColorModel
+from .batch_conversion import np
+
+# Reading and writing of `axes_limits.bytes`.
+#
+# The file is split in sections, one per color model and primary channel, so
+# that only the models in use are ever read, and a single model can be
+# rebaked without touching the others. It starts with a header, all little
+# endian:
+#
+#   magic          8 bytes  b"ECSLIMIT"
+#   version        u16      AXES_LIMITS_VERSION
+#   flags          u8       bit 0 set if the section floats are big endian
+#   section count  u8
+#   segments       u32      AXES_LIMITS_SEGMENTS the file was baked with
+#   checksum       u32      CRC-32 of the directory
+#
+# followed by the directory, one entry per section:
+#
+#   model name     8 bytes  `ColorModel` member name padded with zeros
+#   primary        u8       primary channel, followed by 3 padding bytes
+#   offset         u32      of the section from the start of the file
+#   length         u32      of the section in bytes
+#   checksum       u32      CRC-32 of the section
+#
+# For each of the `segments + 1` values of its primary channel, a section
+# holds minX, maxX, minY, maxY of the in gamut region of the two other
+# channels as float32, all normalized.
+#
+# Older files are accepted too. Version 1 ones have the same header, with a
+# model count instead of the section count and a checksum of the payload,
+# then the 8 bytes names of the models, and one payload holding every model
+# one after another. Files baked before the header existed have no header at
+# all, as long as their length matches: native endian floats for OkLab, XYZ,
+# Lab and OkLch.
+#
+# Gamut spans files have the header of version 1, with magic b"ECSSPANS" and
+# a u32 row count after the segments. For every model, primary channel and
+# value of the primary channel, they hold minX, maxX of the in gamut region
+# for each of `rows` evenly spaced values of the second axis, from 0 to 1.
+
+AXES_LIMITS_MAGIC = b"ECSLIMIT"
+AXES_LIMITS_VERSION = 2
+AXES_LIMITS_HEADER = struct.Struct("<8sHBBII")
+AXES_LIMITS_SECTION = struct.Struct("<8sB3xIII")
+AXES_LIMITS_MODEL_NAME = struct.Struct("<8s")
+AXES_LIMITS_BIG_ENDIAN = 1
+
+GAMUT_SPANS_MAGIC = b"ECSSPANS"
+GAMUT_SPANS_VERSION = 1
+GAMUT_SPANS_HEADER = struct.Struct("<8sHBBIII")
+
+LEGACY_AXES_LIMITS_MODELS = [
+    ColorModel.Oklab,
+    ColorModel.Xyz,
+    ColorModel.Lab,
+    ColorModel.Oklch,
+]
+# Models gamut clipping needs limits for, the others are all in gamut.
+AXES_LIMITS_MODELS = [model for model in ColorModel if model.isNotSrgbBased()]
+
+
+T = TypeVar("T")
+
+
+class AxesLimitsError(Exception):
+    pass
+
+
+class AxesLimits:
+    def __init__(
+        self, segments: int, values: dict[ColorModel, array.array]
+    ) -> None:
+        self.segments = segments
+        # Limits of every primary channel of each model, one after another.
+        self.values = values
+
+    # Limits for models without any are the full [0, 1] range.
+    @staticmethod
+    def unlimited(segments: int) -> "AxesLimits":
+        return AxesLimits(segments, {})
+
+    def has(self, colorModel: ColorModel) -> bool:
+        return colorModel in self.values
+
+    def add(self, values: dict[ColorModel, array.array]):
+        self.values.update(values)
+
+    def get(
+        self, colorModel: ColorModel, primary: int, primaryValue: int
+    ) -> tuple[tuple[float, float], tuple[float, float]]:
+        v = self.values.get(colorModel)
+        if v == None:
+            return (0.0, 1.0), (0.0, 1.0)
+
+        i = (primary * (self.segments + 1) + primaryValue) * 4
+        return (v[i], v[i + 1]), (v[i + 2], v[i + 3])
+
+    # Limits of every primary channel and value of one model, laid out like a
+    # model's sections, to be uploaded as a texture. `None` for models without
+    # limits.
+    def modelValues(self, colorModel: ColorModel) -> array.array | None:
+        return self.values.get(colorModel)
+
+
+class GamutSpans:
+    def __init__(
+        self, segments: int, rows: int, models: list[ColorModel], values: array.array
+    ) -> None:
+        self.segments = segments
+        self.rows = rows
+        self.models = models
+        # Index of the first float of each model.
+        self.bases = dict(
+            [
+                (model, i * spansPayloadLength(segments, rows, 1))
+                for i, model in enumerate(models)
+            ]
+        )
+        self.values = values
+
+    def has(self, colorModel: ColorModel) -> bool:
+        return colorModel in self.bases
+
+    def _index(self, colorModel: ColorModel, primary: int, primaryValue: int) -> int:
+        return (
+            self.bases[colorModel]
+            + (primary * (self.segments + 1) + primaryValue) * self.rows * 2
+        )
+
+    def _segment(self, primaryValue: float) -> tuple[int, int, float]:
+        a = min(max(primaryValue, 0.0), 1.0) * self.segments
+        return int(a), int(math.ceil(a)), a - int(a)
+
+    # Spans of every primary channel and value of one model, laid out like in
+    # the file, to be uploaded as a texture. `None` for models without spans.
+    def modelValues(self, colorModel: ColorModel) -> array.array | None:
+        base = self.bases.get(colorModel)
+        if base == None:
+            return None
+        return self.values[base : base + spansPayloadLength(self.segments, self.rows, 1)]
+
+    # Span of the x axis at `y`, interpolated between rows and values of the
+    # primary channel. Constant time, so it's fine to call on every mouse event.
+    def get(
+        self, colorModel: ColorModel, primary: int, primaryValue: float, y: float
+    ) -> tuple[float, float]:
+        a, b, t = self._segment(primaryValue)
+        row = min(max(y, 0.0), 1.0) * (self.rows - 1)
+        r = min(int(row), self.rows - 2)
+        u = row - r
+
+        v = self.values
+        i = self._index(colorModel, primary, a) + r * 2
+        j = self._index(colorModel, primary, b) + r * 2
+        mn = (v[i] * (1 - u) + v[i + 2] * u) * (1 - t) + (
+            v[j] * (1 - u) + v[j + 2] * u
+        ) * t
+        mx = (v[i + 1] * (1 - u) + v[i + 3] * u) * (1 - t) + (
+            v[j + 1] * (1 - u) + v[j + 3] * u
+        ) * t
+        return mn, mx
+
+
+def payloadLength(segments: int, modelCount: int) -> int:
+    return modelCount * 3 * sectionLength(segments)
+
+
+# Floats in the section of one model and primary channel.
+def sectionLength(segments: int) -> int:
+    return (segments + 1) * 4
+
+
+def spansPayloadLength(segments: int, rows: int, modelCount: int) -> int:
+    return modelCount * 3 * (segments + 1) * rows * 2
+
+
+# `values` holds the limits of every primary channel of each model, one after
+# another, in native byte order.
+def encodeAxesLimits(segments: int, values: dict[ColorModel, array.array]) -> bytes:
+    sections = []
+    for model, modelValues in values.items():
+        if len(modelValues) != payloadLength(segments, 1):
+            raise ValueError(
+                f"Expected {payloadLength(segments, 1)} axes limits for {model.name}, got {len(modelValues)}"
+            )
+        data = modelValues.tobytes()
+        length = sectionLength(segments) * 4
+        for primary in range(3):
+            sections.append(
+                (model, primary, data[primary * length : (primary + 1) * length])
+            )
+    return _encodeSections(segments, _byteOrderFlags(), sections)
+
+
+def _encodeSections(
+    segments: int, flags: int, sections: list[tuple[ColorModel, int, bytes]]
+) -> bytes:
+    offset = AXES_LIMITS_HEADER.size + len(sections) * AXES_LIMITS_SECTION.size
+    directory = b""
+    for model, primary, data in sections:
+        directory += AXES_LIMITS_SECTION.pack(
+            model.name.encode("ascii"), primary, offset, len(data), zlib.crc32(data)
+        )
+        offset += len(data)
+
+    header = AXES_LIMITS_HEADER.pack(
+        AXES_LIMITS_MAGIC,
+        AXES_LIMITS_VERSION,
+        flags,
+        len(sections),
+        segments,
+        zlib.crc32(directory),
+    )
+    return header + directory + b"".join([data for _, _, data in sections])
+
+
+def writeAxesLimits(path: Path, segments: int, values: dict[ColorModel, array.array]):
+    path.write_bytes(encodeAxesLimits(segments, values))
+
+
+# Replaces the limits of the models of `values` in the file at `path`. Other
+# models are kept as long as the file is valid for `segments` and their
+# sections aren't corrupted. The file is replaced at once, never half written.
+def updateAxesLimits(
+    path: Path, segments: int, values: dict[ColorModel, array.array]
+):
+    kept: dict[ColorModel, array.array] = {}
+    try:
+        limits = openAxesLimits(path, segments)
+    except AxesLimitsError:
+        limits = None
+    for model in [] if limits == None else limits.models():
+        if model in values:
+            continue
+        try:
+            kept |= limits.read([model])
+        except AxesLimitsError:
+            pass
+
+    temporary = path.with_suffix(".tmp")
+    # Sections stay in the order of `ColorModel`, whichever were rebaked.
+    writeAxesLimits(temporary, segments, dict(sorted((kept | values).items())))
+    temporary.replace(path)
+
+
+def encodeGamutSpans(
+    segments: int, rows: int, models: list[ColorModel], values: array.array
+) -> bytes:
+    if len(values) != spansPayloadLength(segments, rows, len(models)):
+        raise ValueError(
+            f"Expected {spansPayloadLength(segments, rows, len(models))} gamut spans, got {len(values)}"
+        )
+
+    payload = values.tobytes()
+    header = GAMUT_SPANS_HEADER.pack(
+        GAMUT_SPANS_MAGIC,
+        GAMUT_SPANS_VERSION,
+        _byteOrderFlags(),
+        len(models),
+        segments,
+        rows,
+        zlib.crc32(payload),
+    )
+    return header + _encodeModelNames(models) + payload
+
+
+def writeGamutSpans(
+    path: Path, segments: int, rows: int, models: list[ColorModel], values: array.array
+):
+    path.write_bytes(encodeGamutSpans(segments, rows, models, values))
+
+
+def _byteOrderFlags() -> int:
+    return AXES_LIMITS_BIG_ENDIAN if sys.byteorder == "big" else 0
+
+
+def _encodeModelNames(models: list[ColorModel]) -> bytes:
+    return b"".join(
+        [AXES_LIMITS_MODEL_NAME.pack(model.name.encode("ascii")) for model in models]
+    )
+
+
+# A validated limits file, whose sections are only read once needed.
+class AxesLimitsFile:
+    def __init__(
+        self,
+        path: Path,
+        segments: int,
+        sections: dict[tuple[ColorModel, int], tuple[int, int, int | None]],
+    ) -> None:
+        self.path = path
+        self.segments = segments
+        # Offset, length and checksum of every section. Checksums are `None`
+        # for older files, whose payload is checked as a whole when opened.
+        self.sections = sections
+
+    # Models with the sections of all three primary channels.
+    def models(self) -> list[ColorModel]:
+        return [
+            model
+            for model in ColorModel
+            if all([(model, primary) in self.sections for primary in range(3)])
+        ]
+
+    # Limits of `models`, widened by `offset` and clamped to [0, 1] once here
+    # so lookups don't have to. Only their sections are read and checked.
+    def read(
+        self, models: list[ColorModel], offset: float = 0.0
+    ) -> dict[ColorModel, array.array]:
+        # The directory is read again, the file may have been rebaked since.
+        def parse(view: memoryview):
+            sections, bigEndian = _parse(view, self.segments)
+            result = {}
+            for model in models:
+                values = array.array("f")
+                for primary in range(3):
+                    section = sections.get((model, primary))
+                    if section == None:
+                        raise AxesLimitsError(
+                            f"No axes limits of {model.name} in {self.path}."
+                        )
+                    values.frombytes(_readSection(view, model, primary, section))
+                if bigEndian != (sys.byteorder == "big"):
+                    values.byteswap()
+                widenAxesLimits(values, offset)
+                result[model] = values
+            return result
+
+        return _readFile(self.path, parse)
+
+
+# Reads the file and checks its header and directory, but none of its sections.
+def openAxesLimits(path: Path, segments: int) -> AxesLimitsFile:
+    sections, _ = _readFile(path, lambda view: _parse(view, segments))
+    return AxesLimitsFile(path, segments, sections)
+
+
+# Reads the limits of `models`, every model of the file by default.
+def readAxesLimits(
+    path: Path,
+    segments: int,
+    offset: float = 0.0,
+    models: list[ColorModel] | None = None,
+) -> AxesLimits:
+    limits = openAxesLimits(path, segments)
+    return AxesLimits(
+        segments, limits.read(limits.models() if models == None else models, offset)
+    )
+
+
+# Same as `readAxesLimits`, for gamut spans files.
+def readGamutSpans(
+    path: Path, segments: int, rows: int, offset: float = 0.0
+) -> GamutSpans:
+    models, values = _readPayload(path, lambda view: _parseSpans(view, segments, rows))
+    widenAxesLimits(values, offset)
+    return GamutSpans(segments, rows, models, values)
+
+
+# Reads the file and returns what `parse` takes out of it. Files aren't kept
+# memory-mapped: limits are widened and possibly byte swapped once loaded, so
+# they'd be copied out of the mapping anyway, and Windows refuses to replace
+# a mapped file when it's rebaked. A whole limits file is 50 kB.
+def _readFile(path: Path, parse: Callable[[memoryview], T]) -> T:
+    try:
+        data = path.read_bytes()
+    except OSError as e:
+        raise AxesLimitsError(f"Unable to read {path}: {e}")
+
+    with memoryview(data) as view:
+        return parse(view)
+
+
+# Copies the payload once `parse` validated it.
+def _readPayload(
+    path: Path, parse: Callable[[memoryview], tuple[list[ColorModel], int, bool]]
+) -> tuple[list[ColorModel], array.array]:
+    def read(view: memoryview):
+        models, start, bigEndian = parse(view)
+        values = array.array("f")
+        with view[start:] as payload:
+            values.frombytes(payload)
+        return models, values, bigEndian
+
+    models, values, bigEndian = _readFile(path, read)
+    if bigEndian != (sys.byteorder == "big"):
+        values.byteswap()
+    return models, values
+
+
+# Returns the sections of the file and whether their floats are big endian.
+def _parse(
+    view: memoryview, segments: int
+) -> tuple[dict[tuple[ColorModel, int], tuple[int, int, int | None]], bool]:
+    size = AXES_LIMITS_HEADER.size
+    if view.nbytes < size or view[:8] != AXES_LIMITS_MAGIC:
+        legacyLength = payloadLength(segments, len(LEGACY_AXES_LIMITS_MODELS)) * 4
+        if view.nbytes != legacyLength:
+            raise AxesLimitsError(
+                f"Length of axes limits file not matching to config: {view.nbytes} bytes != {legacyLength}. "
+                "This can be caused by modifying the AXES_LIMITS_SEGMENTS without rebaking the limits file."
+            )
+        return (
+            _payloadSections(LEGACY_AXES_LIMITS_MODELS, 0, segments),
+            sys.byteorder == "big",
+        )
+
+    magic, version, flags, count, fileSegments, checksum = (
+        AXES_LIMITS_HEADER.unpack_from(view)
+    )
+    if version not in (1, AXES_LIMITS_VERSION):
+        raise AxesLimitsError(
+            f"Unsupported axes limits file version {version}, expected {AXES_LIMITS_VERSION}."
+        )
+    if fileSegments != segments:
+        raise AxesLimitsError(
+            f"Axes limits file baked with {fileSegments} segments, but AXES_LIMITS_SEGMENTS is {segments}."
+        )
+    bigEndian = flags & AXES_LIMITS_BIG_ENDIAN != 0
+
+    if version == 1:
+        models = _parseModelNames(view, size, count)
+        start = size + count * AXES_LIMITS_MODEL_NAME.size
+        _checkPayload(view, start, payloadLength(segments, count) * 4, checksum)
+        return _payloadSections(models, start, segments), bigEndian
+
+    end = size + count * AXES_LIMITS_SECTION.size
+    if view.nbytes < end:
+        raise AxesLimitsError(
+            f"Axes limits file truncated: {view.nbytes} bytes < {end} of directory."
+        )
+    with view[size:end] as directory:
+        if zlib.crc32(directory) != checksum:
+            raise AxesLimitsError(
+                "Axes limits file is corrupted, directory checksum mismatch."
+            )
+
+    sections = {}
+    for i in range(count):
+        name, primary, offset, length, sectionChecksum = (
+            AXES_LIMITS_SECTION.unpack_from(view, size + i * AXES_LIMITS_SECTION.size)
+        )
+        model = _parseModelName(name)
+        # Sections of models added by later versions of the plugin.
+        if model == None:
+            continue
+        if primary > 2 or (model, primary) in sections:
+            raise AxesLimitsError(
+                f"Invalid section {model.name} {primary} in axes limits file."
+            )
+        if length != sectionLength(segments) * 4 or offset + length > view.nbytes:
+            raise AxesLimitsError(
+                f"Axes limits file truncated: section {model.name} {primary} "
+                f"of {length} bytes at {offset}, file of {view.nbytes} bytes."
+            )
+        sections[model, primary] = offset, length, sectionChecksum
+    return sections, bigEndian
+
+
+# Sections of older files, with every model one after another from `start`.
+def _payloadSections(
+    models: list[ColorModel], start: int, segments: int
+) -> dict[tuple[ColorModel, int], tuple[int, int, int | None]]:
+    length = sectionLength(segments) * 4
+    return dict(
+        [
+            ((model, primary), (start + (i * 3 + primary) * length, length, None))
+            for i, model in enumerate(models)
+            for primary in range(3)
+        ]
+    )
+
+
+def _readSection(
+    view: memoryview,
+    model: ColorModel,
+    primary: int,
+    section: tuple[int, int, int | None],
+) -> bytes:
+    offset, length, checksum = section
+    with view[offset : offset + length] as data:
+        if checksum != None and zlib.crc32(data) != checksum:
+            raise AxesLimitsError(
+                f"Axes limits of {model.name} are corrupted, checksum mismatch "
+                f"in section of primary channel {primary}."
+            )
+        return data.tobytes()
+
+
+def _parseSpans(view: memoryview, segments: int, rows: int):
+    size = GAMUT_SPANS_HEADER.size
+    if view.nbytes < size or view[:8] != GAMUT_SPANS_MAGIC:
+        raise AxesLimitsError("Not a gamut spans file.")
+
+    magic, version, flags, modelCount, fileSegments, fileRows, checksum = (
+        GAMUT_SPANS_HEADER.unpack_from(view)
+    )
+    if version != GAMUT_SPANS_VERSION:
+        raise AxesLimitsError(
+            f"Unsupported gamut spans file version {version}, expected {GAMUT_SPANS_VERSION}."
+        )
+    if fileSegments != segments or fileRows != rows:
+        raise AxesLimitsError(
+            f"Gamut spans file baked with {fileSegments} segments and {fileRows} rows, "
+            f"but config has {segments} and {rows}."
+        )
+
+    models = _parseModelNames(view, size, modelCount)
+    start = size + modelCount * AXES_LIMITS_MODEL_NAME.size
+    _checkPayload(
+        view, start, spansPayloadLength(segments, rows, modelCount) * 4, checksum
+    )
+    return models, start, flags & AXES_LIMITS_BIG_ENDIAN != 0
+
+
+def _parseModelNames(view: memoryview, start: int, count: int) -> list[ColorModel]:
+    models = []
+    for i in range(count):
+        (name,) = AXES_LIMITS_MODEL_NAME.unpack_from(
+            view, start + i * AXES_LIMITS_MODEL_NAME.size
+        )
+        model = _parseModelName(name)
+        if model == None:
+            raise AxesLimitsError(
+                f"Unknown color model {_decodeModelName(name)} in axes limits file."
+            )
+        models.append(model)
+    return models
+
+
+def _parseModelName(name: bytes) -> ColorModel | None:
+    return ColorModel.__members__.get(_decodeModelName(name))
+
+
+def _decodeModelName(name: bytes) -> str:
+    return name.rstrip(b"\0").decode("ascii", "replace")
+
+
+def _checkPayload(view: memoryview, start: int, expectedLength: int, checksum: int):
+    length = view.nbytes - start
+    if length != expectedLength:
+        raise AxesLimitsError(
+            f"Axes limits file truncated: {length} bytes of limits != {expectedLength}."
+        )
+    if zlib.crc32(view[start:]) != checksum:
+        raise AxesLimitsError("Axes limits file is corrupted, checksum mismatch.")
+
+
+# Widens every range by `offset` and clamps it to [0, 1], in place. Computed
+# in double precision either way, like the loop does without NumPy.
+def widenAxesLimits(values: array.array, offset: float):
+    if np is not None:
+        v = np.frombuffer(values, dtype=np.float32)
+        v[0::2] = np.maximum(v[0::2].astype(np.float64) - offset, 0.0)
+        v[1::2] = np.minimum(v[1::2].astype(np.float64) + offset, 1.0)
+        return
+
+    for i in range(0, len(values), 2):
+        values[i] = max(values[i] - offset, 0.0)
+        values[i + 1] = min(values[i + 1] + offset, 1.0)
@@ -0,0 +1,205 @@
+from pathlib import Path
+import array
+import hashlib
+
+from .models import ColorModel
+from .batch_conversion import np, transferColorModelArray
+from .axes_limits import (
+    AXES_LIMITS_MODELS,
+    updateAxesLimits,
+    writeGamutSpans,
+)
+from .parallel_conversion import CancellationToken, checkCancelled
+
+# Bakes the axes limits in the plugin itself, with the conversions of
+# `batch_conversion.py`, so changing `AXES_LIMITS_SEGMENTS` doesn't require
+# running `axes_limits_compute`, along with the gamut spans, which are never
+# shipped. Requires NumPy.
+#
+# The whole (segments + 1)³ cube of normalized colors is converted to sRGB one
+# slice of the first channel at a time. For every slice, the distance of each
+# color to the sRGB cube is reduced along both axes into the accumulators of
+# all three primaries, and the first and last color in gamut of every line is
+# tracked, so every color is converted only once, and never more than a slice
+# is kept in memory.
+#
+# Results match `axes_limits_compute` up to one segment, except near the
+# gamut boundary of XYZ, where the matrices of the plugin and of `bevy_color`
+# differ slightly.
+
+# Colors this far outside of the sRGB cube still count as in gamut.
+BAKE_GAMUT_TOLERANCE = 1e-6
+# Rows with no color in gamut keep their colors closest to the gamut, as long
+# as they are this close. Conversions of the plugin place white 2.5e-4 outside
+# of the gamut, and the rows of maximum lightness would otherwise be empty.
+BAKE_NEAR_GAMUT_DISTANCE = 3e-4
+
+# Sources of every function the baked limits depend on.
+BAKE_SOURCES = ["models.py", "batch_conversion.py", "axes_limits_baker.py"]
+
+
+def canBakeAxesLimits() -> bool:
+    return np is not None
+
+
+def conversionCodeHash() -> str:
+    digest = hashlib.sha256()
+    for name in BAKE_SOURCES:
+        digest.update((Path(__file__).parent / name).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+# Where baked limits are cached, in the Krita data directory. `None` when
+# Krita doesn't have one.
+def cachedAxesLimitsPath(segments: int) -> Path | None:
+    return _cachePath(f"axes_limits_{segments}_{conversionCodeHash()}.bytes")
+
+
+def cachedGamutSpansPath(segments: int, rows: int) -> Path | None:
+    return _cachePath(f"gamut_spans_{segments}_{rows}_{conversionCodeHash()}.bytes")
+
+
+def _cachePath(name: str) -> Path | None:
+    location = Krita.instance().getAppDataLocation()  # type: ignore
+    if location == "":
+        return None
+    return Path(location) / "extended_color_selector" / name
+
+
+# Limits and spans of a single model. Limits are a (3, segments + 1, 4)
+# float32 array laid out like the three sections of one model of
+# `axes_limits.bytes`, spans a (3, segments + 1, rows, 2) one laid out like
+# one model of a gamut spans file.
+def bakeModelGamut(
+    colorModel: ColorModel,
+    segments: int,
+    rows: int,
+    token: CancellationToken | None = None,
+):
+    n = segments + 1
+    values = np.arange(n) / segments
+    second, third = np.meshgrid(values, values, indexing="ij")
+    colors = np.empty((n * n, 3), dtype=np.float64)
+    colors[:, 1] = second.ravel()
+    colors[:, 2] = third.ravel()
+
+    # Distances to the gamut for each primary value (rows) and axis value
+    # (columns), minimized over the remaining axis.
+    distances = [np.full((n, n), np.inf) for _ in range(6)]
+    x0, y0, x1, y1, x2, y2 = distances
+    # First and last voxels in gamut along each line of the three axes.
+    spans = np.full((3, n, n, 2), -1, dtype=np.int64)
+    firstI, lastI = np.full((n, n), -1), np.full((n, n), -1)
+    for i in range(n):
+        checkCancelled(token)
+        colors[:, 0] = values[i]
+        rgb = transferColorModelArray(colors, colorModel, ColorModel.Rgb, clamp=False)
+        distance = np.maximum(-rgb, rgb - 1.0).max(axis=1).reshape(n, n)
+        distance[np.isnan(distance)] = np.inf
+
+        x0[i] = distance.min(axis=1)
+        y0[i] = distance.min(axis=0)
+        x1[:, i] = distance.min(axis=1)
+        np.minimum(y1, distance, out=y1)
+        x2[:, i] = distance.min(axis=0)
+        np.minimum(y2, distance.T, out=y2)
+
+        inGamut = distance <= BAKE_GAMUT_TOLERANCE
+        spans[0, i] = _lineSpans(inGamut.T)
+        firstI[(firstI < 0) & inGamut] = i
+        lastI[inGamut] = i
+
+    # Lines of the first channel, `firstI[j, k]`, are rows `k` of primary 1
+    # value `j`, and rows `j` of primary 2 value `k`.
+    spans[1] = np.stack([firstI, lastI], axis=-1)
+    spans[2] = spans[1].transpose(1, 0, 2)
+
+    limits = np.zeros((3, n, 4), dtype=np.float32)
+    for primary, axes in enumerate([(x0, y0), (x1, y1), (x2, y2)]):
+        for axis, distance in enumerate(axes):
+            closest = distance.min(axis=1, keepdims=True)
+            threshold = np.where(closest <= BAKE_NEAR_GAMUT_DISTANCE, closest, 0.0)
+            inGamut = distance <= np.maximum(threshold, 0.0) + BAKE_GAMUT_TOLERANCE
+
+            # Empty rows are (0, 0), like `axes_limits_compute` does.
+            first = inGamut.argmax(axis=1)
+            last = np.where(
+                inGamut.any(axis=1), n - 1 - inGamut[:, ::-1].argmax(axis=1), 0
+            )
+            limits[primary, :, axis * 2] = first / segments
+            limits[primary, :, axis * 2 + 1] = last / segments
+
+    gridRows = np.rint(np.arange(rows) * segments / (rows - 1)).astype(np.int64)
+    return limits, _fillEmptyRows(spans[:, :, gridRows], limits, segments)
+
+
+# First and last index in gamut of every line of `inGamut`, -1 for empty lines.
+def _lineSpans(inGamut):
+    n = inGamut.shape[1]
+    found = inGamut.any(axis=1)
+    first = np.where(found, inGamut.argmax(axis=1), -1)
+    last = np.where(found, n - 1 - inGamut[:, ::-1].argmax(axis=1), -1)
+    return np.stack([first, last], axis=-1)
+
+
+# Empty rows take the span of the nearest row that isn't, and slices without
+# any color in gamut the x limits of their bounding box, so that spans can
+# always be interpolated.
+def _fillEmptyRows(spans, limits, segments: int):
+    rows = spans.shape[2]
+    index = np.arange(rows)
+    valid = spans[..., 0] >= 0
+    previous = np.maximum.accumulate(np.where(valid, index, -1), axis=2)
+    following = np.minimum.accumulate(
+        np.where(valid, index, rows)[..., ::-1], axis=2
+    )[..., ::-1]
+    usePrevious = (previous >= 0) & (
+        (following >= rows) | (index - previous <= following - index)
+    )
+    source = np.clip(np.where(usePrevious, previous, following), 0, rows - 1)
+
+    result = np.take_along_axis(spans, source[..., None], axis=2) / segments
+    empty = ~valid.any(axis=2)
+    result[empty] = limits[:, :, None, 0:2].repeat(rows, axis=2)[empty]
+    return result.astype(np.float32)
+
+
+# Limits of every model, in the layout of `writeAxesLimits`, and their spans,
+# in the layout of `writeGamutSpans`. Raises `ConversionCancelled` once
+# `token` is cancelled.
+def bakeGamut(
+    segments: int,
+    rows: int,
+    models: list[ColorModel] = AXES_LIMITS_MODELS,
+    token: CancellationToken | None = None,
+) -> tuple[dict[ColorModel, array.array], array.array]:
+    limits, spans = {}, array.array("f")
+    for colorModel in models:
+        modelLimits, modelSpans = bakeModelGamut(colorModel, segments, rows, token)
+        limits[colorModel] = array.array("f", modelLimits.tobytes())
+        spans.frombytes(modelSpans.tobytes())
+    return limits, spans
+
+
+# Only the sections of `models` are rebaked in the limits file, the others are
+# kept. Spans are only written with `spansPath`, and must then be baked for
+# every model.
+def bakeGamutFiles(
+    limitsPath: Path,
+    spansPath: Path | None,
+    segments: int,
+    rows: int,
+    models: list[ColorModel] = AXES_LIMITS_MODELS,
+    token: CancellationToken | None = None,
+):
+    limits, spans = bakeGamut(segments, rows, models, token)
+    limitsPath.parent.mkdir(parents=True, exist_ok=True)
+    updateAxesLimits(limitsPath, segments, limits)
+    if spansPath == None:
+        return
+
+    # Written aside and renamed, so that a half written file is never read.
+    spansPath.parent.mkdir(parents=True, exist_ok=True)
+    temporary = spansPath.with_suffix(".tmp")
+    writeGamutSpans(temporary, segments, rows, models, spans)
+    temporary.replace(spansPath)
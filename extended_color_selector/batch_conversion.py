@@ -0,0 +1,786 @@
+from collections.abc import Sequence
+from functools import lru_cache
+import array
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .models import (
+    ColorModel,
+    ColorMatrix,
+    compileConversion,
+    transferColorModel,
+    cuspTable,
+    isExactCusp,
+)
+
+# Vectorized counterparts of the conversion functions in `models.py`.
+#
+# Every function here mirrors the scalar function of the same name, but takes
+# and returns a tuple of three equally shaped NumPy arrays (one per channel)
+# instead of a tuple of three floats. Branches in the scalar code are
+# evaluated for every element and selected with masks, so intermediate
+# divisions by zero and roots of negative numbers are expected and silenced.
+#
+# Results of `transferColorModelArray` match `transferColorModel` to within
+# `ARRAY_TRANSFER_TOLERANCE` for every normalized channel. The tolerance is
+# relative for values far outside of [0, 1], which only show up with `clamp=False`.
+ARRAY_TRANSFER_TOLERANCE = 1e-8
+
+Channels = tuple["np.ndarray", "np.ndarray", "np.ndarray"]
+
+
+def hasNumpy() -> bool:
+    return np is not None
+
+
+def normalize(colorModel: ColorModel, color: Channels) -> Channels:
+    mn, mx = colorModel.limits()
+    return (
+        (color[0] - mn[0]) / (mx[0] - mn[0]),
+        (color[1] - mn[1]) / (mx[1] - mn[1]),
+        (color[2] - mn[2]) / (mx[2] - mn[2]),
+    )
+
+
+def unnormalize(colorModel: ColorModel, color: Channels) -> Channels:
+    mn, mx = colorModel.limits()
+    return (
+        color[0] * (mx[0] - mn[0]) + mn[0],
+        color[1] * (mx[1] - mn[1]) + mn[1],
+        color[2] * (mx[2] - mn[2]) + mn[2],
+    )
+
+
+def srgbToLinear(color: Channels) -> Channels:
+    def f(x):
+        return np.where(
+            x <= 0,
+            x,
+            np.where(x <= 0.04045, x / 12.92, ((x + 0.055) / 1.055) ** 2.4),
+        )
+
+    return f(color[0]), f(color[1]), f(color[2])
+
+
+def linearToSrgb(color: Channels) -> Channels:
+    def f(x):
+        return np.where(x <= 0.0031308, x * 12.92, 1.055 * (x ** (1 / 2.4)) - 0.055)
+
+    return f(color[0]), f(color[1]), f(color[2])
+
+
+def srgbToHwb(color: Channels) -> Channels:
+    r, g, b = color
+    xMax = np.maximum(np.maximum(r, g), b)
+    xMin = np.minimum(np.minimum(r, g), b)
+
+    chroma = xMax - xMin
+
+    hue = np.select(
+        [chroma == 0, r == xMax, g == xMax],
+        [
+            0.0,
+            60 * (g - b) / chroma,
+            60 * (2 + (b - r) / chroma),
+        ],
+        60 * (4 + (r - g) / chroma),
+    )
+    hue = np.where(hue < 0, hue + 360, hue)
+
+    whiteness = xMin
+    blackness = 1 - xMax
+    return hue, whiteness, blackness
+
+
+def srgbToHsv(color: Channels) -> Channels:
+    h, w, b = srgbToHwb(color)
+    v = 1 - b
+    return h, np.where(v != 0, 1 - (w / v), 0.0), v
+
+
+def _hwvToSrgb(h, w, v) -> Channels:
+    h = h / 60
+    i = np.trunc(h)
+    f = h - i
+    i = i.astype(np.int64)
+    f = np.where(i % 2 == 1, 1 - f, f)
+
+    n = w + f * (v - w)
+
+    cases = [i == 1, i == 2, i == 3, i == 4, i == 5]
+    return (
+        np.select(cases, [n, w, w, n, v], v),
+        np.select(cases, [v, v, n, w, w], n),
+        np.select(cases, [w, n, v, v, n], w),
+    )
+
+
+def hsvToSrgb(color: Channels) -> Channels:
+    v = color[2]
+    w = (1 - color[1]) * v
+    return _hwvToSrgb(color[0], w, v)
+
+
+def hslToSrgb(hsl: Channels) -> Channels:
+    value = hsl[2] + hsl[1] * np.minimum(hsl[2], 1 - hsl[2])
+    saturation = np.where(value == 0, 0.0, 2 * (1 - hsl[2] / value))
+
+    v = value
+    w = (1 - saturation) * v
+    return _hwvToSrgb(hsl[0], w, v)
+
+
+def srgbToHsl(color: Channels) -> Channels:
+    h, s, v = srgbToHsv(color)
+    l = v * (1 - s / 2)
+    s = np.where((l == 0) | (l == 1), 0.0, (v - l) / np.minimum(l, 1 - l))
+    return h, s, l
+
+
+def xyzToSrgb(color: Channels) -> Channels:
+    x, y, z = color
+    r = x * 3.2404542 + y * -1.5371385 + z * -0.4985314
+    g = x * -0.969266 + y * 1.8760108 + z * 0.041556
+    b = x * 0.0556434 + y * -0.2040259 + z * 1.0572252
+
+    return linearToSrgb((r, g, b))
+
+
+def srgbToXyz(color: Channels) -> Channels:
+    r, g, b = srgbToLinear(color)
+
+    x = r * 0.4124564 + g * 0.3575761 + b * 0.1804375
+    y = r * 0.2126729 + g * 0.7151522 + b * 0.072175
+    z = r * 0.0193339 + g * 0.119192 + b * 0.9503041
+
+    return x, y, z
+
+
+LAB_CIE_EPSILON = 216.0 / 24389.0
+LAB_CIE_KAPPA = 24389.0 / 27.0
+XYZ_D65_WHITE = 0.95047, 1.0, 1.08883
+
+
+def labToXyz(color: Channels) -> Channels:
+    l = 100.0 * color[0]
+    a = 100.0 * color[1]
+    b = 100.0 * color[2]
+
+    fy = (l + 16.0) / 116.0
+    fx = a / 500.0 + fy
+    fz = fy - b / 200.0
+
+    fx3 = fx * fx * fx
+    xr = np.where(fx3 > LAB_CIE_EPSILON, fx3, (116.0 * fx - 16.0) / LAB_CIE_KAPPA)
+
+    yr = np.where(
+        l > LAB_CIE_EPSILON * LAB_CIE_KAPPA,
+        ((l + 16.0) / 116.0) ** 3,
+        l / LAB_CIE_KAPPA,
+    )
+
+    fz3 = fz * fz * fz
+    zr = np.where(fz3 > LAB_CIE_EPSILON, fz3, (116.0 * fz - 16.0) / LAB_CIE_KAPPA)
+
+    return xr * XYZ_D65_WHITE[0], yr * XYZ_D65_WHITE[1], zr * XYZ_D65_WHITE[2]
+
+
+def xyzToLab(color: Channels) -> Channels:
+    def f(x):
+        return np.where(
+            x > LAB_CIE_EPSILON, np.cbrt(x), (LAB_CIE_KAPPA * x + 16.0) / 116.0
+        )
+
+    fx = f(color[0] / XYZ_D65_WHITE[0])
+    fy = f(color[1] / XYZ_D65_WHITE[1])
+    fz = f(color[2] / XYZ_D65_WHITE[2])
+
+    return 1.16 * fy - 0.16, 5.00 * (fx - fy), 2.00 * (fy - fz)
+
+
+def oklchToXyz(color: Channels) -> Channels:
+    hue = np.radians(color[2])
+    return oklabToXyz((color[0], color[1] * np.cos(hue), color[1] * np.sin(hue)))
+
+
+def xyzToOklch(color: Channels) -> Channels:
+    l, a, b = xyzToOklab(color)
+    chroma = np.hypot(a, b)
+    hue = np.degrees(np.arctan2(b, a))
+
+    return l, chroma, np.where(hue < 0.0, hue + 360.0, hue)
+
+
+def xyzToOklab(color: Channels) -> Channels:
+    x, y, z = color
+
+    l_ = np.cbrt(0.8189330101 * x + 0.3618667424 * y - 0.1288597137 * z)
+    m_ = np.cbrt(0.0329845436 * x + 0.9293118715 * y + 0.0361456387 * z)
+    s_ = np.cbrt(0.0482003018 * x + 0.2643662691 * y + 0.6338517070 * z)
+
+    l = 0.2104542553 * l_ + 0.7936177850 * m_ - 0.0040720468 * s_
+    a = 1.9779984951 * l_ - 2.4285922050 * m_ + 0.4505937099 * s_
+    b = 0.0259040371 * l_ + 0.7827717662 * m_ - 0.8086757660 * s_
+
+    return toe(l), a, b
+
+
+def oklabToXyz(color: Channels) -> Channels:
+    l = toeInv(color[0])
+    a = color[1]
+    b = color[2]
+
+    l_ = (0.9999999984 * l + 0.3963377921 * a + 0.2158037580 * b) ** 3
+    m_ = (1.0000000088 * l - 0.10556134232 * a - 0.0638541747 * b) ** 3
+    s_ = (1.0000000546 * l - 0.08948418209 * a - 1.2914855378 * b) ** 3
+
+    x = +1.2270138511 * l_ - 0.5577999806 * m_ + 0.2812561489 * s_
+    y = -0.0405801784 * l_ + 1.1122568696 * m_ - 0.0716766786 * s_
+    z = -0.0763812845 * l_ - 0.4214819784 * m_ + 1.5861632204 * s_
+
+    return x, y, z
+
+
+def linearSrgbToOklab(color: Channels) -> Channels:
+    r, g, b = color
+
+    l_ = np.cbrt(0.4122214708 * r + 0.5363325363 * g + 0.0514459929 * b)
+    m_ = np.cbrt(0.2119034982 * r + 0.6806995451 * g + 0.1073969566 * b)
+    s_ = np.cbrt(0.0883024619 * r + 0.2817188376 * g + 0.6299787005 * b)
+
+    return (
+        0.2104542553 * l_ + 0.7936177850 * m_ - 0.0040720468 * s_,
+        1.9779984951 * l_ - 2.4285922050 * m_ + 0.4505937099 * s_,
+        0.0259040371 * l_ + 0.7827717662 * m_ - 0.8086757660 * s_,
+    )
+
+
+def oklabToLinearSrgb(color: Channels) -> Channels:
+    l, a, b = color
+
+    l_ = l + 0.3963377774 * a + 0.2158037573 * b
+    m_ = l - 0.1055613458 * a - 0.0638541728 * b
+    s_ = l - 0.0894841775 * a - 1.2914855480 * b
+
+    l = l_ * l_ * l_
+    m = m_ * m_ * m_
+    s = s_ * s_ * s_
+
+    return (
+        +4.0767416621 * l - 3.3077115913 * m + 0.2309699292 * s,
+        -1.2684380046 * l + 2.6097574011 * m - 0.3413193965 * s,
+        -0.0041960863 * l - 0.7034186147 * m + 1.7076147010 * s,
+    )
+
+
+def computeMaxSaturation(a, b):
+    red = -1.88170328 * a - 0.80936493 * b > 1
+    green = 1.81444104 * a - 1.19445276 * b > 1
+
+    # Same coefficient selection as the scalar version, red takes precedence over green.
+    def pick(r: float, g: float, b: float):
+        return np.where(red, r, np.where(green, g, b))
+
+    k0 = pick(+1.19086277, +0.73956515, +1.35733652)
+    k1 = pick(+1.76576728, -0.45954404, -0.00915799)
+    k2 = pick(+0.59662641, +0.08285427, -1.15130210)
+    k3 = pick(+0.75515197, +0.12541070, -0.50559606)
+    k4 = pick(+0.56771245, +0.14503204, +0.00692167)
+    wl = pick(+4.0767416621, -1.2684380046, -0.0041960863)
+    wm = pick(-3.3077115913, +2.6097574011, -0.7034186147)
+    ws = pick(+0.2309699292, -0.3413193965, +1.7076147010)
+
+    S = k0 + k1 * a + k2 * b + k3 * a * a + k4 * a * b
+
+    k_l = +0.3963377774 * a + 0.2158037573 * b
+    k_m = -0.1055613458 * a - 0.0638541728 * b
+    k_s = -0.0894841775 * a - 1.2914855480 * b
+
+    l_ = 1.0 + S * k_l
+    m_ = 1.0 + S * k_m
+    s_ = 1.0 + S * k_s
+
+    l = l_ * l_ * l_
+    m = m_ * m_ * m_
+    s = s_ * s_ * s_
+
+    l_dS = 3.0 * k_l * l_ * l_
+    m_dS = 3.0 * k_m * m_ * m_
+    s_dS = 3.0 * k_s * s_ * s_
+
+    l_dS2 = 6.0 * k_l * k_l * l_
+    m_dS2 = 6.0 * k_m * k_m * m_
+    s_dS2 = 6.0 * k_s * k_s * s_
+
+    f = wl * l + wm * m + ws * s
+    f1 = wl * l_dS + wm * m_dS + ws * s_dS
+    f2 = wl * l_dS2 + wm * m_dS2 + ws * s_dS2
+
+    return S - f * f1 / (f1 * f1 - 0.5 * f * f2)
+
+
+def findCusp(a, b):
+    S_cusp = computeMaxSaturation(a, b)
+
+    r, g, b = oklabToLinearSrgb((1.0, S_cusp * a, S_cusp * b))
+    L_cusp = np.cbrt(1.0 / np.maximum(np.maximum(r, g), b))
+    C_cusp = L_cusp * S_cusp
+
+    return L_cusp, C_cusp
+
+
+def findGamutIntersection(a, b, L1, C1, L0, cusp=None):
+    Lcusp, Ccusp = findCusp(a, b) if cusp is None else cusp
+
+    lower = ((L1 - L0) * Ccusp - (Lcusp - L0) * C1) <= 0.0
+    tLower = Ccusp * L0 / (C1 * Lcusp + Ccusp * (L0 - L1))
+
+    t = Ccusp * (L0 - 1.0) / (C1 * (Lcusp - 1.0) + Ccusp * (L0 - L1))
+
+    dL = L1 - L0
+    dC = C1
+
+    k_l = 0.3963377774 * a + 0.2158037573 * b
+    k_m = -0.1055613458 * a - 0.0638541728 * b
+    k_s = -0.0894841775 * a - 1.2914855480 * b
+
+    l_dt = dL + dC * k_l
+    m_dt = dL + dC * k_m
+    s_dt = dL + dC * k_s
+
+    L = L0 * (1.0 - t) + t * L1
+    C = t * C1
+
+    l_ = L + C * k_l
+    m_ = L + C * k_m
+    s_ = L + C * k_s
+
+    l = l_ * l_ * l_
+    m = m_ * m_ * m_
+    s = s_ * s_ * s_
+
+    ldt = 3 * l_dt * l_ * l_
+    mdt = 3 * m_dt * m_ * m_
+    sdt = 3 * s_dt * s_ * s_
+
+    ldt2 = 6 * l_dt * l_dt * l_
+    mdt2 = 6 * m_dt * m_dt * m_
+    sdt2 = 6 * s_dt * s_dt * s_
+
+    def halleyStep(wl: float, wm: float, ws: float):
+        x = wl * l + wm * m + ws * s - 1
+        x1 = wl * ldt + wm * mdt + ws * sdt
+        x2 = wl * ldt2 + wm * mdt2 + ws * sdt2
+
+        u = x1 / (x1 * x1 - 0.5 * x * x2)
+        return np.where(u >= 0.0, -x * u, math.inf)
+
+    t_r = halleyStep(4.07674166210, -3.30771159130, 0.23096992920)
+    t_g = halleyStep(-1.26843800460, 2.60975740110, -0.34131939650)
+    t_b = halleyStep(-0.00419608630, -0.70341861470, 1.70761470100)
+
+    tUpper = t + np.minimum(t_r, np.minimum(t_g, t_b))
+
+    return np.where(lower, tLower, tUpper)
+
+
+K1 = 0.206
+K2 = 0.03
+K3 = (1.0 + K1) / (1.0 + K2)
+
+
+def toe(x):
+    return 0.5 * (K3 * x - K1 + np.sqrt((K3 * x - K1) * (K3 * x - K1) + 4 * K2 * K3 * x))
+
+
+def toeInv(x):
+    return (x * x + K1 * x) / (K3 * (x + K2))
+
+
+def toST(L_cusp, C_cusp):
+    return C_cusp / L_cusp, C_cusp / (1 - L_cusp)
+
+
+def okhsvToSrgb(color: Channels) -> Channels:
+    h = color[0] / 360
+    s = np.maximum(color[1], 1e-5) / 100
+    v = np.maximum(color[2], 1e-5) / 100
+
+    a_ = np.cos(2.0 * math.pi * h)
+    b_ = np.sin(2.0 * math.pi * h)
+
+    L_cusp, C_cusp, _, _ = cuspAt(h, a_, b_)
+    S_max, T_max = toST(L_cusp, C_cusp)
+    S_0 = 0.5
+    k = 1 - S_0 / S_max
+
+    L_v = 1 - s * S_0 / (S_0 + T_max - T_max * k * s)
+    C_v = s * T_max * S_0 / (S_0 + T_max - T_max * k * s)
+
+    L = v * L_v
+    C = v * C_v
+
+    L_vt = toeInv(L_v)
+    C_vt = C_v * L_vt / L_v
+
+    L_new = toeInv(L)
+    C = C * L_new / L
+    L = L_new
+
+    rgb_scale = oklabToLinearSrgb((L_vt, a_ * C_vt, b_ * C_vt))
+    scale_L = np.cbrt(1.0 / np.maximum(_max3(rgb_scale), 1e-5))
+
+    L = L * scale_L
+    C = C * scale_L
+
+    return linearToSrgb(oklabToLinearSrgb((L, C * a_, C * b_)))
+
+
+def srgbToOkhsv(rgb: Channels) -> Channels:
+    rgb = np.maximum(rgb[0], 1e-5), np.maximum(rgb[1], 1e-5), np.maximum(rgb[2], 1e-5)
+    lab = linearSrgbToOklab(srgbToLinear(rgb))
+
+    C = np.sqrt(lab[1] * lab[1] + lab[2] * lab[2])
+    a_ = lab[1] / C
+    b_ = lab[2] / C
+
+    L = lab[0]
+    h = 0.5 + 0.5 * np.arctan2(-lab[2], -lab[1]) / math.pi
+
+    L_cusp, C_cusp, _, _ = cuspAt(h, a_, b_)
+    S_max, T_max = toST(L_cusp, C_cusp)
+    S_0 = 0.5
+    k = 1 - S_0 / S_max
+
+    t = T_max / (C + L * T_max)
+    L_v = t * L
+    C_v = t * C
+
+    L_vt = toeInv(L_v)
+    C_vt = C_v * L_vt / L_v
+
+    rgb_scale = oklabToLinearSrgb((L_vt, a_ * C_vt, b_ * C_vt))
+    scale_L = np.cbrt(1.0 / np.maximum(_max3(rgb_scale), 1e-5))
+
+    L = L / scale_L
+    C = C / scale_L
+
+    C = C * toe(L) / L
+    L = toe(L)
+
+    v = L / L_v
+    s = (S_0 + T_max) * C_v / ((T_max * S_0) + T_max * k * C_v)
+
+    return h * 360, s * 100, v * 100
+
+
+def get_ST_mid(a_, b_):
+    S = 0.11516993 + 1 / (
+        +7.44778970
+        + 4.15901240 * b_
+        + a_
+        * (
+            -2.19557347
+            + 1.75198401 * b_
+            + a_
+            * (
+                -2.13704948
+                - 10.02301043 * b_
+                + a_ * (-4.24894561 + 5.38770819 * b_ + 4.69891013 * a_)
+            )
+        )
+    )
+
+    T = 0.11239642 + 1.0 / (
+        +1.61320320
+        - 0.68124379 * b_
+        + a_
+        * (
+            +0.40370612
+            + 0.90148123 * b_
+            + a_
+            * (
+                -0.27087943
+                + 0.61223990 * b_
+                + a_ * (+0.00299215 - 0.45399568 * b_ - 0.14661872 * a_)
+            )
+        )
+    )
+
+    return S, T
+
+
+# Interpolates the hue indexed table of `models.cuspTable`, NaN hues stay NaN.
+def cuspAt(h, a_, b_):
+    if isExactCusp():
+        return findCusp(a_, b_) + get_ST_mid(a_, b_)
+
+    hues, table = cuspTable()
+    hues = np.frombuffer(hues, dtype=np.float64)
+    table = np.frombuffer(table, dtype=np.float64).reshape(-1, 4)
+    x = h - np.floor(h)
+    i = np.clip(np.searchsorted(hues, x, side="right") - 1, 0, len(hues) - 2)
+    t = (x - hues[i]) / (hues[i + 1] - hues[i])
+    v0, v1 = table[i], table[i + 1]
+    return tuple([v0[..., k] + t * (v1[..., k] - v0[..., k]) for k in range(4)])
+
+
+def get_Cs(L, a_, b_, cusp=None):
+    if cusp is None:
+        cusp = findCusp(a_, b_) + get_ST_mid(a_, b_)
+
+    C_max = findGamutIntersection(a_, b_, L, 1.0, L, (cusp[0], cusp[1]))
+    ST_max = toST(cusp[0], cusp[1])
+
+    k = C_max / np.minimum((L * ST_max[0]), (1 - L) * ST_max[1])
+
+    ST_mid = cusp[2], cusp[3]
+
+    C_a = L * ST_mid[0]
+    C_b = (1 - L) * ST_mid[1]
+    C_mid = (
+        0.9
+        * k
+        * np.sqrt(
+            np.sqrt(1 / (1 / (C_a * C_a * C_a * C_a) + 1 / (C_b * C_b * C_b * C_b)))
+        )
+    )
+
+    C_a = L * 0.4
+    C_b = (1 - L) * 0.8
+
+    C_0 = np.sqrt(1 / (1 / (C_a * C_a) + 1 / (C_b * C_b)))
+
+    return C_0, C_mid, C_max
+
+
+def okhslToSrgb(hsl: Channels) -> Channels:
+    h = hsl[0] / 360
+    s = np.maximum(hsl[1], 1e-5) / 100
+    l = np.maximum(hsl[2], 1e-5) / 100
+
+    a_ = np.cos(2 * math.pi * h)
+    b_ = np.sin(2 * math.pi * h)
+    L = toeInv(l)
+
+    C_0, C_mid, C_max = get_Cs(L, a_, b_, cuspAt(h, a_, b_))
+
+    mid = 0.8
+    mid_inv = 1.25
+
+    t = mid_inv * s
+    k_1 = mid * C_0
+    k_2 = 1 - k_1 / C_mid
+    CLower = t * k_1 / (1 - k_2 * t)
+
+    t = (s - mid) / (1 - mid)
+    k_0 = C_mid
+    k_1 = (1 - mid) * C_mid * C_mid * mid_inv * mid_inv / C_0
+    k_2 = 1 - (k_1) / (C_max - C_mid)
+    CUpper = k_0 + t * k_1 / (1 - k_2 * t)
+
+    C = np.where(s < mid, CLower, CUpper)
+
+    r, g, b = linearToSrgb(oklabToLinearSrgb((L, C * a_, C * b_)))
+    white = l == 1.0
+    return np.where(white, 1.0, r), np.where(white, 1.0, g), np.where(white, 1.0, b)
+
+
+def srgbToOkhsl(rgb: Channels) -> Channels:
+    rgb = np.maximum(rgb[0], 1e-5), np.maximum(rgb[1], 1e-5), np.maximum(rgb[2], 1e-5)
+    lab = linearSrgbToOklab(srgbToLinear(rgb))
+
+    C = np.sqrt(lab[1] * lab[1] + lab[2] * lab[2])
+    a_ = lab[1] / C
+    b_ = lab[2] / C
+
+    L = lab[0]
+    h = 0.5 + 0.5 * np.arctan2(-lab[2], -lab[1]) / math.pi
+
+    C_0, C_mid, C_max = get_Cs(L, a_, b_, cuspAt(h, a_, b_))
+
+    mid = 0.8
+    mid_inv = 1.25
+
+    k_1 = mid * C_0
+    k_2 = 1 - k_1 / C_mid
+    t = C / (k_1 + k_2 * C)
+    sLower = t * mid
+
+    k_0 = C_mid
+    k_1 = (1 - mid) * C_mid * C_mid * mid_inv * mid_inv / C_0
+    k_2 = 1 - (k_1) / (C_max - C_mid)
+    t = (C - k_0) / (k_1 + k_2 * (C - k_0))
+    sUpper = mid + (1 - mid) * t
+
+    s = np.where(C < C_mid, sLower, sUpper)
+
+    return h * 360, s * 100, toe(L) * 100
+
+
+def _max3(color: Channels):
+    return np.maximum(np.maximum(color[0], color[1]), color[2])
+
+
+def cbrtColor(color: Channels) -> Channels:
+    return np.cbrt(color[0]), np.cbrt(color[1]), np.cbrt(color[2])
+
+
+def cubeColor(color: Channels) -> Channels:
+    return color[0] ** 3, color[1] ** 3, color[2] ** 3
+
+
+def toeLightness(color: Channels) -> Channels:
+    return toe(color[0]), color[1], color[2]
+
+
+def toeInvLightness(color: Channels) -> Channels:
+    return toeInv(color[0]), color[1], color[2]
+
+
+def oklabToOklch(color: Channels) -> Channels:
+    l, a, b = color
+    hue = np.degrees(np.arctan2(b, a))
+    return l, np.hypot(a, b), np.where(hue < 0.0, hue + 360.0, hue)
+
+
+def oklchToOklab(color: Channels) -> Channels:
+    hue = np.radians(color[2])
+    return color[0], color[1] * np.cos(hue), color[1] * np.sin(hue)
+
+
+def matrixStep(matrix: ColorMatrix):
+    (m00, m01, m02), (m10, m11, m12), (m20, m21, m22) = matrix.rows
+
+    def step(color: Channels) -> Channels:
+        c0, c1, c2 = color
+        return (
+            m00 * c0 + m01 * c1 + m02 * c2,
+            m10 * c0 + m11 * c1 + m12 * c2,
+            m20 * c0 + m21 * c1 + m22 * c2,
+        )
+
+    return step
+
+
+# Same path as `compileConversion`, with every function replaced by its vectorized
+# counterpart of the same name in this module.
+@lru_cache(maxsize=None)
+def compileArrayConversion(fromModel: ColorModel, toModel: ColorModel) -> tuple:
+    return tuple(
+        [
+            (
+                matrixStep(step)
+                if isinstance(step, ColorMatrix)
+                else globals()[step.__name__]
+            )
+            for step in compileConversion(fromModel, toModel)
+        ]
+    )
+
+
+# Vectorized version of the indetermination elimination in `transferColorModel`.
+def eliminateIndetermination(
+    colorModel: ColorModel, color: Channels, referenceColor: Channels
+) -> Channels:
+    channels = list(color)
+    for rule in colorModel.descriptor().indeterminacyRules:
+        c = channels[rule.channel]
+        determinate = c > 1e-4
+        if rule.excludeWhite:
+            determinate &= c < 1 - 1e-4
+        for i in rule.replaces:
+            channels[i] = np.where(determinate, channels[i], referenceColor[i])
+
+    return channels[0], channels[1], channels[2]
+
+
+# Batched `transferColorModel`.
+#
+# `colors` is a N×3 buffer of normalized colors, anything `numpy.asarray` accepts
+# (including a flat `array.array("d")` of 3N values) when NumPy is available.
+# `referenceColors` is either a N×3 buffer or a single color shared by all colors.
+# Returns a new N×3 float64 `numpy.ndarray`.
+#
+# Without NumPy, `colors` must be a flat sequence of 3N floats (or N color tuples)
+# and a flat `array.array("d")` is returned. Every color then goes through the
+# scalar `transferColorModel`, so results are identical but not any faster.
+def transferColorModelArray(
+    colors,
+    fromModel: ColorModel,
+    toModel: ColorModel,
+    referenceColors=None,
+    clamp: bool = True,
+):
+    if np is None:
+        return _transferColorModelArrayFallback(
+            colors, fromModel, toModel, referenceColors, clamp
+        )
+
+    colors = np.asarray(colors, dtype=np.float64).reshape(-1, 3)
+    if fromModel == toModel:
+        return colors.copy()
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        color = unnormalize(fromModel, (colors[:, 0], colors[:, 1], colors[:, 2]))
+        for step in compileArrayConversion(fromModel, toModel):
+            color = step(color)
+        normalized = normalize(toModel, color)
+
+        if referenceColors is not None:
+            reference = np.broadcast_to(
+                np.asarray(referenceColors, dtype=np.float64).reshape(-1, 3),
+                colors.shape,
+            )
+            normalized = eliminateIndetermination(
+                toModel, normalized, (reference[:, 0], reference[:, 1], reference[:, 2])
+            )
+
+    result = np.empty(colors.shape, dtype=np.float64)
+    result[:, 0] = normalized[0]
+    result[:, 1] = normalized[1]
+    result[:, 2] = normalized[2]
+    if clamp:
+        np.clip(result, 0.0, 1.0, out=result)
+    return result
+
+
+def flattenColors(colors) -> array.array:
+    if len(colors) > 0 and isinstance(colors[0], Sequence):
+        return array.array("d", [c for color in colors for c in color])
+    return array.array("d", colors)
+
+
+def _transferColorModelArrayFallback(
+    colors,
+    fromModel: ColorModel,
+    toModel: ColorModel,
+    referenceColors,
+    clamp: bool,
+) -> array.array:
+    flat = flattenColors(colors)
+    if len(flat) % 3 != 0:
+        raise ValueError(f"Length of color buffer is not a multiple of 3: {len(flat)}")
+
+    reference = None if referenceColors is None else flattenColors(referenceColors)
+    sharedReference = reference is not None and len(reference) == 3
+
+    result = array.array("d", bytes(len(flat) * flat.itemsize))
+    for i in range(0, len(flat), 3):
+        referenceColor = None
+        if reference is not None:
+            j = 0 if sharedReference else i
+            referenceColor = reference[j], reference[j + 1], reference[j + 2]
+
+        result[i], result[i + 1], result[i + 2] = transferColorModel(
+            (flat[i], flat[i + 1], flat[i + 2]),
+            fromModel,
+            toModel,
+            referenceColor,
+            clamp,
+        )
+    return result
@@ -1,5 +1,16 @@
-from ctypes import CFUNCTYPE, c_int
-from PyQt5.QtCore import QSize, QRectF, Qt, QPoint
+from ctypes import CFUNCTYPE, c_float, c_int
+from PyQt5.QtCore import (
+    QEvent,
+    QObject,
+    QSize,
+    QRectF,
+    QSizeF,
+    Qt,
+    QPoint,
+    QPointF,
+    QTimer,
+    pyqtSignal,
+)
 from PyQt5.QtGui import (
     QMouseEvent,
     QPaintEvent,
@@ -12,7 +23,15 @@ from PyQt5.QtGui import (
     QVector2D,
     QPalette,
     QOpenGLContext,
+    QOpenGLContextGroup,
+    QOpenGLTexture,
+    QOpenGLFramebufferObject,
+    QOpenGLVertexArrayObject,
+    QOffscreenSurface,
+    QSurfaceFormat,
+    QImage,
 )
+from PyQt5 import sip
 from PyQt5.QtWidgets import (
     QOpenGLWidget,
     QMessageBox,
@@ -22,32 +41,41 @@ from PyQt5.QtWidgets import (
     QVBoxLayout,
     QFrame,
 )
-from pathlib import Path
+from abc import ABCMeta, abstractmethod
 from enum import IntEnum
 import math
+import threading
+import time
 
 from .models import (
     ColorModel,
     SettingsPerColorModel,
     SettingsPerColorModel,
     GlobalSettings,
-    transferColorModel,
+    cachedTransferColorModel,
 )
 from .internal_state import STATE
+from .update_scheduler import UPDATE_SCHEDULER
+from .shader_sources import assembleShader
+from .conversion_lut import COLOR_LUT_MODELS, ColorLut, canBakeColorLuts, getColorLut
+from .cpu_renderer import (
+    CPU_FRAME_TIMINGS,
+    GamutArrays,
+    canRenderOnCpu,
+    renderBar,
+    renderPlane,
+    renderRing,
+    toQImage,
+)
 from .config import *
 from .gamut_clipping import (
-    getAxesLimitsInterpolated,
+    AXES_LIMITS_SIGNALS,
+    getGamutTables,
     mapAxesToLimited,
     unmapAxesFromLimited,
 )
 
 
-# Use [18:] to strip the version header, and add new one later before compiling
-fullscreenVertex = open(Path(__file__).parent / "fullscreen.vert").read()[18:]
-wheelFragment = open(Path(__file__).parent / "secondary_channels_plane.frag").read()[18:]
-barFragment = open(Path(__file__).parent / "primary_channel_bar.frag").read()[18:]
-
-
 def computeMoveFactor(e: QMouseEvent) -> float:
     m = e.modifiers()
     if m == Qt.KeyboardModifier.ShiftModifier:
@@ -60,6 +88,11 @@ def computeMoveFactor(e: QMouseEvent) -> float:
 _funcTypes = {
     "glDrawArrays": CFUNCTYPE(None, c_int, c_int, c_int),
     "glViewport": CFUNCTYPE(None, c_int, c_int, c_int, c_int),
+    "glBindFramebuffer": CFUNCTYPE(None, c_int, c_int),
+    "glBindTexture": CFUNCTYPE(None, c_int, c_int),
+    "glActiveTexture": CFUNCTYPE(None, c_int),
+    "glClearColor": CFUNCTYPE(None, c_float, c_float, c_float, c_float),
+    "glClear": CFUNCTYPE(None, c_int),
 }
 
 
@@ -89,25 +122,37 @@ class ColorIndicatorBlocks(QDialog):
         self.mainLayout.addWidget(self.currentColorBox, 1)
         self.mainLayout.addWidget(self.lastColorBox, 1)
 
-        STATE.colorChanged.connect(self.updateColor)
+        STATE.colorChanged.connect(self.rememberColor)
+        UPDATE_SCHEDULER.subscribe(
+            STATE.colorChanged, "indicator blocks", self.updateColor
+        )
         self.lastColor = STATE.color
 
-    def updateColor(self):
-        if self.isVisible():
-            r, g, b = transferColorModel(STATE.color, STATE.colorModel, ColorModel.Rgb)
-            r, g, b = (
-                min(max(int(r * 256), 0), 255),
-                min(max(int(g * 256), 0), 255),
-                min(max(int(b * 256), 0), 255),
-            )
-            color = QColor(r, g, b)
-            self.currentColorBox.setStyleSheet(f"background-color: {color.name()}")
-        else:
+    # Right away rather than at the next frame, so that blocks popped up by a
+    # click show the color of that moment as the last one.
+    def rememberColor(self):
+        if not self.isVisible():
             self.lastColor = STATE.color
 
+    def updateColor(self):
+        if not self.isVisible():
+            return
+        r, g, b = cachedTransferColorModel(
+            STATE.color, STATE.colorModel, ColorModel.Rgb
+        )
+        r, g, b = (
+            min(max(int(r * 256), 0), 255),
+            min(max(int(g * 256), 0), 255),
+            min(max(int(b * 256), 0), 255),
+        )
+        color = QColor(r, g, b)
+        self.currentColorBox.setStyleSheet(f"background-color: {color.name()}")
+
     def popup(self, pos: QPoint):
         self.move(pos)
-        r, g, b = transferColorModel(self.lastColor, STATE.colorModel, ColorModel.Rgb)
+        r, g, b = cachedTransferColorModel(
+            self.lastColor, STATE.colorModel, ColorModel.Rgb
+        )
         r, g, b = (
             min(max(int(r * 256), 0), 255),
             min(max(int(g * 256), 0), 255),
@@ -125,13 +170,115 @@ class ColorIndicatorBlocks(QDialog):
 INDICATOR_BLOCKS = ColorIndicatorBlocks()
 
 
-class OpenGLRenderer(QOpenGLWidget):
+# Time spent building shader programs this session. The first ones are built
+# at startup, which is cold on the first launch, or after the driver or the
+# shaders changed, and warm afterwards, when their binaries are cached.
+class ShaderTimings:
+    def __init__(self) -> None:
+        self.builds: list[tuple[str, float]] = []
+
+    def total(self) -> float:
+        return sum([seconds for _, seconds in self.builds])
+
+    def record(self, name: str, seconds: float):
+        self.builds.append((name, seconds))
+        if LOG_SHADER_TIMINGS:
+            print(
+                f"{DOCKER_NAME}: built {name} program in {seconds * 1000:.1f} ms, "
+                f"{len(self.builds)} programs in {self.total() * 1000:.1f} ms this session"
+            )
+
+
+SHADER_TIMINGS = ShaderTimings()
+
+
+# Whether OpenGL can create a context for the widgets, sharing Krita's.
+def openGLAvailable() -> bool:
+    context = QOpenGLContext()
+    context.setFormat(QSurfaceFormat.defaultFormat())
+    shareContext = QOpenGLContext.globalShareContext()
+    if shareContext != None:
+        context.setShareContext(shareContext)
+    if not context.create():
+        return False
+
+    surface = QOffscreenSurface()
+    surface.setFormat(context.format())
+    surface.create()
+    available = surface.isValid() and context.makeCurrent(surface)
+    if available:
+        context.doneCurrent()
+    surface.destroy()
+    return available
+
+
+# Renders on the CPU with NumPy once OpenGL is unavailable, when it can't
+# create a context or compile the shaders, or when `FORCE_CPU_RENDERING` is
+# set. The widgets replace their OpenGL views once it falls back.
+class RenderBackend(QObject):
+    fellBack = pyqtSignal()
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.cpu = FORCE_CPU_RENDERING and canRenderOnCpu()
+        self.probed = self.cpu
+        self.reported = False
+
+    # Probes OpenGL on first use, once there's an application.
+    def useCpu(self) -> bool:
+        if not self.probed:
+            self.probed = True
+            if not openGLAvailable():
+                self.fallBack("unable to create an OpenGL context")
+        return self.cpu
+
+    def fallBack(self, reason: str):
+        if self.cpu:
+            return
+        if not canRenderOnCpu():
+            if not self.reported:
+                self.reported = True
+                QMessageBox.critical(
+                    None,
+                    "Extended Color Selector - Unable To Use OpenGL",
+                    f"OpenGL is unavailable ({reason}), and rendering without it "
+                    "requires NumPy. Please open a issue on Github and provide "
+                    "your OS and hardware info.",
+                )
+            return
+
+        if LOG_RENDER_BACKEND:
+            print(f"{DOCKER_NAME}: {reason}, rendering on the CPU instead")
+        self.cpu = True
+        self.probed = True
+        self.fellBack.emit()
+
+
+RENDER_BACKEND = RenderBackend()
+
+
+# Metaclass of Qt classes with abstract methods, so that subclasses missing
+# one of them fail to be constructed.
+class QABCMeta(sip.wrappertype, ABCMeta):
+    pass
+
+
+class OpenGLRenderer(QOpenGLWidget, metaclass=QABCMeta):
     class OpenGLWrapper:
         def __init__(self, context: QOpenGLContext) -> None:
             self.context = context
             self.glDrawArrays = getGLFunc(context, "glDrawArrays")
             self.glViewport = getGLFunc(context, "glViewport")
+            self.glBindFramebuffer = getGLFunc(context, "glBindFramebuffer")
+            self.glBindTexture = getGLFunc(context, "glBindTexture")
+            self.glActiveTexture = getGLFunc(context, "glActiveTexture")
+            self.glClearColor = getGLFunc(context, "glClearColor")
+            self.glClear = getGLFunc(context, "glClear")
             self.GL_TRIANGLE_STRIP = 0x0005
+            self.GL_FRAMEBUFFER = 0x8D40
+            self.GL_TEXTURE_2D = 0x0DE1
+            self.GL_TEXTURE0 = 0x84C0
+            self.GL_COLOR_BUFFER_BIT = 0x4000
 
         # From https://krita-artists.org/t/opengl-plugin-on-windows/92731/5
         def getVersionHeader(self):
@@ -159,34 +306,105 @@ class OpenGLRenderer(QOpenGLWidget):
         super().__init__(parent)
         self.gl = None
         self.program = None
-        self.fragment = ""
-        self.vertex = ""
+        # Programs and textures of this widget's share group, set once it has
+        # a context.
+        self.resources: SharedResources | None = None
+        self.programKey: tuple | None = None
+        # Values of the uniforms set on the bound program, to only set the
+        # uniforms that changed.
+        self.programUniforms: dict[str, tuple] = {}
+        self.versionHeader = ""
+        # Vertices are generated from `gl_VertexID`, but core profiles still
+        # need a vertex array object bound to draw.
+        self.vertexArray: QOpenGLVertexArrayObject | None = None
 
     def initializeGL(self) -> None:
         context = self.context()
-        if context == None:
-            QMessageBox.critical(
-                self,
-                "Extended Color Selector - Unable To Get OpenGL Context",
-                "This shouldn't happen theoretically. Please open a issue on Github and provide your OS and hardware info.",
-            )
+        if context == None or not context.isValid():
+            RENDER_BACKEND.fallBack("unable to get an OpenGL context")
             return
-        self.program = QOpenGLShaderProgram(self.context())
         self.gl = OpenGLRenderer.OpenGLWrapper(context)
+        self.versionHeader = self.gl.getVersionHeader()
+        self.resources = getSharedResources(context)
+        vertexArray = QOpenGLVertexArrayObject(self)
+        if vertexArray.create():
+            self.vertexArray = vertexArray
+
+    # Everything the shaders are specialized for, besides the version header.
+    # Called on every paint, with the context current.
+    @abstractmethod
+    def shaderInputs(self) -> tuple:
+        pass
+
+    # Fragment shader built from the inputs of `bindProgram`, without the
+    # version header.
+    @abstractmethod
+    def buildFragmentShader(self, inputs: tuple) -> str:
+        pass
+
+    # Covers the whole widget with a single quad by default.
+    def buildVertexShader(self, inputs: tuple) -> str:
+        return assembleShader("fullscreen.vert")
+
+    # The variant to use is picked on next paint, and compiled if it isn't yet.
+    def updateShaders(self):
+        self.update()
 
-    def compileShader(self):
-        if len(self.vertex) == 0 or len(self.fragment) == 0:
-            return
+    # Binds the variant built from `inputs`, `shaderInputs` by default,
+    # compiling it on first use. Only called with the context current, from
+    # `paintGL`.
+    def bindProgram(self, inputs: tuple | None = None) -> bool:
+        if self.gl == None:
+            return False
+
+        if inputs == None:
+            inputs = self.shaderInputs()
+        self.programKey = (self.versionHeader,) + inputs
+        program = self.resources.programs.get(self.programKey)
+        if program == None:
+            program = self.compileShader(
+                self.versionHeader + self.buildVertexShader(self.programKey[1:]),
+                self.versionHeader + self.buildFragmentShader(self.programKey[1:]),
+            )
+            if program == None:
+                return False
+            self.resources.programs[self.programKey] = program
+        self.program = program
+        self.programUniforms = self.resources.uniformValues.setdefault(
+            self.programKey, {}
+        )
+        if self.vertexArray != None:
+            self.vertexArray.bind()
+        return program.bind()
 
-        self.program = QOpenGLShaderProgram(self.context())
-        vert = QOpenGLShader(QOpenGLShader.ShaderTypeBit.Vertex)
-        vert.compileSourceCode(self.vertex)
-        frag = QOpenGLShader(QOpenGLShader.ShaderTypeBit.Fragment)
-        frag.compileSourceCode(self.fragment)
-        self.program.addShader(vert)
-        self.program.addShader(frag)
-        self.program.link()
-        self.update()
+    # Sets a uniform of the bound program, unless it already has this value.
+    def setUniform(self, name: str, *value: float | int):
+        if self.programUniforms.get(name) == value:
+            return
+        self.programUniforms[name] = value
+        self.program.setUniformValue(name, *value)
+
+    # Cacheable shaders are linked from the program binary Qt stored in
+    # Krita's cache directory at a previous launch, keyed by the GL driver and
+    # the sources. Qt compiles the sources instead when there's none, or when
+    # the driver rejects it, and stores the binary for the next launch. None
+    # when the driver can't compile or link it either, falling back to the CPU.
+    def compileShader(
+        self, vertex: str, fragment: str
+    ) -> QOpenGLShaderProgram | None:
+        start = time.perf_counter()
+        program = QOpenGLShaderProgram(self.resources)
+        program.addCacheableShaderFromSourceCode(
+            QOpenGLShader.ShaderTypeBit.Vertex, vertex
+        )
+        program.addCacheableShaderFromSourceCode(
+            QOpenGLShader.ShaderTypeBit.Fragment, fragment
+        )
+        if not program.link():
+            RENDER_BACKEND.fallBack(f"unable to link shaders:\n{program.log()}")
+            return None
+        SHADER_TIMINGS.record(type(self).__name__, time.perf_counter() - start)
+        return program
 
     def resizeGL(self, w: int, h: int):
         if self.gl == None:
@@ -194,7 +412,416 @@ class OpenGLRenderer(QOpenGLWidget):
         self.gl.glViewport(0, 0, w, h)
 
 
-class SecondaryChannelsPlane(OpenGLRenderer):
+# Limits and spans of the current color model as float textures, for shaders
+# to interpolate per fragment. They're only uploaded again once invalidated,
+# when the color model changes or tables are baked, and only with the
+# context of their widget current.
+class GamutTextures:
+    LIMITS_UNIT = 0
+    SPANS_UNIT = 1
+
+    def __init__(self) -> None:
+        self.uploaded: tuple[ColorModel, bool] | None = None
+        self.limits: QOpenGLTexture | None = None
+        self.spans: QOpenGLTexture | None = None
+        # Counts uploads, images rendered with older tables are stale.
+        self.generation = 0
+
+    def invalidate(self):
+        self.uploaded = None
+
+    # Uploads the tables needed to clip to the gamut, and returns whether the
+    # shader uses the limits, the spans, and fades out values off the clipped
+    # plane. These select the shader variant, so it's called before binding it.
+    def prepare(
+        self, colorModel: ColorModel, settings: SettingsPerColorModel
+    ) -> tuple[bool, bool, bool]:
+        if not settings.clipToSrgbGamut:
+            return False, False, False
+        if self.uploaded != (colorModel, settings.clipToGamutShape):
+            self.upload(colorModel, settings.clipToGamutShape)
+
+        limitsEnabled, spansEnabled = self.limits != None, self.spans != None
+        # Colorful secondary values aren't the ones on the plane.
+        clippedRange = limitsEnabled and not settings.colorfulPrimaryChannel
+        return limitsEnabled, spansEnabled, clippedRange
+
+    # Binds the uploaded tables, shaders not clipping to the gamut ignore them.
+    def bind(self, renderer: "OpenGLRenderer"):
+        renderer.setUniform("axesLimitsTable", GamutTextures.LIMITS_UNIT)
+        renderer.setUniform("gamutSpansTable", GamutTextures.SPANS_UNIT)
+        if self.limits != None:
+            self.limits.bind(GamutTextures.LIMITS_UNIT)
+        if self.spans != None:
+            self.spans.bind(GamutTextures.SPANS_UNIT)
+
+    def upload(self, colorModel: ColorModel, withSpans: bool):
+        self.destroy()
+        limits, spans = getGamutTables(colorModel, withSpans)
+        if limits != None:
+            self.limits = createFloatTexture(
+                QOpenGLTexture.TextureFormat.RGBA32F,
+                QOpenGLTexture.PixelFormat.RGBA,
+                len(limits) // (3 * 4),
+                3,
+                limits,
+            )
+        if spans != None:
+            self.spans = createFloatTexture(
+                QOpenGLTexture.TextureFormat.RG32F,
+                QOpenGLTexture.PixelFormat.RG,
+                GAMUT_SPAN_ROWS,
+                len(spans) // (GAMUT_SPAN_ROWS * 2),
+                spans,
+            )
+        self.uploaded = colorModel, withSpans
+        self.generation += 1
+
+    def destroy(self):
+        for texture in (self.limits, self.spans):
+            if texture != None:
+                texture.destroy()
+        self.limits = self.spans = None
+
+
+class ColorLutSignals(QObject):
+    # Emitted once a table baked in the background is ready to upload.
+    baked = pyqtSignal()
+
+
+COLOR_LUT_SIGNALS = ColorLutSignals()
+COLOR_LUT_BAKE_LOCK = threading.Lock()
+# Models whose table is being baked.
+COLOR_LUT_BAKING: set[ColorModel] = set()
+
+
+# A table takes 50 to 170 ms to bake, far longer than a frame, so it's baked
+# on a background thread, and shaders convert colors until it's ready.
+def startBakingColorLut(colorModel: ColorModel):
+    with COLOR_LUT_BAKE_LOCK:
+        if colorModel in COLOR_LUT_BAKING:
+            return
+        COLOR_LUT_BAKING.add(colorModel)
+    threading.Thread(
+        target=_bakeColorLut, args=(colorModel,), name="color_lut_baker", daemon=True
+    ).start()
+
+
+def _bakeColorLut(colorModel: ColorModel):
+    try:
+        getColorLut(colorModel).build()
+    finally:
+        with COLOR_LUT_BAKE_LOCK:
+            COLOR_LUT_BAKING.discard(colorModel)
+    COLOR_LUT_SIGNALS.baked.emit()
+
+
+# The lookup table of the current color model as a 3D texture, for shaders to
+# look colors up in rather than convert them, when enabled in the global
+# settings. Baked in the background the first time a color model uses it, and
+# uploaded once ready.
+class ColorLutTexture:
+    UNIT = 2
+
+    def __init__(self) -> None:
+        self.lut: ColorLut | None = None
+        self.texture: QOpenGLTexture | None = None
+
+    # Uploads the table of `colorModel`, and returns whether the shader looks
+    # colors up in it, which selects the shader variant like
+    # `GamutTextures.prepare`. Tables not baked yet start baking, and the
+    # shader converts colors meanwhile.
+    def prepare(self, colorModel: ColorModel) -> bool:
+        if (
+            not STATE.globalSettings.colorLutEnabled
+            or colorModel not in COLOR_LUT_MODELS
+            or not canBakeColorLuts()
+        ):
+            return False
+        if getColorLut(colorModel).texels is None:
+            startBakingColorLut(colorModel)
+            return False
+        if self.lut == None or self.lut.colorModel != colorModel:
+            self.upload(colorModel)
+        return True
+
+    # Binds the uploaded table, shaders not looking colors up ignore it.
+    def bind(self, renderer: "OpenGLRenderer"):
+        if self.lut == None or self.texture == None:
+            return
+        renderer.setUniform("colorLut", ColorLutTexture.UNIT)
+        renderer.setUniform("colorLutMin", *self.lut.domainMin)
+        renderer.setUniform("colorLutMax", *self.lut.domainMax)
+        self.texture.bind(ColorLutTexture.UNIT)
+
+    # Texels are stored as half floats and interpolated linearly, which is
+    # what `ColorLut.report` measures.
+    def upload(self, colorModel: ColorModel):
+        self.destroy()
+        lut = getColorLut(colorModel)
+        texels = lut.build()
+        n = lut.resolution
+
+        texture = QOpenGLTexture(QOpenGLTexture.Target.Target3D)
+        texture.setFormat(QOpenGLTexture.TextureFormat.RGBA16F)
+        texture.setSize(n, n, n)
+        texture.setMipLevels(1)
+        texture.allocateStorage(
+            QOpenGLTexture.PixelFormat.RGBA, QOpenGLTexture.PixelType.Float32
+        )
+        texture.setMinMagFilters(
+            QOpenGLTexture.Filter.Linear, QOpenGLTexture.Filter.Linear
+        )
+        texture.setWrapMode(QOpenGLTexture.WrapMode.ClampToEdge)
+        texture.setData(
+            QOpenGLTexture.PixelFormat.RGBA,
+            QOpenGLTexture.PixelType.Float32,
+            sip.voidptr(texels),
+        )
+        self.lut = lut
+        self.texture = texture
+
+    def destroy(self):
+        if self.texture != None:
+            self.texture.destroy()
+        self.lut = self.texture = None
+
+
+# An image a widget rendered into a framebuffer object, along with the inputs
+# it was rendered from, to only render it again once they change. Colors are
+# stored with 8 bits per channel, like the widget's own framebuffer.
+class RetainedImage:
+    def __init__(self) -> None:
+        self.fbo: QOpenGLFramebufferObject | None = None
+        self.inputs: tuple | None = None
+
+    # Whether the image must be rendered again for `inputs` at `size` device
+    # pixels, in which case its framebuffer is bound to render it.
+    def begin(self, size: QSize, inputs: tuple) -> bool:
+        if self.fbo == None or self.fbo.size() != size:
+            self.fbo = QOpenGLFramebufferObject(size)
+            self.inputs = None
+        if self.inputs == inputs:
+            return False
+
+        self.inputs = inputs
+        self.fbo.bind()
+        return True
+
+    def bindTexture(self, gl: "OpenGLRenderer.OpenGLWrapper", unit: int):
+        gl.glActiveTexture(gl.GL_TEXTURE0 + unit)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.fbo.texture())
+
+
+# Programs, the values of their uniforms, and the gamut and lookup table
+# textures, for every widget of an OpenGL share group. Krita shares the
+# contexts of all its widgets, so however many selectors there are, each
+# program is compiled once and each table uploaded once. They're dropped along
+# with the share group.
+class SharedResources(QObject):
+    def __init__(self) -> None:
+        super().__init__()
+        # Linked programs by the version header and `shaderInputs`, so going
+        # back to a color model or setting only binds its program again.
+        self.programs: dict[tuple, QOpenGLShaderProgram] = {}
+        # Values of the uniforms set on every program, by program key.
+        self.uniformValues: dict[tuple, dict[str, tuple]] = {}
+        self.gamutTextures = GamutTextures()
+        self.colorLutTexture = ColorLutTexture()
+
+        STATE.colorModelChanged.connect(self.gamutTextures.invalidate)
+        AXES_LIMITS_SIGNALS.loaded.connect(self.gamutTextures.invalidate)
+
+
+# Resources by the address of their share group.
+SHARED_RESOURCES: dict[int, SharedResources] = {}
+
+
+def getSharedResources(context: QOpenGLContext) -> SharedResources:
+    group: QOpenGLContextGroup = context.shareGroup()
+    key = int(sip.unwrapinstance(group))
+    resources = SHARED_RESOURCES.get(key)
+    if resources == None:
+        resources = SharedResources()
+        SHARED_RESOURCES[key] = resources
+        group.destroyed.connect(lambda *_: SHARED_RESOURCES.pop(key, None))
+    return resources
+
+
+# Limits and spans of the current color model for every widget rendering on
+# the CPU, like `SharedResources.gamutTextures`.
+CPU_GAMUT_ARRAYS = GamutArrays()
+STATE.colorModelChanged.connect(CPU_GAMUT_ARRAYS.invalidate)
+AXES_LIMITS_SIGNALS.loaded.connect(CPU_GAMUT_ARRAYS.invalidate)
+
+
+# `#define`s of `channels.glsl` and `gamut_limits.glsl`, for the settings the
+# shader is specialized for. `gamutFlags` are the ones of
+# `GamutTextures.prepare`, `colorLut` the result of `ColorLutTexture.prepare`.
+def channelDefines(
+    colorModel: ColorModel,
+    primaryIndex: int,
+    outOfGamutColor: bool,
+    gamutFlags: tuple[bool, bool, bool],
+    colorLut: bool,
+) -> dict[str, str]:
+    mn, mx = colorModel.limits()
+    defines = {
+        "PRIMARY_INDEX": str(primaryIndex),
+        "LIM_MIN": glslVec3(mn),
+        "LIM_MAX": glslVec3(mx),
+    }
+    limitsEnabled, spansEnabled, clippedRange = gamutFlags
+    return defines | flagDefines(
+        OUT_OF_GAMUT_COLOR=outOfGamutColor,
+        COLOR_LUT=colorLut,
+        AXES_LIMITS=limitsEnabled,
+        GAMUT_SPANS=spansEnabled,
+        CLIPPED_RANGE=clippedRange,
+    )
+
+
+# Flags are only defined when set, for `#ifdef`.
+def flagDefines(**flags: bool) -> dict[str, str]:
+    return {name: "1" for name, enabled in flags.items() if enabled}
+
+
+def glslVec3(values: tuple[float, float, float]) -> str:
+    return f"vec3({float(values[0])!r}, {float(values[1])!r}, {float(values[2])!r})"
+
+
+# The color out of gamut colors are drawn with, `None` when they're clamped.
+# Colors with a channel at zero are clamped too, like they always were.
+def outOfGamutColor(colorModel: ColorModel) -> tuple[float, float, float] | None:
+    globalSettings = STATE.globalSettings
+    if not globalSettings.outOfGamutColorEnabled or not colorModel.isNotSrgbBased():
+        return None
+    color = globalSettings.outOfGamutColor
+    if any([c <= 0.0 for c in color]):
+        return None
+    return color[0], color[1], color[2]
+
+
+# Texels are only ever fetched, never filtered, which float formats don't
+# support everywhere.
+def createFloatTexture(
+    format: QOpenGLTexture.TextureFormat,
+    pixelFormat: QOpenGLTexture.PixelFormat,
+    width: int,
+    height: int,
+    values,
+) -> QOpenGLTexture:
+    texture = QOpenGLTexture(QOpenGLTexture.Target.Target2D)
+    texture.setFormat(format)
+    texture.setSize(width, height)
+    texture.setMipLevels(1)
+    texture.allocateStorage(pixelFormat, QOpenGLTexture.PixelType.Float32)
+    texture.setMinMagFilters(
+        QOpenGLTexture.Filter.Nearest, QOpenGLTexture.Filter.Nearest
+    )
+    texture.setWrapMode(QOpenGLTexture.WrapMode.ClampToEdge)
+    texture.setData(pixelFormat, QOpenGLTexture.PixelType.Float32, sip.voidptr(values))
+    return texture
+
+
+# A widget showing what its view renders, with OpenGL, or on the CPU once
+# OpenGL is unavailable. The view covers the whole widget, and lets mouse
+# events through to it.
+class RenderedWidget(QWidget, metaclass=QABCMeta):
+    def __init__(self, parent: QWidget | None) -> None:
+        super().__init__(parent)
+        self.viewLayout = QVBoxLayout(self)
+        self.viewLayout.setContentsMargins(0, 0, 0, 0)
+        self.view: QWidget | None = None
+        self.parameters: RenderParameters | None = None
+        # Set by `updateView` until the view rendered again. Paints in between,
+        # like the ones of `update` while dragging an indicator, only draw the
+        # indicators over what the view rendered last.
+        self.renderPending = True
+        RENDER_BACKEND.fellBack.connect(self.replaceView)
+        STATE.settingsChanged.connect(self.invalidateParameters)
+        STATE.colorModelChanged.connect(self.invalidateParameters)
+
+    @abstractmethod
+    def createView(self, cpu: bool) -> QWidget:
+        pass
+
+    def buildParameters(self) -> "RenderParameters":
+        return RenderParameters(self.res)
+
+    # Built on first use after the settings, the color model, the size or the
+    # palette changed, for every frame until then.
+    def renderParameters(self) -> "RenderParameters":
+        if self.parameters == None:
+            self.parameters = self.buildParameters()
+        return self.parameters
+
+    def invalidateParameters(self):
+        self.parameters = None
+
+    def resizeEvent(self, e: QResizeEvent | None):
+        super().resizeEvent(e)
+        self.invalidateParameters()
+        self.renderPending = True
+
+    # Creates the view of the current backend, replacing the previous one.
+    def replaceView(self):
+        cpu = RENDER_BACKEND.useCpu()
+        if self.view != None:
+            if isinstance(self.view, OpenGLRenderer) != cpu:
+                return
+            self.viewLayout.removeWidget(self.view)
+            self.view.hide()
+            self.view.deleteLater()
+
+        self.view = self.createView(cpu)
+        self.renderPending = True
+        self.view.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.viewLayout.addWidget(self.view)
+
+    # Hidden widgets don't paint, and render once shown again anyway.
+    def updateView(self):
+        self.renderPending = True
+        if self.view != None and self.isVisible():
+            self.view.update()
+
+
+# What a widget shows besides the color, in device independent pixels. Only
+# the plane has a ring and a background.
+class RenderParameters:
+    def __init__(self, res: float) -> None:
+        settings = STATE.currentSettings()
+        self.res = float(res)
+        self.outOfGamut = outOfGamutColor(STATE.colorModel)
+        self.colorfulPrimaryChannel = settings.colorfulPrimaryChannel
+        self.rotation = math.radians(settings.rotation)
+        self.rotateWithRing = settings.wheelRotateWithRing
+        self.ringRotation = float(math.radians(settings.ringRotation))
+        self.ringReversed = settings.ringReversed
+        self.ringThickness = 0.0
+        self.ringMargin = 0.0
+        self.background = 0.0, 0.0, 0.0
+
+
+# What the plane and the ring show for the current state, in device pixels,
+# for either view to render.
+class PlaneFrame:
+    def __init__(
+        self, plane: "SecondaryChannelsPlane", highDpiScale: float
+    ) -> None:
+        parameters = plane.renderParameters()
+        self.res = parameters.res * highDpiScale
+        self.ringThickness = parameters.ringThickness * highDpiScale
+        self.ringMargin = parameters.ringMargin * highDpiScale
+        self.outOfGamut = parameters.outOfGamut
+        self.background = parameters.background
+        self.primaryValue = float(STATE.color[STATE.primaryIndex])
+        self.rotation = plane.getActualPlaneRotation()
+        self.secondaryValues = getSecondaryValues(parameters.colorfulPrimaryChannel)
+        self.ringRotation = parameters.ringRotation
+
+
+class SecondaryChannelsPlane(RenderedWidget):
     class PlaneEditing(IntEnum):
         Plane = 1
         Ring = 2
@@ -208,13 +835,33 @@ class SecondaryChannelsPlane(OpenGLRenderer):
         self.res = 1
         self.editStart = QVector2D()
         self.shiftStart = QVector2D()
+        self.backgroundColor = QColor(0, 0, 0)
         self.setMinimumSize(MIN_WHEEL_SIZE, MIN_WHEEL_SIZE)
         self.setMaximumSize(MAX_WHEEL_SIZE, MAX_WHEEL_SIZE)
+        self.updateBackgroundColor()
+        self.replaceView()
+
+        STATE.settingsChanged.connect(self.updateFromSettings)
+        STATE.colorModelChanged.connect(self.updateView)
+        UPDATE_SCHEDULER.subscribe(STATE.colorChanged, "plane", self.updateView)
+        STATE.primaryChannelIndexChanged.connect(self.updateView)
+        AXES_LIMITS_SIGNALS.loaded.connect(self.updateView)
+        COLOR_LUT_SIGNALS.baked.connect(self.updateView)
 
-        STATE.settingsChanged.connect(self.updateShaders)
-        STATE.colorModelChanged.connect(self.updateShaders)
-        STATE.colorChanged.connect(self.update)
-        STATE.primaryChannelIndexChanged.connect(self.update)
+    def createView(self, cpu: bool) -> QWidget:
+        return PlaneCpuView(self) if cpu else PlaneOpenGLView(self)
+
+    def buildParameters(self) -> RenderParameters:
+        parameters = RenderParameters(self.res)
+        ringThickness, ringMargin = self.getActualRingThicknessAndMargin()
+        parameters.ringThickness = ringThickness
+        parameters.ringMargin = ringMargin
+        parameters.background = (
+            self.backgroundColor.redF(),
+            self.backgroundColor.greenF(),
+            self.backgroundColor.blueF(),
+        )
+        return parameters
 
     def resizeEvent(self, e: QResizeEvent | None):
         super().resizeEvent(e)
@@ -222,7 +869,7 @@ class SecondaryChannelsPlane(OpenGLRenderer):
             return
 
         self.res = min(self.width(), self.height())
-        self.update()
+        self.updateView()
 
     def hasHeightForWidth(self) -> bool:
         return True
@@ -264,6 +911,7 @@ class SecondaryChannelsPlane(OpenGLRenderer):
                 STATE.primaryIndex,
                 STATE.primaryValue(),
                 (cx, cy),
+                settings.clipToGamutShape,
             )
 
         STATE.updateSecondaryValues((cx, cy))
@@ -351,6 +999,7 @@ class SecondaryChannelsPlane(OpenGLRenderer):
                 STATE.primaryIndex,
                 STATE.primaryValue(),
                 (cx, cy),
+                settings.clipToGamutShape,
             )
 
         if settings.swapAxes:
@@ -396,11 +1045,9 @@ class SecondaryChannelsPlane(OpenGLRenderer):
         ringX, ringY = (ringX * 0.5 + 0.5) * self.res, (-ringY * 0.5 + 0.5) * self.res
         return ringX, ringY
 
-    def paintEvent(self, e: QPaintEvent | None):
-        super().paintEvent(e)
-
+    # Drawn over the plane and the ring by the view.
+    def paintIndicators(self, painter: QPainter):
         x, y = self.getCurrentPlaneWidgetCoord()
-        painter = QPainter(self)
         painter.setBrush(QBrush(QColor(255, 255, 255, 255)))
         painter.drawArc(
             QRectF(x - 4, y - 3, 8, 8),
@@ -415,142 +1062,386 @@ class SecondaryChannelsPlane(OpenGLRenderer):
         ringX, ringY = self.getCurrentRingWidgetCoord()
         painter.drawArc(QRectF(ringX - 4, ringY - 2, 8, 8), 0, 360 * 16)
 
-    def initializeGL(self):
-        super().initializeGL()
-        self.updateShaders()
-
-    def updateShaders(self):
-        if self.gl == None or self.program == None:
-            return
-
-        settings = STATE.currentSettings()
-        header = self.gl.getVersionHeader()
-        self.vertex = header + fullscreenVertex
-
-        fragCode = settings.shape.modifyShader(
-            STATE.colorModel.modifyShader(wheelFragment)
-        )
-
-        ringThickness, _ = self.getActualRingThicknessAndMargin()
-        if ringThickness < 0.0:
-            begin = fragCode.find("BEGIN RING RENDERING")
-            end = fragCode.find("END RING RENDERING")
-            fragCode = fragCode[:begin] + fragCode[end:]
+    def updateFromSettings(self):
+        self.updateBackgroundColor()
+        self.updateView()
 
+    # A uniform, so that changing theme doesn't build another program.
+    def updateBackgroundColor(self):
         if Application.activeWindow() == None:  # type: ignore
             return
         palette = Application.activeWindow().qwindow().palette()  # type: ignore
-        bgColor: QColor = palette.color(QPalette.ColorRole.Window)
-        fragCode = fragCode.replace(
-            "const vec3 BACKGROUND_COLOR = vec3(0.0);",
-            f"const vec3 BACKGROUND_COLOR = vec3({bgColor.redF()}, {bgColor.greenF()}, {bgColor.blueF()});",
-        )
-        self.fragment = header + fragCode
+        self.backgroundColor = palette.color(QPalette.ColorRole.Window)
+        self.invalidateParameters()
 
-        self.compileShader()
+    def changeEvent(self, e: QEvent | None):
+        super().changeEvent(e)
+        if e != None and e.type() == QEvent.Type.PaletteChange:
+            self.updateBackgroundColor()
+            self.updateView()
 
     def getActualPlaneRotation(self) -> float:
-        settings = STATE.currentSettings()
-        if settings.wheelRotateWithRing:
+        parameters = self.renderParameters()
+        if parameters.rotateWithRing:
             c = STATE.color[STATE.primaryIndex]
-            if settings.ringReversed:
+            if parameters.ringReversed:
                 c = -c
             return (
-                math.radians(settings.rotation)
-                - (c + 0.5) * 2 * math.pi
-                - math.radians(settings.ringRotation)
+                parameters.rotation - (c + 0.5) * 2 * math.pi - parameters.ringRotation
             )
         else:
-            return math.radians(settings.rotation)
+            return parameters.rotation
+
+
+# The values of the other two channels the ring and the bar show, colorful
+# ones when the primary channel is.
+def getSecondaryValues(colorfulPrimaryChannel: bool) -> tuple[float, float]:
+    maybeColorfuledColor = (
+        STATE.colorModel.makeColorful(STATE.color, STATE.primaryIndex)
+        if colorfulPrimaryChannel
+        else STATE.color
+    )
+    match STATE.primaryIndex:
+        case 0:
+            return maybeColorfuledColor[1], maybeColorfuledColor[2]
+        case 1:
+            return maybeColorfuledColor[0], maybeColorfuledColor[2]
+        case _:
+            return maybeColorfuledColor[0], maybeColorfuledColor[1]
+
+
+class PlaneOpenGLView(OpenGLRenderer):
+    # The plane and the ring are rendered into images of their own, the plane
+    # with the background, and composited on the widget. Each is only
+    # rendered again when something it shows changes, dragging on the plane
+    # only renders the ring, and dragging on the ring only the plane.
+    class RenderPass(IntEnum):
+        Plane = 0
+        Ring = 1
+        Composite = 2
+
+    # The ring pass only covers the ring, with a strip of this many quads.
+    RING_SEGMENTS = 64
+
+    def __init__(self, plane: SecondaryChannelsPlane):
+        super().__init__(plane)
+        self.plane = plane
+        self.planeImage = RetainedImage()
+        self.ringImage = RetainedImage()
+        self.hasRing = False
 
-    def paintGL(self):
-        if self.gl == None or self.program == None:
-            return
+    def paintEvent(self, e: QPaintEvent | None):
+        UPDATE_SCHEDULER.counters.painted("plane")
+        super().paintEvent(e)
+        self.plane.paintIndicators(QPainter(self))
 
-        highDpiScale = self.devicePixelRatioF()
+    # The images of a previous context are gone along with it.
+    def initializeGL(self):
+        super().initializeGL()
+        self.planeImage = RetainedImage()
+        self.ringImage = RetainedImage()
+        self.updateShaders()
 
-        self.program.bind()
+    def shaderInputs(self) -> tuple:
+        settings = STATE.currentSettings()
+        return (
+            STATE.colorModel,
+            settings.shape,
+            STATE.primaryIndex,
+            self.plane.renderParameters().outOfGamut != None,
+            self.resources.gamutTextures.prepare(STATE.colorModel, settings),
+            self.resources.colorLutTexture.prepare(STATE.colorModel),
+            settings.swapAxes,
+            settings.reverseX,
+            settings.reverseY,
+            settings.ringReversed,
+        )
 
-        self.program.setUniformValue("res", float(self.res * highDpiScale))
-        self.program.setUniformValue(
-            "primaryValue", float(STATE.color[STATE.primaryIndex])
+    def buildVertexShader(self, inputs: tuple) -> str:
+        if inputs[0] != PlaneOpenGLView.RenderPass.Ring:
+            return super().buildVertexShader(inputs)
+        defines = {"RING_SEGMENTS": str(PlaneOpenGLView.RING_SEGMENTS)}
+        return assembleShader("ring.vert", None, defines)
+
+    # Inputs are the `RenderPass`, followed by `shaderInputs` for the plane
+    # and the ring, or by whether there's a ring for the composite.
+    def buildFragmentShader(self, inputs: tuple) -> str:
+        renderPass = inputs[0]
+        if renderPass == PlaneOpenGLView.RenderPass.Composite:
+            defines = flagDefines(RING=inputs[1])
+            return assembleShader("plane_composite.frag", None, defines)
+
+        colorModel, shape, primaryIndex, outOfGamut = inputs[1:5]
+        gamutFlags, colorLut = inputs[5:7]
+        swapAxes, reverseX, reverseY, ringReversed = inputs[7:]
+        defines = channelDefines(
+            colorModel, primaryIndex, outOfGamut, gamutFlags, colorLut
+        )
+        defines |= flagDefines(
+            SWAP_AXES=swapAxes,
+            REVERSE_X=reverseX,
+            REVERSE_Y=reverseY,
+            RING_REVERSED=ringReversed,
+            RING_PASS=renderPass == PlaneOpenGLView.RenderPass.Ring,
+        )
+        return assembleShader(
+            "secondary_channels_plane.frag",
+            {
+                "colorModel": colorModel.shaderComponent(),
+                "shape": shape.shaderComponent(),
+            },
+            defines,
         )
-        self.program.setUniformValue("primaryIndex", int(STATE.primaryIndex))
 
-        settings = STATE.currentSettings()
-        globalSettings = STATE.globalSettings
+    def paintGL(self):
+        if self.gl == None:
+            return
 
-        axesConfig = 0
-        if settings.swapAxes:
-            axesConfig |= 1 << 0
-        if settings.reverseX:
-            axesConfig |= 1 << 1
-        if settings.reverseY:
-            axesConfig |= 1 << 2
-        if settings.ringReversed:
-            axesConfig |= 1 << 3
-
-        self.program.setUniformValue("axesConfig", axesConfig)
-        mn, mx = STATE.colorModel.limits()
-        self.program.setUniformValue("lim_min", mn[0], mn[1], mn[2])
-        self.program.setUniformValue("lim_max", mx[0], mx[1], mx[2])
-
-        if globalSettings.outOfGamutColorEnabled and STATE.colorModel.isNotSrgbBased():
-            self.program.setUniformValue(
-                "outOfGamut",
-                globalSettings.outOfGamutColor[0],
-                globalSettings.outOfGamutColor[1],
-                globalSettings.outOfGamutColor[2],
-            )
-        else:
-            self.program.setUniformValue("outOfGamut", -1.0, -1.0, -1.0)
-        self.program.setUniformValue("rotation", self.getActualPlaneRotation())
-        ringThickness, ringMargin = self.getActualRingThicknessAndMargin()
-        self.program.setUniformValue(
-            "ringThickness", float(ringThickness * highDpiScale)
-        )
-        self.program.setUniformValue("ringMargin", float(ringMargin * highDpiScale))
-        self.program.setUniformValue(
-            "ringRotation", float(math.radians(settings.ringRotation))
+        size = self.size() * self.devicePixelRatioF()
+        if self.plane.renderPending or self.planeImage.fbo == None:
+            self.plane.renderPending = False
+            self.renderImages(size)
+
+        self.gl.glBindFramebuffer(
+            self.gl.GL_FRAMEBUFFER, self.defaultFramebufferObject()
         )
+        self.gl.glViewport(0, 0, size.width(), size.height())
+        composite = PlaneOpenGLView.RenderPass.Composite
+        if self.planeImage.fbo == None or not self.bindProgram(
+            (composite, self.hasRing)
+        ):
+            return
+        self.planeImage.bindTexture(self.gl, 0)
+        self.setUniform("planeImage", 0)
+        if self.hasRing:
+            self.ringImage.bindTexture(self.gl, 1)
+            self.setUniform("ringImage", 1)
+        self.gl.glDrawArrays(self.gl.GL_TRIANGLE_STRIP, 0, 4)
 
-        maybeColorfuledColor = (
-            STATE.colorModel.makeColorful(STATE.color, STATE.primaryIndex)
-            if settings.colorfulPrimaryChannel
-            else STATE.color
+    # Renders the plane and the ring images again where what they show changed.
+    def renderImages(self, size: QSize):
+        highDpiScale = self.devicePixelRatioF()
+        inputs = self.shaderInputs()
+        frame = PlaneFrame(self.plane, highDpiScale)
+        # Everything both passes show besides their own uniforms.
+        shared = (
+            inputs,
+            frame.res,
+            frame.ringThickness,
+            frame.outOfGamut,
+            self.resources.gamutTextures.generation,
         )
-        variables = None
-        match STATE.primaryIndex:
-            case 0:
-                variables = maybeColorfuledColor[1], maybeColorfuledColor[2]
-            case 1:
-                variables = maybeColorfuledColor[0], maybeColorfuledColor[2]
-            case 2:
-                variables = maybeColorfuledColor[0], maybeColorfuledColor[1]
-            case _:
-                return
-        self.program.setUniformValue("secondaryValues", variables[0], variables[1])
 
-        axesLimits = (
-            getAxesLimitsInterpolated(
-                STATE.colorModel, STATE.primaryIndex, STATE.primaryValue()
+        planeInputs = shared + (
+            frame.ringMargin,
+            frame.background,
+            frame.primaryValue,
+            frame.rotation,
+        )
+        if self.planeImage.begin(size, planeInputs) and self.bindPass(
+            PlaneOpenGLView.RenderPass.Plane, inputs, size
+        ):
+            self.setUniform("res", frame.res)
+            self.setUniform("backgroundColor", *frame.background)
+            self.setUniform("primaryValue", frame.primaryValue)
+            self.setUniform("rotation", frame.rotation)
+            self.setUniform("ringThickness", frame.ringThickness)
+            self.setUniform("ringMargin", frame.ringMargin)
+            if frame.outOfGamut != None:
+                self.setUniform("outOfGamut", *frame.outOfGamut)
+            self.gl.glDrawArrays(self.gl.GL_TRIANGLE_STRIP, 0, 4)
+
+        self.hasRing = frame.ringThickness > 0.0
+        ringInputs = shared + (frame.secondaryValues, frame.ringRotation)
+        if (
+            self.hasRing
+            and self.ringImage.begin(size, ringInputs)
+            and self.bindPass(PlaneOpenGLView.RenderPass.Ring, inputs, size)
+        ):
+            self.setUniform("res", frame.res)
+            self.setUniform("viewportSize", float(size.width()), float(size.height()))
+            self.setUniform("secondaryValues", *frame.secondaryValues)
+            self.setUniform("ringThickness", frame.ringThickness)
+            self.setUniform("ringRotation", frame.ringRotation)
+            if frame.outOfGamut != None:
+                self.setUniform("outOfGamut", *frame.outOfGamut)
+            self.gl.glClearColor(0.0, 0.0, 0.0, 0.0)
+            self.gl.glClear(self.gl.GL_COLOR_BUFFER_BIT)
+            self.gl.glDrawArrays(
+                self.gl.GL_TRIANGLE_STRIP,
+                0,
+                PlaneOpenGLView.RING_SEGMENTS * 2 + 2,
             )
-            if settings.clipToSrgbGamut
-            else ((-1.0, -1.0), (-1.0, -1.0))
+
+    # Binds the program of the plane or the ring pass, with the gamut tables
+    # and the lookup table, to render into the bound image.
+    def bindPass(
+        self,
+        renderPass: "PlaneOpenGLView.RenderPass",
+        inputs: tuple,
+        size: QSize,
+    ) -> bool:
+        self.gl.glViewport(0, 0, size.width(), size.height())
+        if not self.bindProgram((renderPass,) + inputs):
+            return False
+        self.resources.gamutTextures.bind(self)
+        self.resources.colorLutTexture.bind(self)
+        return True
+
+
+# An image rendered on the CPU, along with the inputs it was rendered from,
+# like `RetainedImage`, and how many times fewer pixels it has in each
+# direction than the widget, when it's a preview.
+class CpuRetainedImage:
+    def __init__(self) -> None:
+        self.image: QImage | None = None
+        self.inputs: tuple | None = None
+        self.scale = 1
+
+    # Drawn at the top left of the widget, stretched when it's a preview.
+    def draw(self, painter: QPainter):
+        if self.image == None:
+            return
+        ratio = self.image.devicePixelRatioF()
+        size = QSizeF(self.image.width() / ratio, self.image.height() / ratio)
+        painter.drawImage(QRectF(QPointF(0, 0), size), self.image)
+
+
+# Renders the plane and the ring on the CPU, kept in images like the ones of
+# `PlaneOpenGLView`. When the plane took longer than `CPU_FRAME_BUDGET` to
+# render, it's rendered as a preview while it keeps changing, and in full
+# once it has been idle for `CPU_REFINE_DELAY_MS`.
+class PlaneCpuView(QWidget):
+    def __init__(self, plane: SecondaryChannelsPlane):
+        super().__init__(plane)
+        self.plane = plane
+        self.gamutArrays = CPU_GAMUT_ARRAYS
+        self.planeImage = CpuRetainedImage()
+        self.ringImage = CpuRetainedImage()
+        self.hasRing = False
+        self.refineTimer = QTimer(self)
+        self.refineTimer.setSingleShot(True)
+        self.refineTimer.setInterval(CPU_REFINE_DELAY_MS)
+        self.refineTimer.timeout.connect(self.plane.updateView)
+
+    def paintEvent(self, e: QPaintEvent | None):
+        UPDATE_SCHEDULER.counters.painted("plane")
+        if self.plane.renderPending or self.planeImage.image == None:
+            self.plane.renderPending = False
+            self.renderImages()
+
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        self.planeImage.draw(painter)
+        if self.hasRing:
+            self.ringImage.draw(painter)
+        self.plane.paintIndicators(painter)
+
+    # Renders the plane and the ring images again where what they show changed.
+    def renderImages(self):
+        highDpiScale = self.devicePixelRatioF()
+        size = self.size() * highDpiScale
+        settings = STATE.currentSettings()
+        frame = PlaneFrame(self.plane, highDpiScale)
+        gamutFlags = self.gamutArrays.prepare(STATE.colorModel, settings)
+        shared = (
+            size,
+            STATE.colorModel,
+            STATE.primaryIndex,
+            gamutFlags,
+            frame.res,
+            frame.ringThickness,
+            frame.outOfGamut,
+            self.gamutArrays.generation,
         )
 
-        self.program.setUniformValue(
-            "axesLimits",
-            axesLimits[0][0],
-            axesLimits[0][1],
-            axesLimits[1][0],
-            axesLimits[1][1],
+        planeInputs = shared + (
+            settings.shape,
+            (settings.swapAxes, settings.reverseX, settings.reverseY),
+            frame.ringMargin,
+            frame.background,
+            frame.primaryValue,
+            frame.rotation,
+        )
+        if self.planeImage.inputs != planeInputs:
+            slow = CPU_FRAME_TIMINGS.last.get("plane", 0.0) > CPU_FRAME_BUDGET
+            scale = CPU_PREVIEW_SCALE if slow else 1
+            self.renderPlane(planeInputs, scale, highDpiScale)
+            if slow:
+                self.refineTimer.start()
+        elif self.planeImage.scale != 1 and not self.refineTimer.isActive():
+            self.renderPlane(planeInputs, 1, highDpiScale)
+
+        self.hasRing = frame.ringThickness > 0.0
+        ringInputs = shared + (
+            frame.secondaryValues,
+            frame.ringRotation,
+            settings.ringReversed,
+        )
+        if self.hasRing and self.ringImage.inputs != ringInputs:
+            self.renderRing(ringInputs, highDpiScale)
+
+    def renderPlane(self, inputs: tuple, scale: int, highDpiScale: float):
+        size, colorModel, primaryIndex, gamutFlags = inputs[0:4]
+        res, ringThickness, outOfGamut = inputs[4:7]
+        shape, axes, ringMargin, background, primaryValue, rotation = inputs[8:]
+        width = math.ceil(size.width() / scale)
+        height = math.ceil(size.height() / scale)
+
+        start = time.perf_counter()
+        pixels = renderPlane(
+            width,
+            height,
+            res / scale,
+            colorModel,
+            shape,
+            primaryIndex,
+            primaryValue,
+            rotation,
+            ringThickness / scale,
+            ringMargin / scale,
+            background,
+            axes,
+            outOfGamut,
+            self.gamutArrays,
+            gamutFlags,
+        )
+        name = "plane" if scale == 1 else "plane preview"
+        CPU_FRAME_TIMINGS.record(name, width * height, time.perf_counter() - start)
+
+        self.planeImage.image = toQImage(pixels, highDpiScale / scale)
+        self.planeImage.inputs = inputs
+        self.planeImage.scale = scale
+
+    def renderRing(self, inputs: tuple, highDpiScale: float):
+        size, colorModel, primaryIndex, gamutFlags = inputs[0:4]
+        res, ringThickness, outOfGamut = inputs[4:7]
+        secondaryValues, ringRotation, ringReversed = inputs[8:]
+
+        start = time.perf_counter()
+        pixels = renderRing(
+            size.width(),
+            size.height(),
+            res,
+            colorModel,
+            primaryIndex,
+            secondaryValues,
+            ringThickness,
+            ringRotation,
+            ringReversed,
+            outOfGamut,
+            self.gamutArrays,
+            gamutFlags,
+        )
+        CPU_FRAME_TIMINGS.record(
+            "ring", size.width() * size.height(), time.perf_counter() - start
         )
 
-        self.gl.glDrawArrays(self.gl.GL_TRIANGLE_STRIP, 0, 4)
+        self.ringImage.image = toQImage(pixels, highDpiScale)
+        self.ringImage.inputs = inputs
 
 
-class PrimaryChannelBar(OpenGLRenderer):
+class PrimaryChannelBar(RenderedWidget):
     def __init__(self, portable: bool, parent: QWidget | None = None):
         super().__init__(parent)
 
@@ -560,12 +1451,18 @@ class PrimaryChannelBar(OpenGLRenderer):
         self.editStart = 0.0
         self.shiftStart = 0.0
         self.portable = portable
+        self.replaceView()
         self.updateFromState()
 
-        STATE.colorModelChanged.connect(self.updateShaders)
+        STATE.colorModelChanged.connect(self.updateView)
         STATE.settingsChanged.connect(self.updateFromState)
-        STATE.colorChanged.connect(self.update)
-        STATE.primaryChannelIndexChanged.connect(self.update)
+        UPDATE_SCHEDULER.subscribe(STATE.colorChanged, "bar", self.updateView)
+        STATE.primaryChannelIndexChanged.connect(self.updateView)
+        AXES_LIMITS_SIGNALS.loaded.connect(self.updateView)
+        COLOR_LUT_SIGNALS.baked.connect(self.updateView)
+
+    def createView(self, cpu: bool) -> QWidget:
+        return BarCpuView(self) if cpu else BarOpenGLView(self)
 
     def updateFromState(self):
         globalSettings = STATE.globalSettings
@@ -581,7 +1478,7 @@ class PrimaryChannelBar(OpenGLRenderer):
             self.show()
         else:
             self.hide()
-        self.update()
+        self.updateView()
 
     def resizeEvent(self, e: QResizeEvent | None):
         super().resizeEvent(e)
@@ -590,7 +1487,7 @@ class PrimaryChannelBar(OpenGLRenderer):
             return
 
         self.res = e.size().width()
-        self.update()
+        self.updateView()
 
     def handleMouse(self, event: QMouseEvent | None):
         if event == None:
@@ -632,78 +1529,117 @@ class PrimaryChannelBar(OpenGLRenderer):
     def getCurrentWidgetCoord(self) -> float:
         return STATE.color[STATE.primaryIndex] * self.width()
 
-    def paintEvent(self, e: QPaintEvent | None):
-        super().paintEvent(e)
-        painter = QPainter(self)
+    # Drawn over the bar by the view.
+    def paintIndicators(self, painter: QPainter):
         painter.setBrush(QBrush(QColor(255, 255, 255, 255)))
 
         x = int(self.getCurrentWidgetCoord())
         painter.drawRect(x - 1, 0, 2, self.height())
 
+
+class BarOpenGLView(OpenGLRenderer):
+    def __init__(self, bar: PrimaryChannelBar):
+        super().__init__(bar)
+        self.bar = bar
+        # The uniforms the bar was last rendered with, drawn again by paints
+        # that only move the indicator.
+        self.uniforms: tuple | None = None
+
+    def paintEvent(self, e: QPaintEvent | None):
+        UPDATE_SCHEDULER.counters.painted("bar")
+        super().paintEvent(e)
+        self.bar.paintIndicators(QPainter(self))
+
     def initializeGL(self):
         super().initializeGL()
         self.updateShaders()
 
-    def updateShaders(self):
-        if self.gl == None:
-            return
-
+    # The bar has no shape of its own.
+    def shaderInputs(self) -> tuple:
         settings = STATE.currentSettings()
-        header = self.gl.getVersionHeader()
-
-        self.vertex = header + fullscreenVertex
-        self.fragment = header + settings.shape.modifyShader(
-            STATE.colorModel.modifyShader(barFragment)
+        return (
+            STATE.colorModel,
+            STATE.primaryIndex,
+            self.bar.renderParameters().outOfGamut != None,
+            self.resources.gamutTextures.prepare(STATE.colorModel, settings),
+            self.resources.colorLutTexture.prepare(STATE.colorModel),
         )
-        self.program = QOpenGLShaderProgram(self.context())
 
-        self.compileShader()
+    def buildFragmentShader(self, inputs: tuple) -> str:
+        colorModel, primaryIndex, outOfGamut, gamutFlags, colorLut = inputs
+        return assembleShader(
+            "primary_channel_bar.frag",
+            {"colorModel": colorModel.shaderComponent()},
+            channelDefines(colorModel, primaryIndex, outOfGamut, gamutFlags, colorLut),
+        )
 
     def paintGL(self):
-        if self.gl == None:
+        if not self.bindProgram():
             return
 
-        settings = STATE.currentSettings()
-        highDpiScale = self.devicePixelRatioF()
-        self.program.bind()
+        if self.bar.renderPending or self.uniforms == None:
+            self.bar.renderPending = False
+            parameters = self.bar.renderParameters()
+            self.uniforms = (
+                parameters.res * self.devicePixelRatioF(),
+                parameters.outOfGamut,
+                getSecondaryValues(parameters.colorfulPrimaryChannel),
+            )
 
-        self.program.setUniformValue("res", float(self.res * highDpiScale))
-        self.program.setUniformValue("primaryIndex", int(STATE.primaryIndex))
-        mn, mx = STATE.colorModel.limits()
-        self.program.setUniformValue("lim_min", mn[0], mn[1], mn[2])
-        self.program.setUniformValue("lim_max", mx[0], mx[1], mx[2])
+        res, outOfGamut, secondaryValues = self.uniforms
+        self.setUniform("res", res)
+        if outOfGamut != None:
+            self.setUniform("outOfGamut", *outOfGamut)
+        self.setUniform("secondaryValues", *secondaryValues)
+        self.resources.gamutTextures.bind(self)
+        self.resources.colorLutTexture.bind(self)
+        self.gl.glDrawArrays(self.gl.GL_TRIANGLE_STRIP, 0, 4)
 
-        if (
-            STATE.globalSettings.outOfGamutColorEnabled
-            and STATE.colorModel.isNotSrgbBased()
-        ):
-            self.program.setUniformValue(
-                "outOfGamut",
-                STATE.globalSettings.outOfGamutColor[0],
-                STATE.globalSettings.outOfGamutColor[1],
-                STATE.globalSettings.outOfGamutColor[2],
-            )
-        else:
-            self.program.setUniformValue("outOfGamut", -1.0, -1.0, -1.0)
 
-        maybeColorfuledColor = (
-            STATE.colorModel.makeColorful(STATE.color, STATE.primaryIndex)
-            if settings.colorfulPrimaryChannel
-            else STATE.color
-        )
-        variables = None
-        match STATE.primaryIndex:
-            case 0:
-                variables = maybeColorfuledColor[1], maybeColorfuledColor[2]
-            case 1:
-                variables = maybeColorfuledColor[0], maybeColorfuledColor[2]
-            case 2:
-                variables = maybeColorfuledColor[0], maybeColorfuledColor[1]
-            case _:
-                return
-        self.program.setUniformValue("secondaryValues", variables[0], variables[1])
+# Renders the bar on the CPU, only again once something it shows changes.
+class BarCpuView(QWidget):
+    def __init__(self, bar: PrimaryChannelBar):
+        super().__init__(bar)
+        self.bar = bar
+        self.gamutArrays = CPU_GAMUT_ARRAYS
+        self.barImage = CpuRetainedImage()
+
+    def paintEvent(self, e: QPaintEvent | None):
+        UPDATE_SCHEDULER.counters.painted("bar")
+        if self.bar.renderPending or self.barImage.image == None:
+            self.bar.renderPending = False
+            self.renderImage()
 
-        self.program.setAttributeArray(
-            0, [QVector2D(-1, -1), QVector2D(1, -1), QVector2D(-1, 1), QVector2D(1, 1)]
+        painter = QPainter(self)
+        self.barImage.draw(painter)
+        self.bar.paintIndicators(painter)
+
+    def renderImage(self):
+        highDpiScale = self.devicePixelRatioF()
+        size = self.size() * highDpiScale
+        gamutFlags = self.gamutArrays.prepare(STATE.colorModel, STATE.currentSettings())
+        parameters = self.bar.renderParameters()
+        inputs = (
+            size,
+            parameters.res * highDpiScale,
+            STATE.colorModel,
+            STATE.primaryIndex,
+            getSecondaryValues(parameters.colorfulPrimaryChannel),
+            parameters.outOfGamut,
+            gamutFlags,
+            self.gamutArrays.generation,
         )
-        self.gl.glDrawArrays(self.gl.GL_TRIANGLE_STRIP, 0, 4)
+        if self.barImage.inputs != inputs:
+            start = time.perf_counter()
+            pixels = renderBar(
+                size.width(),
+                size.height(),
+                *inputs[1:6],
+                self.gamutArrays,
+                gamutFlags,
+            )
+            CPU_FRAME_TIMINGS.record(
+                "bar", size.width() * size.height(), time.perf_counter() - start
+            )
+            self.barImage.image = toQImage(pixels, highDpiScale)
+            self.barImage.inputs = inputs
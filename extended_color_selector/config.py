@@ -5,6 +5,39 @@ MIN_WHEEL_SIZE = 100
 MAX_WHEEL_SIZE = 400
 AXES_LIMITS_SEGMENTS = 256
 AXES_LIMITS_OFFSET = 1 / AXES_LIMITS_SEGMENTS
+GAMUT_SPAN_ROWS = 64
+LUT_RESOLUTION = 33
+COLOR_LUT_RESOLUTION = 65
+CONVERSION_CACHE_CAPACITY = 512
+CONVERSION_CACHE_QUANTIZATION = 1 / 2**20
+CUSP_TABLE_SIZE = 4096
+PIXEL_CHUNK_SIZE = 1 << 16
+PARALLEL_SHARD_SIZE = 1 << 16
+PARALLEL_MIN_THREAD_COLORS = 1 << 17
+PARALLEL_MIN_PROCESS_COLORS = 1 << 20
+PARALLEL_CANCEL_POLL_INTERVAL = 0.05
+# Prints how long every shader program took to build, to compare launches
+# with and without Qt's shader cache.
+LOG_SHADER_TIMINGS = False
+# Renders on the CPU even when OpenGL works, like when it fails. Requires NumPy.
+FORCE_CPU_RENDERING = False
+# Prints why rendering fell back to the CPU.
+LOG_RENDER_BACKEND = False
+# Prints how long every render on the CPU took.
+LOG_CPU_FRAME_TIMINGS = False
+# Renders on the CPU taking longer than this render a preview with a fraction
+# of the pixels in each direction, and the full image once the plane is idle.
+CPU_FRAME_BUDGET = 1 / 30
+CPU_PREVIEW_SCALE = 2
+CPU_REFINE_DELAY_MS = 150
+# Milliseconds between updates of the widgets while the color keeps changing,
+# None for the refresh rate of the screen.
+UPDATE_FRAME_INTERVAL_MS: int | None = None
+# Spin boxes are updated at most this often while dragging.
+SPIN_BOX_UPDATE_INTERVAL_MS = 100
+# Prints how many times the color changed, how many times the widgets were
+# updated and how many times the views painted, every second.
+LOG_UPDATE_COUNTS = False
 
 OPENGL_VER_OVERRIDE_MAJOR: int | None = None
 OPENGL_VER_OVERRIDE_MINOR: int | None = None
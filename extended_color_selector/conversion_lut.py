@@ -0,0 +1,538 @@
+import array
+import math
+import random
+
+from .models import ColorModel, transferColorModel
+from .batch_conversion import (
+    np,
+    transferColorModelArray,
+    eliminateIndetermination,
+    flattenColors,
+)
+from .config import LUT_RESOLUTION, COLOR_LUT_RESOLUTION
+
+# Optional lookup table mode for bulk conversions.
+#
+# A `ConversionLut` samples `transferColorModel` on a regular grid of
+# `resolution`³ normalized `fromModel` colors the first time it's used, and
+# keeps the results as float32. Lookups then cost a tetrahedral interpolation
+# between four table entries no matter how expensive the exact conversion is,
+# which is what gradients and palettes over OkHsv, OkHsl, OkLch and Lab want.
+#
+# The table is only an approximation, use `errorReport` to see how far it is
+# from the exact path for a given pair and resolution.
+
+
+class LutErrorReport:
+    def __init__(
+        self,
+        fromModel: ColorModel,
+        toModel: ColorModel,
+        resolution: int,
+        samples: int,
+        maxError: tuple[float, float, float],
+        meanError: tuple[float, float, float],
+        worstColor: tuple[float, float, float],
+        nonFiniteMismatches: int,
+    ) -> None:
+        self.fromModel = fromModel
+        self.toModel = toModel
+        self.resolution = resolution
+        self.samples = samples
+        self.maxError = maxError
+        self.meanError = meanError
+        self.worstColor = worstColor
+        # Colors with NaN or infinite channels the table doesn't convert like
+        # the exact path does.
+        self.nonFiniteMismatches = nonFiniteMismatches
+
+    def __str__(self) -> str:
+        return (
+            f"{self.fromModel.displayName()} -> {self.toModel.displayName()} "
+            f"@ {self.resolution}³: max {max(self.maxError):.2e} "
+            f"(per channel {', '.join([f'{e:.2e}' for e in self.maxError])}), "
+            f"mean {max(self.meanError):.2e}, worst at {self.worstColor}, "
+            f"{self.nonFiniteMismatches} non-finite mismatches"
+        )
+
+
+class ConversionLut:
+    def __init__(
+        self,
+        fromModel: ColorModel,
+        toModel: ColorModel,
+        resolution: int = LUT_RESOLUTION,
+        clamp: bool = True,
+    ) -> None:
+        if resolution < 2:
+            raise ValueError(f"Lookup table resolution must be at least 2: {resolution}")
+
+        self.fromModel = fromModel
+        self.toModel = toModel
+        self.resolution = resolution
+        self.clamp = clamp
+        self.hueChannel = toModel.hueChannel()
+        self.table = None
+
+    # Table of `resolution`³ × 3 float32 values, with the last input channel varying fastest.
+    def build(self):
+        if self.table is not None:
+            return self.table
+
+        n = self.resolution
+        if np is not None:
+            axis = np.linspace(0.0, 1.0, n)
+            c0, c1, c2 = np.meshgrid(axis, axis, axis, indexing="ij")
+            grid = np.stack((c0.ravel(), c1.ravel(), c2.ravel()), axis=1)
+            self.table = transferColorModelArray(
+                grid, self.fromModel, self.toModel, clamp=self.clamp
+            ).astype(np.float32)
+        else:
+            table = array.array("f")
+            for i in range(n):
+                for j in range(n):
+                    for k in range(n):
+                        table.extend(
+                            transferColorModel(
+                                (i / (n - 1), j / (n - 1), k / (n - 1)),
+                                self.fromModel,
+                                self.toModel,
+                                clamp=self.clamp,
+                            )
+                        )
+            self.table = table
+        return self.table
+
+    def nbytes(self) -> int:
+        return self.resolution**3 * 3 * 4
+
+    # Vectorized lookup of a N×3 buffer, same signature as `transferColorModelArray`.
+    def lookup(self, colors, referenceColors=None):
+        if np is None:
+            return self._lookupFallback(colors, referenceColors)
+
+        table = self.build()
+        n = self.resolution
+        colors = np.asarray(colors, dtype=np.float64).reshape(-1, 3)
+        # Rows with NaN or infinite channels would index the table out of
+        # bounds, they're converted by the exact path instead.
+        nonFinite = ~np.isfinite(colors).all(axis=1)
+        exactColors = colors[nonFinite]
+        colors = np.clip(np.nan_to_num(colors), 0.0, 1.0)
+
+        p = colors * (n - 1)
+        cell = np.minimum(np.floor(p), n - 2).astype(np.int64)
+        f = p - cell
+
+        # Walk from the cell's origin to its opposite corner along the axes sorted by
+        # descending fraction, which picks one of the six tetrahedra of the cube.
+        strides = np.array([n * n, n, 1], dtype=np.int64)
+        order = np.argsort(-f, axis=1)
+        fs = np.take_along_axis(f, order, axis=1)
+        steps = strides[order]
+
+        i0 = cell @ strides
+        i1 = i0 + steps[:, 0]
+        i2 = i1 + steps[:, 1]
+        i3 = i2 + steps[:, 2]
+
+        v0, v1, v2, v3 = table[i0], table[i1], table[i2], table[i3]
+        if self.hueChannel != None:
+            h = self.hueChannel
+            for v in (v1, v2, v3):
+                v[:, h] -= np.round(v[:, h] - v0[:, h])
+
+        w0 = (1.0 - fs[:, 0])[:, None]
+        w1 = (fs[:, 0] - fs[:, 1])[:, None]
+        w2 = (fs[:, 1] - fs[:, 2])[:, None]
+        w3 = fs[:, 2][:, None]
+        result = w0 * v0 + w1 * v1 + w2 * v2 + w3 * v3
+        result = result.astype(np.float64)
+
+        if self.hueChannel != None:
+            h = self.hueChannel
+            result[:, h] -= np.floor(result[:, h])
+
+        if referenceColors is not None:
+            reference = np.broadcast_to(
+                np.asarray(referenceColors, dtype=np.float64).reshape(-1, 3),
+                result.shape,
+            )
+            c0, c1, c2 = eliminateIndetermination(
+                self.toModel,
+                (result[:, 0], result[:, 1], result[:, 2]),
+                (reference[:, 0], reference[:, 1], reference[:, 2]),
+            )
+            result = np.stack((c0, c1, c2), axis=1)
+
+        if self.clamp:
+            np.clip(result, 0.0, 1.0, out=result)
+        if len(exactColors) > 0:
+            result[nonFinite] = transferColorModelArray(
+                exactColors,
+                self.fromModel,
+                self.toModel,
+                None if referenceColors is None else reference[nonFinite],
+                self.clamp,
+            )
+        return result
+
+    def lookupColor(
+        self, color: tuple[float, float, float]
+    ) -> tuple[float, float, float]:
+        if not all([math.isfinite(c) for c in color]):
+            return math.nan, math.nan, math.nan
+        table = self.build()
+        if np is not None:
+            table = table.reshape(-1)
+        n = self.resolution
+
+        p = [min(max(c, 0.0), 1.0) * (n - 1) for c in color]
+        cell = [min(int(x), n - 2) for x in p]
+        f = [p[i] - cell[i] for i in range(3)]
+        strides = n * n, n, 1
+
+        order = sorted(range(3), key=lambda i: -f[i])
+        fs = [f[i] for i in order]
+        index = cell[0] * strides[0] + cell[1] * strides[1] + cell[2] * strides[2]
+        indices = [index]
+        for axis in order:
+            index += strides[axis]
+            indices.append(index)
+
+        vertices = [
+            [float(table[i * 3]), float(table[i * 3 + 1]), float(table[i * 3 + 2])]
+            for i in indices
+        ]
+        if self.hueChannel != None:
+            h = self.hueChannel
+            for v in vertices[1:]:
+                v[h] -= round(v[h] - vertices[0][h])
+
+        weights = 1.0 - fs[0], fs[0] - fs[1], fs[1] - fs[2], fs[2]
+        result = [sum([weights[j] * vertices[j][i] for j in range(4)]) for i in range(3)]
+
+        if self.hueChannel != None:
+            result[self.hueChannel] %= 1.0
+        if self.clamp:
+            result = [min(max(c, 0.0), 1.0) for c in result]
+        return result[0], result[1], result[2]
+
+    def _lookupFallback(self, colors, referenceColors) -> array.array:
+        # Indetermination is resolved by the exact path, which is what the fallback
+        # of `transferColorModelArray` does anyway.
+        if referenceColors is not None:
+            return transferColorModelArray(
+                colors, self.fromModel, self.toModel, referenceColors, self.clamp
+            )
+
+        flat = flattenColors(colors)
+        result = array.array("d", bytes(len(flat) * flat.itemsize))
+        for i in range(0, len(flat), 3):
+            result[i], result[i + 1], result[i + 2] = self.lookupColor(
+                (flat[i], flat[i + 1], flat[i + 2])
+            )
+        return result
+
+    # Compares the table against the exact conversion at `samples` random colors.
+    def errorReport(self, samples: int = 4096, seed: int = 0) -> LutErrorReport:
+        rng = random.Random(seed)
+        colors = [
+            (rng.random(), rng.random(), rng.random()) for _ in range(samples)
+        ]
+        exact = transferColorModelArray(
+            colors, self.fromModel, self.toModel, clamp=self.clamp
+        )
+        approx = self.lookup(colors)
+
+        if np is not None:
+            exact, approx = exact.ravel().tolist(), approx.ravel().tolist()
+
+        maxError = [0.0, 0.0, 0.0]
+        sumError = [0.0, 0.0, 0.0]
+        worst = 0.0
+        worstColor = colors[0]
+        for i in range(samples):
+            for ch in range(3):
+                e = abs(exact[i * 3 + ch] - approx[i * 3 + ch])
+                if ch == self.hueChannel:
+                    e = min(e, 1.0 - e)
+                sumError[ch] += e
+                maxError[ch] = max(maxError[ch], e)
+                if e > worst:
+                    worst = e
+                    worstColor = colors[i]
+
+        return LutErrorReport(
+            self.fromModel,
+            self.toModel,
+            self.resolution,
+            samples,
+            (maxError[0], maxError[1], maxError[2]),
+            (sumError[0] / samples, sumError[1] / samples, sumError[2] / samples),
+            worstColor,
+            self.nonFiniteMismatches(),
+        )
+
+    # How many colors with a NaN or infinite channel don't come out like with
+    # the exact path, NaN or not. Without NumPy, the exact path itself fails on
+    # them.
+    def nonFiniteMismatches(self) -> int:
+        if np is None:
+            return 0
+        colors = [
+            tuple([value if i == ch else 0.5 for i in range(3)])
+            for value in (math.nan, math.inf, -math.inf)
+            for ch in range(3)
+        ]
+        exact = transferColorModelArray(
+            colors, self.fromModel, self.toModel, clamp=self.clamp
+        )
+        approx = self.lookup(colors)
+        exact, approx = exact.ravel().tolist(), approx.ravel().tolist()
+
+        return sum(
+            [
+                math.isnan(exact[i * 3]) != math.isnan(approx[i * 3])
+                for i in range(len(colors))
+            ]
+        )
+
+
+LUTS: dict[tuple[ColorModel, ColorModel, int, bool], ConversionLut] = {}
+
+
+def getConversionLut(
+    fromModel: ColorModel,
+    toModel: ColorModel,
+    resolution: int = LUT_RESOLUTION,
+    clamp: bool = True,
+) -> ConversionLut:
+    key = fromModel, toModel, resolution, clamp
+    lut = LUTS.get(key)
+    if lut == None:
+        lut = ConversionLut(fromModel, toModel, resolution, clamp)
+        LUTS[key] = lut
+    return lut
+
+
+# Drop-in replacement for `transferColorModelArray` going through a lookup table.
+def transferColorModelLut(
+    colors,
+    fromModel: ColorModel,
+    toModel: ColorModel,
+    referenceColors=None,
+    clamp: bool = True,
+    resolution: int = LUT_RESOLUTION,
+):
+    if fromModel == toModel:
+        return transferColorModelArray(colors, fromModel, toModel, clamp=clamp)
+    return getConversionLut(fromModel, toModel, resolution, clamp).lookup(
+        colors, referenceColors
+    )
+
+
+def lutErrorReports(
+    resolution: int = LUT_RESOLUTION, samples: int = 4096
+) -> list[LutErrorReport]:
+    return [
+        getConversionLut(fromModel, toModel, resolution).errorReport(samples)
+        for fromModel in ColorModel
+        for toModel in ColorModel
+        if fromModel != toModel
+    ]
+
+
+# Lookup tables of the shaders.
+#
+# Expensive color models can be drawn by sampling a 3D texture of their
+# conversion to sRGB rather than converting every fragment. The table only
+# covers the box of normalized colors the sRGB gamut spans, shaders still
+# convert colors outside of it, which are out of gamut anyway, exactly.
+#
+# Texels hold the unclamped sRGB of a grid of colors over the box, and in
+# alpha their signed distance to the sRGB cube, positive in gamut, so that
+# interpolating it places the gamut boundary within cells rather than on
+# their corners. Requires NumPy.
+
+# Models drawn with a table, the others are about as cheap to convert. OkHsv
+# and OkHsl change abruptly across the cusp, their tables are off by up to
+# 38.88/255 and 14.65/255 there at 65³, against at most 6.18/255 for these,
+# and denser saturations don't help.
+COLOR_LUT_MODELS = [
+    ColorModel.Oklab,
+    ColorModel.Lab,
+    ColorModel.Oklch,
+]
+# Colors this far outside of the sRGB cube still count as in gamut, white is
+# placed 2.5e-4 outside of it by the conversions.
+COLOR_LUT_GAMUT_TOLERANCE = 1e-3
+# Resolution of the grid of sRGB colors the box is found from.
+COLOR_LUT_DOMAIN_SAMPLES = 33
+# GPUs may interpolate texels with weights of only 8 bits.
+COLOR_LUT_FILTER_STEPS = 256
+
+
+def canBakeColorLuts() -> bool:
+    return np is not None
+
+
+class ColorLutReport:
+    def __init__(
+        self,
+        colorModel: ColorModel,
+        resolution: int,
+        samples: int,
+        maxError: float,
+        meanError: float,
+        gamutMismatches: int,
+        worstColor: tuple[float, float, float],
+    ) -> None:
+        self.colorModel = colorModel
+        self.resolution = resolution
+        self.samples = samples
+        self.maxError = maxError
+        self.meanError = meanError
+        self.gamutMismatches = gamutMismatches
+        self.worstColor = worstColor
+
+    def __str__(self) -> str:
+        return (
+            f"{self.colorModel.displayName()} @ {self.resolution}³: "
+            f"max {self.maxError * 255:.2f}/255, "
+            f"mean {self.meanError * 255:.3f}/255, "
+            f"gamut wrong for {self.gamutMismatches / self.samples:.2%} of colors, "
+            f"worst at {tuple([round(c, 4) for c in self.worstColor])}"
+        )
+
+
+class ColorLut:
+    def __init__(
+        self, colorModel: ColorModel, resolution: int = COLOR_LUT_RESOLUTION
+    ) -> None:
+        if resolution < 2:
+            raise ValueError(f"Lookup table resolution must be at least 2: {resolution}")
+
+        self.colorModel = colorModel
+        self.resolution = resolution
+        # Normalized colors of the first and last texels along each channel.
+        self.domainMin = (0.0, 0.0, 0.0)
+        self.domainMax = (1.0, 1.0, 1.0)
+        self.texels: array.array | None = None
+
+    # RGBA float32 texels, with the first channel varying slowest like
+    # `ConversionLut.build`, so it's the depth of the texture.
+    def build(self) -> array.array:
+        if self.texels is not None:
+            return self.texels
+
+        axis = np.linspace(0.0, 1.0, COLOR_LUT_DOMAIN_SAMPLES)
+        cube = np.stack(np.meshgrid(axis, axis, axis, indexing="ij"), axis=-1)
+        gamut = transferColorModelArray(
+            cube.reshape(-1, 3), ColorModel.Rgb, self.colorModel, clamp=False
+        )
+        domainMin = np.clip(np.nanmin(gamut, axis=0), 0.0, 1.0)
+        domainMax = np.clip(np.nanmax(gamut, axis=0), 0.0, 1.0)
+        domainMax = np.maximum(domainMax, domainMin + 1e-6)
+        self.domainMin = tuple(domainMin.tolist())
+        self.domainMax = tuple(domainMax.tolist())
+
+        n = self.resolution
+        axes = [np.linspace(domainMin[i], domainMax[i], n) for i in range(3)]
+        grid = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+        rgb = transferColorModelArray(
+            grid, self.colorModel, ColorModel.Rgb, clamp=False
+        )
+        distance = np.minimum(rgb, 1.0 - rgb).min(axis=1) + COLOR_LUT_GAMUT_TOLERANCE
+        undefined = np.isnan(rgb).any(axis=1)
+        rgb[undefined] = 0.0
+        distance[undefined] = -1.0
+
+        rgba = np.column_stack((rgb, distance)).astype(np.float32)
+        self.texels = array.array("f", rgba.tobytes())
+        return self.texels
+
+    def nbytes(self) -> int:
+        return self.resolution**3 * 4 * 4
+
+    # RGBA a shader samples for normalized `colors` inside of the domain, from
+    # the texels stored as half floats and interpolated trilinearly.
+    def sample(self, colors):
+        n = self.resolution
+        texels = np.frombuffer(self.build(), dtype=np.float32)
+        texels = texels.astype(np.float16).astype(np.float64).reshape(n, n, n, 4)
+
+        domainMin, domainMax = np.array(self.domainMin), np.array(self.domainMax)
+        p = (np.asarray(colors, dtype=np.float64) - domainMin) / (domainMax - domainMin)
+        p = np.clip(p, 0.0, 1.0) * (n - 1)
+        cell = np.minimum(np.floor(p), n - 2).astype(np.int64)
+        f = np.round((p - cell) * COLOR_LUT_FILTER_STEPS) / COLOR_LUT_FILTER_STEPS
+
+        result = np.zeros((len(p), 4))
+        for corner in range(8):
+            offset = np.array([(corner >> 2) & 1, (corner >> 1) & 1, corner & 1])
+            weight = np.prod(np.where(offset == 1, f, 1.0 - f), axis=1)
+            i = cell + offset
+            result += weight[:, None] * texels[i[:, 0], i[:, 1], i[:, 2]]
+        return result
+
+    # Compares the colors drawn with the table against the ones drawn
+    # converting every fragment, at `samples` random colors. Errors are the
+    # largest difference of a channel of the colors in gamut, mismatches the
+    # colors the table places on the wrong side of the gamut boundary.
+    def report(self, samples: int = 4096, seed: int = 0) -> ColorLutReport:
+        self.build()
+        rng = random.Random(seed)
+        colors = np.array(
+            [(rng.random(), rng.random(), rng.random()) for _ in range(samples)]
+        )
+        exact = transferColorModelArray(
+            colors, self.colorModel, ColorModel.Rgb, clamp=False
+        )
+        exactInGamut = (exact.min(axis=1) >= 0.0) & (exact.max(axis=1) <= 1.0)
+
+        # Colors outside of the domain are converted exactly.
+        inDomain = np.all(
+            (colors >= np.array(self.domainMin)) & (colors <= np.array(self.domainMax)),
+            axis=1,
+        )
+        sampled = self.sample(colors)
+        sampledInGamut = np.where(inDomain, sampled[:, 3] >= 0.0, exactInGamut)
+        rgb = np.where(inDomain[:, None], sampled[:, :3], exact)
+
+        error = np.abs(np.clip(rgb, 0.0, 1.0) - np.clip(exact, 0.0, 1.0)).max(axis=1)
+        error = np.where(exactInGamut & sampledInGamut, error, 0.0)
+        inGamut = max(int(np.count_nonzero(exactInGamut & sampledInGamut)), 1)
+        worst = int(error.argmax())
+        return ColorLutReport(
+            self.colorModel,
+            self.resolution,
+            samples,
+            float(error[worst]),
+            float(error.sum()) / inGamut,
+            int(np.count_nonzero(exactInGamut != sampledInGamut)),
+            tuple(colors[worst].tolist()),
+        )
+
+
+COLOR_LUTS: dict[tuple[ColorModel, int], ColorLut] = {}
+
+
+def getColorLut(
+    colorModel: ColorModel, resolution: int = COLOR_LUT_RESOLUTION
+) -> ColorLut:
+    key = colorModel, resolution
+    lut = COLOR_LUTS.get(key)
+    if lut == None:
+        lut = ColorLut(colorModel, resolution)
+        COLOR_LUTS[key] = lut
+    return lut
+
+
+def colorLutReports(
+    resolution: int = COLOR_LUT_RESOLUTION, samples: int = 4096
+) -> list[ColorLutReport]:
+    return [
+        getColorLut(colorModel, resolution).report(samples)
+        for colorModel in COLOR_LUT_MODELS
+    ]
@@ -0,0 +1,402 @@
+from PyQt5.QtGui import QImage
+import math
+
+from .models import ColorModel, SettingsPerColorModel, WheelShape
+from .batch_conversion import np, transferColorModelArray
+from .gamut_clipping import getGamutTables
+from .config import DOCKER_NAME, GAMUT_SPAN_ROWS, LOG_CPU_FRAME_TIMINGS
+
+# Rendering of the plane, the ring and the primary channel bar without
+# OpenGL, for when it's unavailable. Requires NumPy.
+#
+# Every function reproduces its shader in `secondary_channels_plane.frag` or
+# `primary_channel_bar.frag`, pixel for pixel: images are rows of RGB(A)
+# bytes, top row first, and pixel centers are at half integers like
+# `gl_FragCoord`. Colors are only converted for the pixels that show them,
+# the inside of the shape for the plane and the annulus for the ring.
+
+
+def canRenderOnCpu() -> bool:
+    return np is not None
+
+
+# How long the last renders took, to tell whether the plane can be rendered
+# again for every frame while dragging.
+class FrameTimings:
+    def __init__(self) -> None:
+        self.last: dict[str, float] = {}
+
+    def record(self, name: str, pixels: int, seconds: float):
+        self.last[name] = seconds
+        if LOG_CPU_FRAME_TIMINGS:
+            print(
+                f"{DOCKER_NAME}: rendered {name} on the CPU in "
+                f"{seconds * 1000:.1f} ms, {pixels} pixels"
+            )
+
+
+CPU_FRAME_TIMINGS = FrameTimings()
+
+
+# Limits and spans of the current color model as arrays, laid out like the
+# textures of `GamutTextures`, with the same lookups as `gamut_limits.glsl`.
+class GamutArrays:
+    def __init__(self) -> None:
+        self.uploaded: tuple[ColorModel, bool] | None = None
+        # (3, segments + 1, 4) limits and (3 * values, rows, 2) spans.
+        self.limits = None
+        self.spans = None
+        # Counts loads, images rendered with older tables are stale.
+        self.generation = 0
+
+    def invalidate(self):
+        self.uploaded = None
+
+    # Same flags as `GamutTextures.prepare`.
+    def prepare(
+        self, colorModel: ColorModel, settings: SettingsPerColorModel
+    ) -> tuple[bool, bool, bool]:
+        if not settings.clipToSrgbGamut:
+            return False, False, False
+        if self.uploaded != (colorModel, settings.clipToGamutShape):
+            self.load(colorModel, settings.clipToGamutShape)
+
+        limitsEnabled, spansEnabled = self.limits is not None, self.spans is not None
+        clippedRange = limitsEnabled and not settings.colorfulPrimaryChannel
+        return limitsEnabled, spansEnabled, clippedRange
+
+    def load(self, colorModel: ColorModel, withSpans: bool):
+        limits, spans = getGamutTables(colorModel, withSpans)
+        self.limits = (
+            None
+            if limits == None
+            else np.frombuffer(limits, dtype=np.float32)
+            .astype(np.float64)
+            .reshape(3, -1, 4)
+        )
+        self.spans = (
+            None
+            if spans == None
+            else np.frombuffer(spans, dtype=np.float32)
+            .astype(np.float64)
+            .reshape(-1, GAMUT_SPAN_ROWS, 2)
+        )
+        self.uploaded = colorModel, withSpans
+        self.generation += 1
+
+    # minX, maxX, minY, maxY of every primary value, like `axesLimitsAt`.
+    def axesLimitsAt(self, primary: int, primaryValues):
+        segments = self.limits.shape[1] - 1
+        a = np.clip(primaryValues, 0.0, 1.0) * segments
+        i = np.minimum(a.astype(np.int64), segments - 1)
+        t = (a - i)[:, None]
+        return self.limits[primary, i] * (1.0 - t) + self.limits[primary, i + 1] * t
+
+    # minX, maxX of every primary value and y, like `gamutSpanAt`.
+    def gamutSpanAt(self, primary: int, primaryValues, y):
+        values = self.spans.shape[0] // 3
+        rows = self.spans.shape[1]
+        a = np.clip(primaryValues, 0.0, 1.0) * (values - 1)
+        i = np.minimum(a.astype(np.int64), values - 2)
+        row = np.clip(y, 0.0, 1.0) * (rows - 1)
+        r = np.minimum(row.astype(np.int64), rows - 2)
+        t = (a - i)[:, None]
+        u = (row - r)[:, None]
+
+        v = primary * values + i
+        lower = self.spans[v, r] * (1.0 - u) + self.spans[v, r + 1] * u
+        upper = self.spans[v + 1, r] * (1.0 - u) + self.spans[v + 1, r + 1] * u
+        return lower * (1.0 - t) + upper * t
+
+    # Like `onClippedPlane`, for every primary value with the same secondary
+    # values.
+    def onClippedPlane(
+        self,
+        primary: int,
+        primaryValues,
+        secondaryValues: tuple[float, float],
+        followShape: bool,
+    ):
+        EPSILON = 1e-4
+        x, y = secondaryValues
+        limits = self.axesLimitsAt(primary, primaryValues)
+        span = (
+            self.gamutSpanAt(primary, primaryValues, np.full(len(primaryValues), y))
+            if followShape
+            else limits[:, 0:2]
+        )
+        return (
+            (y >= limits[:, 2] - EPSILON)
+            & (y <= limits[:, 3] + EPSILON)
+            & (x >= span[:, 0] - EPSILON)
+            & (x <= span[:, 1] + EPSILON)
+        )
+
+
+def smoothstep(edge0: float, edge1: float, x):
+    t = np.clip((x - edge0) / (edge1 - edge0), 0.0, 1.0)
+    return t * t * (3.0 - 2.0 * t)
+
+
+# Normalized channels with `primary` values, like `withPrimary`.
+def withPrimary(primaryIndex: int, primary, secondary):
+    channels = [secondary[:, 0], secondary[:, 1]]
+    channels.insert(primaryIndex, primary)
+    return np.stack(channels, axis=1)
+
+
+# sRGB of normalized channels, like `channelsToSrgb`.
+def channelsToSrgb(
+    colorModel: ColorModel,
+    channels,
+    outOfGamut: tuple[float, float, float] | None,
+):
+    color = transferColorModelArray(channels, colorModel, ColorModel.Rgb, clamp=False)
+    outside = np.any((color > 1.0) | (color < 0.0), axis=1)
+    if outOfGamut != None:
+        color[outside] = outOfGamut
+    else:
+        np.clip(color, 0.0, 1.0, out=color)
+    return np.nan_to_num(color)
+
+
+def fadeOffClippedPlane(color, offPlane):
+    color[offPlane] = color[offPlane] * 0.25 + 0.375
+
+
+# Color coordinates and antialiasing of points `p` of the plane, like
+# `getColorCoordAndAntialias` of each shape. Points outside of the shape are
+# all -1.
+def colorCoordAndAntialias(
+    shape: WheelShape, p, normalizedRingThickness: float, res: float
+):
+    x, y = p[:, 0], p[:, 1]
+    nrt = normalizedRingThickness
+    result = np.full((len(p), 3), -1.0)
+    match shape:
+        case WheelShape.Square:
+            if nrt == 0.0:
+                result[:, 0:2] = p * 0.5 + 0.5
+                result[:, 2] = 1.0
+                return result
+            a = (2.0 - nrt * 2.0) / math.sqrt(2.0)
+            inside = np.all(np.abs(p) <= a / 2.0, axis=1)
+            result[inside, 0:2] = p[inside] / (a * 0.5) * 0.5 + 0.5
+            result[inside, 2] = 1.0
+        case WheelShape.Triangle:
+            SMOOTH = 2.0
+            t = 1.0 - nrt
+            RAD_120 = math.pi * 120.0 / 180.0
+            v0 = np.array([math.cos(0.0), math.sin(0.0)]) * t
+            v1 = np.array([math.cos(RAD_120), math.sin(RAD_120)]) * t
+            v2 = np.array([math.cos(RAD_120 * 2.0), math.sin(RAD_120 * 2.0)]) * t
+            vh = (v1 + v2) / 2.0 - v0
+            a = float(np.linalg.norm(v0 - v1))
+            h = float(np.linalg.norm(vh))
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ty = ((p - v0) @ (vh / h)) / h
+                b = p - (v0 + (v1 - v0) * ty[:, None])
+                tx = np.hypot(b[:, 0], b[:, 1]) / (ty * a)
+                inside = ((b @ (v2 - v1)) >= 0.0) & (tx >= 0.0) & (ty >= 0.0)
+                inside &= (tx <= 1.0) & (ty <= 1.0)
+
+                aa = a * res * 0.5
+                tx, ty = tx[inside], ty[inside]
+                rx0 = smoothstep(0.0, SMOOTH, tx * aa * ty)
+                rx1 = 1.0 - smoothstep(1.0 - SMOOTH / aa * ty * 2.0, 1.0, tx)
+                ry = 1.0 - smoothstep(aa - SMOOTH, aa, ty * aa)
+            result[inside, 0] = tx
+            result[inside, 1] = ty
+            result[inside, 2] = rx0 * rx1 * ry
+        case WheelShape.Circle:
+            SMOOTH = 2.0
+            r = np.hypot(x, y)
+            inside = r <= 1.0 - nrt
+            r = r[inside]
+            result[inside, 0] = r
+            result[inside, 1] = np.arctan2(y[inside], x[inside]) / 2.0 / math.pi + 0.5
+            result[inside, 2] = 1.0 - smoothstep(
+                (1.0 - nrt) * res - SMOOTH, (1.0 - nrt) * res, r * res
+            )
+    return result
+
+
+# Pixel centers of a `width` × `height` image in `gl_FragCoord` coordinates,
+# (height, width, 2), top row first.
+def fragCoords(width: int, height: int):
+    xs = np.arange(width) + 0.5
+    ys = (height - 1 - np.arange(height)) + 0.5
+    return np.stack(np.meshgrid(xs, ys, indexing="xy"), axis=-1)
+
+
+# The plane over the background, like `secondary_channels_plane.frag`
+# without RING_PASS, as (height, width, 3) bytes.
+def renderPlane(
+    width: int,
+    height: int,
+    res: float,
+    colorModel: ColorModel,
+    shape: WheelShape,
+    primaryIndex: int,
+    primaryValue: float,
+    rotation: float,
+    ringThickness: float,
+    ringMargin: float,
+    background: tuple[float, float, float],
+    axes: tuple[bool, bool, bool],
+    outOfGamut: tuple[float, float, float] | None,
+    gamut: GamutArrays,
+    gamutFlags: tuple[bool, bool, bool],
+):
+    swapAxes, reverseX, reverseY = axes
+    limitsEnabled, spansEnabled, _ = gamutFlags
+    coords = fragCoords(width, height).reshape(-1, 2)
+    uv = coords / res
+    image = np.empty((len(coords), 3))
+    image[:] = background
+
+    onPlane = np.all(uv <= 1.0, axis=1)
+    p = uv[onPlane] * 2.0 - 1.0
+    s, c = math.sin(rotation), math.cos(rotation)
+    p = np.stack((p[:, 0] * c - p[:, 1] * s, p[:, 0] * s + p[:, 1] * c), axis=1)
+
+    wheel = colorCoordAndAntialias(
+        shape, p, (ringThickness + ringMargin) / (res / 2.0), res
+    )
+    colorCoord = wheel[:, 0:2]
+    if reverseX:
+        colorCoord[:, 0] = 1.0 - colorCoord[:, 0]
+    if reverseY:
+        colorCoord[:, 1] = 1.0 - colorCoord[:, 1]
+    if swapAxes:
+        colorCoord = colorCoord[:, ::-1]
+    antialias = wheel[:, 2]
+
+    # Outside of the shape, the wheel is transparent black.
+    inShape = np.all(colorCoord >= 0.0, axis=1)
+    colorCoord = colorCoord[inShape]
+    if limitsEnabled:
+        primaryValues = np.full(1, primaryValue)
+        limits = gamut.axesLimitsAt(primaryIndex, primaryValues)[0]
+        colorCoord[:, 1] = limits[2] + (limits[3] - limits[2]) * colorCoord[:, 1]
+        if spansEnabled:
+            span = gamut.gamutSpanAt(
+                primaryIndex,
+                np.full(len(colorCoord), primaryValue),
+                colorCoord[:, 1],
+            )
+        else:
+            span = limits[None, 0:2]
+        colorCoord[:, 0] = span[:, 0] + (span[:, 1] - span[:, 0]) * colorCoord[:, 0]
+
+    wheelColor = np.zeros((len(p), 3))
+    wheelColor[inShape] = channelsToSrgb(
+        colorModel,
+        withPrimary(primaryIndex, np.full(len(colorCoord), primaryValue), colorCoord),
+        outOfGamut,
+    )
+    antialias = np.where(inShape, antialias, 0.0)[:, None]
+    image[onPlane] = image[onPlane] * (1.0 - antialias) + wheelColor * antialias
+    return toBytes(image).reshape(height, width, 3)
+
+
+# The ring alone, transparent elsewhere, like `secondary_channels_plane.frag`
+# with RING_PASS, as (height, width, 4) bytes.
+def renderRing(
+    width: int,
+    height: int,
+    res: float,
+    colorModel: ColorModel,
+    primaryIndex: int,
+    secondaryValues: tuple[float, float],
+    ringThickness: float,
+    ringRotation: float,
+    ringReversed: bool,
+    outOfGamut: tuple[float, float, float] | None,
+    gamut: GamutArrays,
+    gamutFlags: tuple[bool, bool, bool],
+):
+    _, spansEnabled, clippedRange = gamutFlags
+    image = np.zeros((height * width, 4))
+    if ringThickness <= 0.0:
+        return toBytes(image).reshape(height, width, 4)
+
+    coords = fragCoords(width, height).reshape(-1, 2)
+    d = np.hypot(coords[:, 0] - res * 0.5, coords[:, 1] - res * 0.5)
+    onRing = (d < res * 0.5) & (d > res * 0.5 - ringThickness)
+    p = coords[onRing] / res * 2.0 - 1.0
+    d = d[onRing]
+
+    ringValues = (np.arctan2(p[:, 1], p[:, 0]) + ringRotation) / 2.0 / math.pi + 0.5
+    ringValues -= np.floor(ringValues)
+    if ringReversed:
+        ringValues = 1.0 - ringValues
+
+    secondary = np.empty((len(ringValues), 2))
+    secondary[:] = secondaryValues
+    color = channelsToSrgb(
+        colorModel, withPrimary(primaryIndex, ringValues, secondary), outOfGamut
+    )
+    if clippedRange:
+        offPlane = ~gamut.onClippedPlane(
+            primaryIndex, ringValues, secondaryValues, spansEnabled
+        )
+        fadeOffClippedPlane(color, offPlane)
+
+    SMOOTH = 1.5
+    inner, outer = res * 0.5 - ringThickness, res * 0.5
+    antialiasing = np.abs(
+        smoothstep(inner - SMOOTH, inner + SMOOTH, d)
+        - smoothstep(outer - SMOOTH, outer + SMOOTH, d)
+    )
+    image[onRing, 0:3] = color
+    image[onRing, 3] = antialiasing
+    return toBytes(image).reshape(height, width, 4)
+
+
+# The bar, like `primary_channel_bar.frag`, as (height, width, 3) bytes. Every
+# row is the same.
+def renderBar(
+    width: int,
+    height: int,
+    res: float,
+    colorModel: ColorModel,
+    primaryIndex: int,
+    secondaryValues: tuple[float, float],
+    outOfGamut: tuple[float, float, float] | None,
+    gamut: GamutArrays,
+    gamutFlags: tuple[bool, bool, bool],
+):
+    _, spansEnabled, clippedRange = gamutFlags
+    primaryValues = (np.arange(width) + 0.5) / res
+    secondary = np.empty((width, 2))
+    secondary[:] = secondaryValues
+    color = channelsToSrgb(
+        colorModel, withPrimary(primaryIndex, primaryValues, secondary), outOfGamut
+    )
+    if clippedRange:
+        offPlane = ~gamut.onClippedPlane(
+            primaryIndex, primaryValues, secondaryValues, spansEnabled
+        )
+        fadeOffClippedPlane(color, offPlane)
+    row = toBytes(color).reshape(1, width, 3)
+    return np.ascontiguousarray(np.broadcast_to(row, (height, width, 3)))
+
+
+# Colors in [0, 1] to bytes, rounded like normalized framebuffers store them.
+def toBytes(colors):
+    return np.rint(np.clip(colors, 0.0, 1.0) * 255.0).astype(np.uint8)
+
+
+# Image owning a copy of `pixels`, (height, width, 3) or (height, width, 4)
+# bytes.
+def toQImage(pixels, devicePixelRatio: float) -> QImage:
+    height, width, channels = pixels.shape
+    format = (
+        QImage.Format.Format_RGB888 if channels == 3 else QImage.Format.Format_RGBA8888
+    )
+    data = np.ascontiguousarray(pixels).tobytes()
+    image = QImage(data, width, height, width * channels, format).copy()
+    image.setDevicePixelRatio(devicePixelRatio)
+    return image
@@ -12,9 +12,10 @@ from krita import *  # type: ignore
 
 from .color_wheel import SecondaryChannelsPlane, PrimaryChannelBar, INDICATOR_BLOCKS
 from .models import ColorModel
-from .config import DOCKER_NAME, DOCKER_ID
+from .config import DOCKER_NAME, DOCKER_ID, SPIN_BOX_UPDATE_INTERVAL_MS
 from .setting import SettingsDialog, GlobalSettingsDialog
 from .internal_state import STATE
+from .update_scheduler import UPDATE_SCHEDULER
 from .color_model_switcher import ColorModelSwitcher
 from .channel_lockers import ChannelLockers
 
@@ -69,7 +70,12 @@ class ExtendedColorSelector(DockWidget):  # type: ignore
 
         STATE.settingsChanged.connect(self.updateFromSettings)
         STATE.colorModelChanged.connect(self.updateColorModel)
-        STATE.colorChanged.connect(self.updateChannelSpinBoxes)
+        UPDATE_SCHEDULER.subscribe(
+            STATE.colorChanged,
+            "spin boxes",
+            self.updateChannelSpinBoxes,
+            SPIN_BOX_UPDATE_INTERVAL_MS,
+        )
         self.updateFromSettings()
 
     def updateFromSettings(self):
@@ -91,8 +97,6 @@ class ExtendedColorSelector(DockWidget):  # type: ignore
     def updateColorModel(self):
         self.updateChannelIndicators()
         self.updateChannelSpinBoxes()
-        self.secondaryChannelsPlane.compileShader()
-        self.primaryChannelBar.compileShader()
 
     def updateChannelIndicators(self):
         displayMin, displayMax = STATE.colorModel.displayLimits()
@@ -140,8 +144,8 @@ class ExtendedColorSelector(DockWidget):  # type: ignore
 
     def canvasChanged(self, canvas):
         STATE.syncColor()
-        self.secondaryChannelsPlane.updateShaders()
-        self.primaryChannelBar.updateShaders()
+        self.secondaryChannelsPlane.updateFromSettings()
+        self.primaryChannelBar.updateView()
 
 
 dock_widget_factory = DockWidgetFactory(  # type: ignore
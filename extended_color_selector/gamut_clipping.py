@@ -1,3 +1,8 @@
+from PyQt5.QtCore import (
+    QObject,
+    Qt,
+    pyqtSignal,
+)
 from PyQt5.QtWidgets import (
     QMessageBox,
 )
@@ -5,37 +10,230 @@ from PyQt5.QtWidgets import (
 from pathlib import Path
 import array
 import math
+import threading
 
 from .models import ColorModel
-from .config import AXES_LIMITS_SEGMENTS, AXES_LIMITS_OFFSET
+from .config import AXES_LIMITS_SEGMENTS, AXES_LIMITS_OFFSET, GAMUT_SPAN_ROWS
+from .axes_limits import (
+    AXES_LIMITS_MODELS,
+    AxesLimits,
+    AxesLimitsError,
+    AxesLimitsFile,
+    GamutSpans,
+    openAxesLimits,
+    readGamutSpans,
+)
+from .axes_limits_baker import (
+    canBakeAxesLimits,
+    cachedAxesLimitsPath,
+    cachedGamutSpansPath,
+    bakeGamutFiles,
+)
 
-limitsBytes = (Path(__file__).parent / "axes_limits.bytes").read_bytes()
-limits = array.array("f")
-limits.frombytes(limitsBytes)
 
-expectedLen = (
-    sum([(1 if cm.isColorfulable() else 0) for cm in ColorModel])
-    * (AXES_LIMITS_SEGMENTS + 1)
-    * 4
-    * 3
-)
-if len(limits) != expectedLen:
+class AxesLimitsSignals(QObject):
+    # Emitted once limits or spans baked in the background are ready.
+    loaded = pyqtSignal()
+    failed = pyqtSignal(str)
+
+
+def showAxesLimitsError(message: str):
     QMessageBox.critical(
         None,
         "Extended Color Selector - Gamut Clipping",
-        f"Length of numbers in gamut clipping limits file not matching to config: {len(limits)} != {expectedLen}. This can be cause by modifying the AXES_LIMITS_SEGMENTS without rebaking the limits file. To know how to rebake this file, see README.",
+        f"{message} Gamut clipping is disabled. To know how to rebake this file, see README.",
+    )
+
+
+AXES_LIMITS_SIGNALS = AxesLimitsSignals()
+# Baking fails on another thread, but message boxes belong to the GUI thread.
+# Loading fails on first use, often while painting with the OpenGL context
+# current or handling a mouse event, so the message box waits until then.
+AXES_LIMITS_SIGNALS.failed.connect(
+    showAxesLimitsError, Qt.ConnectionType.QueuedConnection
+)
+
+# Limits of each model are read on first use, nothing is read while the
+# plugin is being imported.
+AXES_LIMITS = AxesLimits.unlimited(AXES_LIMITS_SEGMENTS)
+# Files to read the limits of models not read yet from, `None` until opened.
+AXES_LIMITS_SOURCES: dict[ColorModel, AxesLimitsFile] | None = None
+# Only exist once baked, `None` until then or without NumPy.
+GAMUT_SPANS: GamutSpans | None = None
+GAMUT_SPANS_LOADED = False
+
+BAKE_LOCK = threading.Lock()
+BAKING = False
+# Models whose limits wait to be baked, and whether spans do.
+BAKE_MODELS: set[ColorModel] = set()
+BAKE_SPANS = False
+
+
+# Sections of the shipped file are used when it matches `AXES_LIMITS_SEGMENTS`.
+# Models missing from it, or whose sections are corrupted, are read from the
+# Krita data directory, or baked there on a background thread, and stay
+# unlimited until they're ready.
+def loadAxesLimits(colorModel: ColorModel) -> AxesLimits:
+    global AXES_LIMITS_SOURCES
+    if AXES_LIMITS_SOURCES == None:
+        AXES_LIMITS_SOURCES = {}
+        _openAxesLimitsSources()
+
+    source = AXES_LIMITS_SOURCES.pop(colorModel, None)
+    if source == None:
+        return AXES_LIMITS
+    try:
+        AXES_LIMITS.add(source.read([colorModel], AXES_LIMITS_OFFSET))
+    except AxesLimitsError as e:
+        if source.path == cachedAxesLimitsPath(AXES_LIMITS_SEGMENTS):
+            startBaking([colorModel])
+        else:
+            _loadCachedAxesLimits([colorModel], e)
+    return AXES_LIMITS
+
+
+def _openAxesLimitsSources():
+    error = AxesLimitsError("Axes limits file misses some color models.")
+    try:
+        shipped = openAxesLimits(
+            Path(__file__).parent / "axes_limits.bytes", AXES_LIMITS_SEGMENTS
+        )
+        for model in shipped.models():
+            AXES_LIMITS_SOURCES[model] = shipped
+    except AxesLimitsError as e:
+        error = e
+
+    missing = [model for model in AXES_LIMITS_MODELS if model not in AXES_LIMITS_SOURCES]
+    if len(missing) > 0:
+        _loadCachedAxesLimits(missing, error)
+
+
+# Limits of `models` come from the Krita data directory, and are baked there
+# if they aren't yet. Without it or without NumPy, they stay unlimited.
+def _loadCachedAxesLimits(models: list[ColorModel], error: AxesLimitsError):
+    cachePath = cachedAxesLimitsPath(AXES_LIMITS_SEGMENTS)
+    if cachePath == None or not canBakeAxesLimits():
+        AXES_LIMITS_SIGNALS.failed.emit(str(error))
+        return
+
+    try:
+        cache = openAxesLimits(cachePath, AXES_LIMITS_SEGMENTS)
+        for model in cache.models():
+            if model in models:
+                AXES_LIMITS_SOURCES[model] = cache
+    except AxesLimitsError:
+        pass
+
+    missing = [model for model in models if model not in AXES_LIMITS_SOURCES]
+    if len(missing) > 0:
+        startBaking(missing)
+
+
+# Spans are always baked by the plugin, the first call starts baking them if
+# they aren't cached yet.
+def loadGamutSpans() -> GamutSpans | None:
+    global GAMUT_SPANS, GAMUT_SPANS_LOADED
+    if GAMUT_SPANS_LOADED:
+        return GAMUT_SPANS
+    GAMUT_SPANS_LOADED = True
+
+    cachePath = cachedGamutSpansPath(AXES_LIMITS_SEGMENTS, GAMUT_SPAN_ROWS)
+    if cachePath == None or not canBakeAxesLimits():
+        return None
+    try:
+        GAMUT_SPANS = readGamutSpans(
+            cachePath, AXES_LIMITS_SEGMENTS, GAMUT_SPAN_ROWS, AXES_LIMITS_OFFSET
+        )
+    except AxesLimitsError:
+        startBaking([], spans=True)
+    return GAMUT_SPANS
+
+
+# Only the limits of `models` are rebaked, those of other models in the cache
+# are kept. Spans are baked for every model at once, along with their limits,
+# converting the colors only once. Requests made while baking are baked next.
+def startBaking(models: list[ColorModel], spans: bool = False):
+    global BAKING, BAKE_SPANS
+    with BAKE_LOCK:
+        BAKE_MODELS.update(models)
+        BAKE_SPANS = BAKE_SPANS or spans
+        if BAKING:
+            return
+        BAKING = True
+    threading.Thread(
+        target=_bakeInBackground, name="axes_limits_baker", daemon=True
+    ).start()
+
+
+def _bakeInBackground():
+    global BAKING, BAKE_SPANS
+    while True:
+        with BAKE_LOCK:
+            if len(BAKE_MODELS) == 0 and not BAKE_SPANS:
+                BAKING = False
+                return
+            spans = BAKE_SPANS
+            models = (
+                AXES_LIMITS_MODELS
+                if spans
+                else [model for model in ColorModel if model in BAKE_MODELS]
+            )
+            BAKE_MODELS.clear()
+            BAKE_SPANS = False
+
+        try:
+            _bake(models, spans)
+        except (OSError, AxesLimitsError) as e:
+            AXES_LIMITS_SIGNALS.failed.emit(f"Unable to bake axes limits: {e}.")
+            continue
+        AXES_LIMITS_SIGNALS.loaded.emit()
+
+
+def _bake(models: list[ColorModel], spans: bool):
+    global GAMUT_SPANS
+    limitsPath = cachedAxesLimitsPath(AXES_LIMITS_SEGMENTS)
+    spansPath = cachedGamutSpansPath(AXES_LIMITS_SEGMENTS, GAMUT_SPAN_ROWS)
+    if limitsPath == None or spansPath == None:
+        raise AxesLimitsError("Krita has no data directory to bake into")
+    bakeGamutFiles(
+        limitsPath,
+        spansPath if spans else None,
+        AXES_LIMITS_SEGMENTS,
+        GAMUT_SPAN_ROWS,
+        models,
     )
 
+    # Limits already read, or read from the shipped file, are kept. Sources
+    # are opened with the cache once they're first needed.
+    cache = openAxesLimits(limitsPath, AXES_LIMITS_SEGMENTS)
+    for model in models:
+        if (
+            AXES_LIMITS_SOURCES != None
+            and not AXES_LIMITS.has(model)
+            and model not in AXES_LIMITS_SOURCES
+        ):
+            AXES_LIMITS_SOURCES[model] = cache
+    if spans:
+        GAMUT_SPANS = readGamutSpans(
+            spansPath, AXES_LIMITS_SEGMENTS, GAMUT_SPAN_ROWS, AXES_LIMITS_OFFSET
+        )
 
+
+# With `followShape`, x is mapped to the span of the gamut at the mapped y,
+# instead of to the bounding box, when spans are available.
 def mapAxesToLimited(
     colorModel: ColorModel,
     primary: int,
     primaryValue: float,
     secondaryAxes: tuple[float, float],
+    followShape: bool = False,
 ) -> tuple[float, float]:
     (mnx, mxx), (mny, mxy) = getAxesLimitsInterpolated(colorModel, primary, primaryValue)
     x, y = secondaryAxes
-    return mnx * (1 - x) + mxx * x, mny * (1 - y) + mxy * y
+    y = mny * (1 - y) + mxy * y
+    if followShape:
+        mnx, mxx = getGamutSpan(colorModel, primary, primaryValue, y, (mnx, mxx))
+    return mnx * (1 - x) + mxx * x, y
 
 
 def unmapAxesFromLimited(
@@ -43,19 +241,49 @@ def unmapAxesFromLimited(
     primary: int,
     primaryValue: float,
     mappedSecondaryAxes: tuple[float, float],
+    followShape: bool = False,
 ) -> tuple[float, float]:
     (mnx, mxx), (mny, mxy) = getAxesLimitsInterpolated(colorModel, primary, primaryValue)
     x, y = mappedSecondaryAxes
+    if followShape:
+        mnx, mxx = getGamutSpan(colorModel, primary, primaryValue, y, (mnx, mxx))
     return (x - mnx) / max(mxx - mnx, 1e-4), (y - mny) / max(mxy - mny, 1e-4)
 
 
+def getGamutSpan(
+    colorModel: ColorModel,
+    primary: int,
+    primaryValue: float,
+    y: float,
+    default: tuple[float, float],
+) -> tuple[float, float]:
+    spans = loadGamutSpans()
+    if spans == None or not spans.has(colorModel):
+        return default
+    return spans.get(colorModel, primary, primaryValue, y)
+
+
+# Tables of one model for the shaders, uploaded as textures. Either is `None`
+# when the model has none, spans until they're baked. Spans are only loaded,
+# and baked, `withSpans`.
+def getGamutTables(
+    colorModel: ColorModel, withSpans: bool
+) -> tuple[array.array | None, array.array | None]:
+    spans = loadGamutSpans() if withSpans else None
+    return (
+        loadAxesLimits(colorModel).modelValues(colorModel),
+        None if spans == None else spans.modelValues(colorModel),
+    )
+
+
 def getAxesLimitsInterpolated(
     colorModel: ColorModel, primary: int, primaryValue: float
 ) -> tuple[tuple[float, float], tuple[float, float]]:
     a = primaryValue * AXES_LIMITS_SEGMENTS
     t = a - int(a)
-    (minXA, maxXA), (minYA, maxYA) = getAxesLimits(colorModel, primary, int(a))
-    (minXB, maxXB), (minYB, maxYB) = getAxesLimits(
+    limits = loadAxesLimits(colorModel)
+    (minXA, maxXA), (minYA, maxYA) = limits.get(colorModel, primary, int(a))
+    (minXB, maxXB), (minYB, maxYB) = limits.get(
         colorModel, primary, int(math.ceil(a))
     )
     return ((minXA * (1 - t) + minXB * t), (maxXA * (1 - t) + maxXB * t)), (
@@ -67,16 +295,4 @@ def getAxesLimitsInterpolated(
 def getAxesLimits(
     colorModel: ColorModel, primary: int, primaryValue: int
 ) -> tuple[tuple[float, float], tuple[float, float]]:
-    if not colorModel.isNotSrgbBased():
-        return ((0.0, 1.0), (0.0, 1.0))
-
-    colorModelIndex = int(colorModel) - 3
-    base = (colorModelIndex * 3 + primary) * (AXES_LIMITS_SEGMENTS + 1) + primaryValue
-    base *= 4
-    return (
-        max(limits[base] - AXES_LIMITS_OFFSET, 0),
-        min(limits[base + 1] + AXES_LIMITS_OFFSET, 1),
-    ), (
-        max(limits[base + 2] - AXES_LIMITS_OFFSET, 0),
-        min(limits[base + 3] + AXES_LIMITS_OFFSET, 1),
-    )
+    return loadAxesLimits(colorModel).get(colorModel, primary, primaryValue)
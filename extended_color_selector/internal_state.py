@@ -13,6 +13,7 @@ from krita import *  # type: ignore
 from .models import (
     ColorModel,
     transferColorModel,
+    cachedTransferColorModel,
     SettingsPerColorModel,
     GlobalSettings,
 )
@@ -189,11 +190,11 @@ class InternalState(QObject):
             return
 
         kritaColor, kritaColorModel = kritaColor
-        r, g, b = transferColorModel(
+        r, g, b = cachedTransferColorModel(
             self.color,
             self.colorModel,
             ColorModel.Rgb,
-            transferColorModel(kritaColor, kritaColorModel, ColorModel.Rgb),
+            cachedTransferColorModel(kritaColor, kritaColorModel, ColorModel.Rgb),
         )
         r = min(int(r * 256), 255)
         g = min(int(g * 256), 255)
@@ -213,7 +214,7 @@ class InternalState(QObject):
         kritaColor, colorModel = kritaColor
 
         if STATE.globalSettings.dontSyncIfOutOfGamut:
-            curColor = transferColorModel(
+            curColor = cachedTransferColorModel(
                 self.color, self.colorModel, colorModel, clamp=False
             )
             if (
@@ -226,7 +227,7 @@ class InternalState(QObject):
             ):
                 return
 
-        color = transferColorModel(
+        color = cachedTransferColorModel(
             kritaColor,
             colorModel,
             self.colorModel,
@@ -1,9 +1,20 @@
 from PyQt5.QtGui import QVector2D
-from pathlib import Path
+from typing import Callable
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from enum import IntEnum
+from functools import lru_cache
+import array
+import bisect
+import heapq
 import math
 
-from .config import DOCKER_NAME
+from .config import (
+    DOCKER_NAME,
+    CONVERSION_CACHE_CAPACITY,
+    CONVERSION_CACHE_QUANTIZATION,
+    CUSP_TABLE_SIZE,
+)
 
 
 class WheelShape(IntEnum):
@@ -20,7 +31,9 @@ class WheelShape(IntEnum):
             case WheelShape.Circle:
                 return "Circle"
 
-    def modifyShader(self, shader: str) -> str:
+    # Path of the source defining `getColorCoordAndAntialias`, for
+    # `assembleShader`.
+    def shaderComponent(self) -> str:
         name = None
         match self:
             case WheelShape.Square:
@@ -29,16 +42,7 @@ class WheelShape(IntEnum):
                 name = "triangle"
             case WheelShape.Circle:
                 name = "circle"
-
-        component = open(
-            Path(__file__).parent / "shader_components" / "shapes" / f"{name}.glsl"
-        ).read()[
-            18:
-        ]  # To strip the version directive
-        return shader.replace(
-            "vec3 getColorCoordAndAntialias(vec2 p, float normalizedRingThickness);",
-            component,
-        )
+        return f"shader_components/shapes/{name}.glsl"
 
     def getColorCoord(
         self, p: tuple[float, float], normalizedRingThickness: float
@@ -133,175 +137,52 @@ class ColorModel(IntEnum):
     Okhsv = 7
     Okhsl = 8
 
-    def modifyShader(self, shader: str) -> str:
-        name = None
-        match self:
-            case ColorModel.Rgb:
-                name = "rgb"
-            case ColorModel.Hsv:
-                name = "hsv"
-            case ColorModel.Hsl:
-                name = "hsl"
-            case ColorModel.Oklab:
-                name = "oklab"
-            case ColorModel.Xyz:
-                name = "xyz"
-            case ColorModel.Lab:
-                name = "lab"
-            case ColorModel.Oklch:
-                name = "oklch"
-            case ColorModel.Okhsv:
-                name = "okhsv"
-            case ColorModel.Okhsl:
-                name = "okhsl"
-
-        component = open(
-            Path(__file__).parent
-            / "shader_components"
-            / "color_models"
-            / f"{name}.glsl"
-        ).read()[
-            18:
-        ]  # To strip the version directive
-        return shader.replace("vec3 colorToSrgb(vec3 color)", component)
+    def descriptor(self) -> "ColorModelDescriptor":
+        return COLOR_MODEL_DESCRIPTORS[self]
+
+    # Path of the source defining `colorToSrgb`, for `assembleShader`.
+    def shaderComponent(self) -> str:
+        return f"shader_components/color_models/{self.descriptor().shaderName}.glsl"
 
     def displayName(self) -> str:
-        match self:
-            case ColorModel.Rgb:
-                return "RGB"
-            case ColorModel.Hsv:
-                return "HSV"
-            case ColorModel.Hsl:
-                return "HSL"
-            case ColorModel.Oklab:
-                return "OkLab"
-            case ColorModel.Xyz:
-                return "XYZ"
-            case ColorModel.Lab:
-                return "Lab"
-            case ColorModel.Oklch:
-                return "OkLch"
-            case ColorModel.Okhsv:
-                return "OkHsv"
-            case ColorModel.Okhsl:
-                return "OkHsl"
-
-    def channelNames(self) -> list[str]:
-        match self:
-            case ColorModel.Rgb:
-                return ["R", "G", "B"]
-            case ColorModel.Hsv:
-                return ["H", "S", "V"]
-            case ColorModel.Hsl:
-                return ["H", "S", "L"]
-            case ColorModel.Oklab:
-                return ["L", "A", "B"]
-            case ColorModel.Xyz:
-                return ["X", "Y", "Z"]
-            case ColorModel.Lab:
-                return ["L", "A", "B"]
-            case ColorModel.Oklch:
-                return ["L", "C", "H"]
-            case ColorModel.Okhsv:
-                return ["H", "S", "V"]
-            case ColorModel.Okhsl:
-                return ["H", "S", "L"]
+        return COLOR_MODEL_DESCRIPTORS[self].displayName
+
+    def channelNames(self) -> tuple[str, str, str]:
+        return COLOR_MODEL_DESCRIPTORS[self].channelNames
 
     # Returns the minimum and maximum values for each channel in their own space.
     def limits(self) -> tuple[tuple[float, float, float], tuple[float, float, float]]:
-        match self:
-            case ColorModel.Rgb:
-                return (0, 0, 0), (1, 1, 1)
-            case ColorModel.Hsv:
-                return (0, 0, 0), (360, 1, 1)
-            case ColorModel.Hsl:
-                return (0, 0, 0), (360, 1, 1)
-            case ColorModel.Oklab:
-                return (0, -1, -1), (1, 1, 1)
-            case ColorModel.Xyz:
-                return (0, 0, 0), (1, 1, 1)
-            case ColorModel.Lab:
-                return (0, -1, -1), (1, 1, 1)
-            case ColorModel.Oklch:
-                return (0, 0, 0), (1, 1, 360)
-            case ColorModel.Okhsv:
-                return (0, 0, 0), (360, 100, 100)
-            case ColorModel.Okhsl:
-                return (0, 0, 0), (360, 100, 100)
+        return COLOR_MODEL_DESCRIPTORS[self].limits
 
     def toDisplayValues(
         self, color: tuple[float, float, float]
     ) -> tuple[float, float, float]:
-        c0, c1, c2 = color
-        match self:
-            case ColorModel.Rgb:
-                return c0 * 100, c1 * 100, c2 * 100
-            case ColorModel.Hsv:
-                return c0 * 360, c1 * 100, c2 * 100
-            case ColorModel.Hsl:
-                return c0 * 360, c1 * 100, c2 * 100
-            case ColorModel.Oklab:
-                return c0 * 100, (c1 - 0.5) * 200, (c2 - 0.5) * 200
-            case ColorModel.Xyz:
-                return c0 * 100, c1 * 100, c2 * 100
-            case ColorModel.Lab:
-                return c0 * 100, (c1 - 0.5) * 200, (c2 - 0.5) * 200
-            case ColorModel.Oklch:
-                return c0 * 100, c1 * 100, c2 * 360
-            case ColorModel.Okhsv:
-                return c0 * 360, c1 * 100, c2 * 100
-            case ColorModel.Okhsl:
-                return c0 * 360, c1 * 100, c2 * 100
+        d = COLOR_MODEL_DESCRIPTORS[self]
+        scale, offset = d.displayScale, d.displayOffset
+        return (
+            (color[0] - offset[0]) * scale[0],
+            (color[1] - offset[1]) * scale[1],
+            (color[2] - offset[2]) * scale[2],
+        )
 
     def fromDisplayValues(
         self, displayed: tuple[float, float, float]
     ) -> tuple[float, float, float]:
-        c0, c1, c2 = displayed
-        match self:
-            case ColorModel.Rgb:
-                return c0 / 100, c1 / 100, c2 / 100
-            case ColorModel.Hsv:
-                return c0 / 360, c1 / 100, c2 / 100
-            case ColorModel.Hsl:
-                return c0 / 360, c1 / 100, c2 / 100
-            case ColorModel.Oklab:
-                return c0 / 100, (c1 + 0.5) / 200, (c2 + 0.5) / 200
-            case ColorModel.Xyz:
-                return c0 / 100, c1 / 100, c2 / 100
-            case ColorModel.Lab:
-                return c0 / 100, (c1 + 0.5) / 200, (c2 + 0.5) / 200
-            case ColorModel.Oklch:
-                return c0 / 100, c1 / 100, c2 / 360
-            case ColorModel.Okhsv:
-                return c0 / 360, c1 / 100, c2 / 100
-            case ColorModel.Okhsl:
-                return c0 / 360, c1 / 100, c2 / 100
+        d = COLOR_MODEL_DESCRIPTORS[self]
+        scale, offset = d.displayScale, d.displayOffset
+        return (
+            displayed[0] / scale[0] + offset[0],
+            displayed[1] / scale[1] + offset[1],
+            displayed[2] / scale[2] + offset[2],
+        )
 
     def displayLimits(
         self,
     ) -> tuple[tuple[float, float, float], tuple[float, float, float]]:
-        match self:
-            case ColorModel.Rgb:
-                return (0, 0, 0), (100, 100, 100)
-            case ColorModel.Hsv:
-                return (0, 0, 0), (360, 100, 100)
-            case ColorModel.Hsl:
-                return (0, 0, 0), (360, 100, 100)
-            case ColorModel.Oklab:
-                return (0, -100, -100), (100, 100, 100)
-            case ColorModel.Xyz:
-                return (0, 0, 0), (100, 100, 100)
-            case ColorModel.Lab:
-                return (0, -100, -100), (100, 100, 100)
-            case ColorModel.Oklch:
-                return (0, 0, 0), (100, 100, 360)
-            case ColorModel.Okhsv:
-                return (0, 0, 0), (360, 100, 100)
-            case ColorModel.Okhsl:
-                return (0, 0, 0), (360, 100, 100)
+        return COLOR_MODEL_DESCRIPTORS[self].displayLimits
 
     def clamp(self, color: tuple[float, float, float]) -> tuple[float, float, float]:
-        mn, mx = self.limits()
+        mn, mx = COLOR_MODEL_DESCRIPTORS[self].limits
         return (
             max(min(color[0], mx[0]), mn[0]),
             max(min(color[1], mx[1]), mn[1]),
@@ -311,80 +192,185 @@ class ColorModel(IntEnum):
     def normalize(
         self, color: tuple[float, float, float]
     ) -> tuple[float, float, float]:
-        mn, mx = self.limits()
+        d = COLOR_MODEL_DESCRIPTORS[self]
+        mn, span = d.limits[0], d.span
         return (
-            (color[0] - mn[0]) / (mx[0] - mn[0]),
-            (color[1] - mn[1]) / (mx[1] - mn[1]),
-            (color[2] - mn[2]) / (mx[2] - mn[2]),
+            (color[0] - mn[0]) / span[0],
+            (color[1] - mn[1]) / span[1],
+            (color[2] - mn[2]) / span[2],
         )
 
     def unnormalize(
         self, color: tuple[float, float, float]
     ) -> tuple[float, float, float]:
-        mn, mx = self.limits()
+        d = COLOR_MODEL_DESCRIPTORS[self]
+        mn, span = d.limits[0], d.span
         return (
-            color[0] * (mx[0] - mn[0]) + mn[0],
-            color[1] * (mx[1] - mn[1]) + mn[1],
-            color[2] * (mx[2] - mn[2]) + mn[2],
+            color[0] * span[0] + mn[0],
+            color[1] * span[1] + mn[1],
+            color[2] * span[2] + mn[2],
         )
 
     def makeColorful(
         self, color: tuple[float, float, float], channel: int
     ) -> tuple[float, float, float]:
-        ch = color[channel]
-
-        match self:
-            case ColorModel.Rgb:
-                return color
-            case ColorModel.Hsv:
-                match channel:
-                    case 0:
-                        return ch, 1, 1
-                    case _:
-                        return color
-            case ColorModel.Hsl:
-                match channel:
-                    case 0:
-                        return ch, 1, 0.5
-                    case _:
-                        return color
-            case ColorModel.Oklab:
-                return color
-            case ColorModel.Xyz:
-                return color
-            case ColorModel.Lab:
-                return color
-            case ColorModel.Oklch:
-                # TODO maybe?
-                return color
-            case ColorModel.Okhsv:
-                match channel:
-                    case 0:
-                        return ch, 1, 1
-                    case _:
-                        return color
-            case ColorModel.Okhsl:
-                match channel:
-                    case 0:
-                        return ch, 1, 0.5
-                    case _:
-                        return color
+        colorful = COLOR_MODEL_DESCRIPTORS[self].colorful
+        if colorful == None or channel != 0:
+            return color
+        return color[0], colorful[0], colorful[1]
 
     def isNotSrgbBased(self) -> bool:
-        return self in [
-            ColorModel.Oklab,
-            ColorModel.Xyz,
-            ColorModel.Lab,
-            ColorModel.Oklch,
-        ]
+        return COLOR_MODEL_DESCRIPTORS[self].isNotSrgbBased
 
     def isColorfulable(self) -> bool:
-        return self in [
-            ColorModel.Hsv,
-            ColorModel.Hsl,
-            ColorModel.Okhsv,
-            ColorModel.Okhsl,
-        ]
+        return COLOR_MODEL_DESCRIPTORS[self].colorful != None
+
+    # Index of the channel that wraps around, if any.
+    def hueChannel(self) -> int | None:
+        return COLOR_MODEL_DESCRIPTORS[self].hueChannel
+
+
+# When normalized `channel` is not above 1e-4 (or, with `excludeWhite`, not
+# below 1 - 1e-4 either), the values in `replaces` are meaningless and are
+# taken from the reference color instead. Rules apply in order.
+@dataclass(frozen=True, slots=True)
+class IndeterminacyRule:
+    channel: int
+    replaces: tuple[int, ...]
+    excludeWhite: bool = False
+
+
+# Everything the rest of the plugin needs to know about a color model, as data.
+@dataclass(frozen=True, slots=True)
+class ColorModelDescriptor:
+    displayName: str
+    channelNames: tuple[str, str, str]
+    # Name of the file in `shader_components/color_models` providing `colorToSrgb`.
+    shaderName: str
+    limits: tuple[tuple[float, float, float], tuple[float, float, float]]
+    displayLimits: tuple[tuple[float, float, float], tuple[float, float, float]]
+    # Displayed values are `(normalized - displayOffset) * displayScale`.
+    displayScale: tuple[float, float, float]
+    displayOffset: tuple[float, float, float] = (0, 0, 0)
+    isNotSrgbBased: bool = False
+    # Values of the two other channels making a hue as vivid as possible.
+    colorful: tuple[float, float] | None = None
+    hueChannel: int | None = None
+    indeterminacyRules: tuple[IndeterminacyRule, ...] = ()
+    span: tuple[float, float, float] = field(init=False)
+
+    def __post_init__(self):
+        mn, mx = self.limits
+        object.__setattr__(
+            self, "span", (mx[0] - mn[0], mx[1] - mn[1], mx[2] - mn[2])
+        )
+
+
+HUE_RULES = (
+    IndeterminacyRule(1, (0,)),
+    IndeterminacyRule(2, (0, 1)),
+)
+LIGHTNESS_RULES = (IndeterminacyRule(0, (1, 2), excludeWhite=True),)
+
+# Indexed by `ColorModel`.
+COLOR_MODEL_DESCRIPTORS: list[ColorModelDescriptor] = [
+    ColorModelDescriptor(
+        displayName="RGB",
+        channelNames=("R", "G", "B"),
+        shaderName="rgb",
+        limits=((0, 0, 0), (1, 1, 1)),
+        displayLimits=((0, 0, 0), (100, 100, 100)),
+        displayScale=(100, 100, 100),
+    ),
+    ColorModelDescriptor(
+        displayName="HSV",
+        channelNames=("H", "S", "V"),
+        shaderName="hsv",
+        limits=((0, 0, 0), (360, 1, 1)),
+        displayLimits=((0, 0, 0), (360, 100, 100)),
+        displayScale=(360, 100, 100),
+        colorful=(1, 1),
+        hueChannel=0,
+        indeterminacyRules=HUE_RULES,
+    ),
+    ColorModelDescriptor(
+        displayName="HSL",
+        channelNames=("H", "S", "L"),
+        shaderName="hsl",
+        limits=((0, 0, 0), (360, 1, 1)),
+        displayLimits=((0, 0, 0), (360, 100, 100)),
+        displayScale=(360, 100, 100),
+        colorful=(1, 0.5),
+        hueChannel=0,
+        indeterminacyRules=(
+            IndeterminacyRule(1, (0,)),
+            IndeterminacyRule(2, (0, 1), excludeWhite=True),
+        ),
+    ),
+    ColorModelDescriptor(
+        displayName="OkLab",
+        channelNames=("L", "A", "B"),
+        shaderName="oklab",
+        limits=((0, -1, -1), (1, 1, 1)),
+        displayLimits=((0, -100, -100), (100, 100, 100)),
+        displayScale=(100, 200, 200),
+        displayOffset=(0, 0.5, 0.5),
+        isNotSrgbBased=True,
+        indeterminacyRules=LIGHTNESS_RULES,
+    ),
+    ColorModelDescriptor(
+        displayName="XYZ",
+        channelNames=("X", "Y", "Z"),
+        shaderName="xyz",
+        limits=((0, 0, 0), (1, 1, 1)),
+        displayLimits=((0, 0, 0), (100, 100, 100)),
+        displayScale=(100, 100, 100),
+        isNotSrgbBased=True,
+    ),
+    ColorModelDescriptor(
+        displayName="Lab",
+        channelNames=("L", "A", "B"),
+        shaderName="lab",
+        limits=((0, -1, -1), (1, 1, 1)),
+        displayLimits=((0, -100, -100), (100, 100, 100)),
+        displayScale=(100, 200, 200),
+        displayOffset=(0, 0.5, 0.5),
+        isNotSrgbBased=True,
+        indeterminacyRules=LIGHTNESS_RULES,
+    ),
+    ColorModelDescriptor(
+        displayName="OkLch",
+        channelNames=("L", "C", "H"),
+        shaderName="oklch",
+        limits=((0, 0, 0), (1, 1, 360)),
+        displayLimits=((0, 0, 0), (100, 100, 360)),
+        displayScale=(100, 100, 360),
+        isNotSrgbBased=True,
+        hueChannel=2,
+        indeterminacyRules=(IndeterminacyRule(1, (0,)),) + LIGHTNESS_RULES,
+    ),
+    ColorModelDescriptor(
+        displayName="OkHsv",
+        channelNames=("H", "S", "V"),
+        shaderName="okhsv",
+        limits=((0, 0, 0), (360, 100, 100)),
+        displayLimits=((0, 0, 0), (360, 100, 100)),
+        displayScale=(360, 100, 100),
+        colorful=(1, 1),
+        hueChannel=0,
+        indeterminacyRules=HUE_RULES,
+    ),
+    ColorModelDescriptor(
+        displayName="OkHsl",
+        channelNames=("H", "S", "L"),
+        shaderName="okhsl",
+        limits=((0, 0, 0), (360, 100, 100)),
+        displayLimits=((0, 0, 0), (360, 100, 100)),
+        displayScale=(360, 100, 100),
+        colorful=(1, 0.5),
+        hueChannel=0,
+    ),
+]
 
 
 # Reference color is a color represented using `toModel` color model.
@@ -402,77 +388,38 @@ def transferColorModel(
     if fromModel == toModel:
         return color
 
+    return finishTransfer(
+        convertNormalized(color, fromModel, toModel), toModel, referenceColor, clamp
+    )
+
+
+# Converts normalized colors without resolving indetermination or clamping.
+def convertNormalized(
+    color: tuple[float, float, float], fromModel: ColorModel, toModel: ColorModel
+) -> tuple[float, float, float]:
     color = fromModel.unnormalize(color)
+    for step in compileConversion(fromModel, toModel):
+        color = step(color)
+    return toModel.normalize(color)
 
-    xyz = None
-    match fromModel:
-        case ColorModel.Rgb:
-            xyz = srgbToXyz(color)
-        case ColorModel.Hsv:
-            xyz = srgbToXyz(hsvToSrgb(color))
-        case ColorModel.Hsl:
-            xyz = srgbToXyz(hslToSrgb(color))
-        case ColorModel.Oklab:
-            xyz = oklabToXyz(color)
-        case ColorModel.Xyz:
-            xyz = color
-        case ColorModel.Lab:
-            xyz = labToXyz(color)
-        case ColorModel.Oklch:
-            xyz = oklchToXyz(color)
-        case ColorModel.Okhsv:
-            xyz = srgbToXyz(okhsvToSrgb(color))
-        case ColorModel.Okhsl:
-            xyz = srgbToXyz(okhslToSrgb(color))
-
-    unnormalized = None
-    match toModel:
-        case ColorModel.Rgb:
-            unnormalized = xyzToSrgb(xyz)
-        case ColorModel.Hsv:
-            unnormalized = srgbToHsv(xyzToSrgb(xyz))
-        case ColorModel.Hsl:
-            unnormalized = srgbToHsl(xyzToSrgb(xyz))
-        case ColorModel.Oklab:
-            unnormalized = xyzToOklab(xyz)
-        case ColorModel.Xyz:
-            unnormalized = xyz
-        case ColorModel.Lab:
-            unnormalized = xyzToLab(xyz)
-        case ColorModel.Oklch:
-            unnormalized = xyzToOklch(xyz)
-        case ColorModel.Okhsv:
-            unnormalized = srgbToOkhsv(xyzToSrgb(xyz))
-        case ColorModel.Okhsl:
-            unnormalized = srgbToOkhsl(xyzToSrgb(xyz))
-
-    c0, c1, c2 = toModel.normalize(unnormalized)
 
-    if referenceColor != None:
-        rc0, rc1, rc2 = referenceColor
+def finishTransfer(
+    color: tuple[float, float, float],
+    toModel: ColorModel,
+    referenceColor: tuple[float, float, float] | None,
+    clamp: bool,
+) -> tuple[float, float, float]:
+    c0, c1, c2 = color
 
+    if referenceColor != None:
         # Eliminate indetermination
-        match toModel:
-            case ColorModel.Rgb:
-                pass
-            case ColorModel.Hsv:
-                c0 = c0 if c1 > 1e-4 else rc0
-                c0, c1 = (c0, c1) if c2 > 1e-4 else (rc0, rc1)
-            case ColorModel.Hsl:
-                c0 = c0 if c1 > 1e-4 else rc0
-                c0, c1 = (c0, c1) if (c2 > 1e-4 and c2 < 1 - 1e-4) else (rc0, rc1)
-            case ColorModel.Oklab:
-                c1, c2 = (c1, c2) if (c0 > 1e-4 and c0 < 1 - 1e-4) else (rc1, rc2)
-            case ColorModel.Xyz:
-                pass
-            case ColorModel.Lab:
-                c1, c2 = (c1, c2) if (c0 > 1e-4 and c0 < 1 - 1e-4) else (rc1, rc2)
-            case ColorModel.Oklch:
-                c0 = c0 if (c1 > 1e-4) else rc0
-                c1, c2 = (c1, c2) if (c0 > 1e-4 and c0 < 1 - 1e-4) else (rc1, rc2)
-            case ColorModel.Okhsv:
-                c0 = c0 if c1 > 1e-4 else rc0
-                c0, c1 = (c0, c1) if c2 > 1e-4 else (rc0, rc1)
+        channels = [c0, c1, c2]
+        for rule in COLOR_MODEL_DESCRIPTORS[toModel].indeterminacyRules:
+            c = channels[rule.channel]
+            if not (c > 1e-4 and (not rule.excludeWhite or c < 1 - 1e-4)):
+                for i in rule.replaces:
+                    channels[i] = referenceColor[i]
+        c0, c1, c2 = channels
 
     result = c0, c1, c2
 
@@ -485,6 +432,81 @@ def transferColorModel(
     return result
 
 
+# Memoizes `transferColorModel` for the conversions repeated on every mouse move and sync.
+#
+# Only the conversion itself is cached, keyed on the color quantized to
+# `quantization` and the model pair. Indetermination is resolved and values are
+# clamped after the lookup, so a changed reference color never gets a stale result.
+class ConversionCache:
+    def __init__(
+        self,
+        capacity: int = CONVERSION_CACHE_CAPACITY,
+        quantization: float = CONVERSION_CACHE_QUANTIZATION,
+    ) -> None:
+        self.capacity = capacity
+        self.quantization = quantization
+        self.entries: OrderedDict[
+            tuple[int, int, int, ColorModel, ColorModel], tuple[float, float, float]
+        ] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def transfer(
+        self,
+        color: tuple[float, float, float],
+        fromModel: ColorModel,
+        toModel: ColorModel,
+        referenceColor: tuple[float, float, float] | None = None,
+        clamp: bool = True,
+    ) -> tuple[float, float, float]:
+        if fromModel == toModel:
+            return color
+
+        q = self.quantization
+        q0, q1, q2 = round(color[0] / q), round(color[1] / q), round(color[2] / q)
+        key = q0, q1, q2, fromModel, toModel
+
+        converted = self.entries.get(key)
+        if converted == None:
+            self.misses += 1
+            converted = convertNormalized((q0 * q, q1 * q, q2 * q), fromModel, toModel)
+            self.entries[key] = converted
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+        return finishTransfer(converted, toModel, referenceColor, clamp)
+
+    def resize(self, capacity: int):
+        self.capacity = capacity
+        while len(self.entries) > capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def hitRate(self) -> float:
+        total = self.hits + self.misses
+        return 0.0 if total == 0 else self.hits / total
+
+
+CONVERSION_CACHE = ConversionCache()
+
+
+def cachedTransferColorModel(
+    color: tuple[float, float, float],
+    fromModel: ColorModel,
+    toModel: ColorModel,
+    referenceColor: tuple[float, float, float] | None = None,
+    clamp: bool = True,
+) -> tuple[float, float, float]:
+    return CONVERSION_CACHE.transfer(color, fromModel, toModel, referenceColor, clamp)
+
+
 def cbrt(x: float) -> float:
     return x ** (1.0 / 3) if x > 0 else -((-x) ** (1.0 / 3))
 
@@ -924,9 +946,16 @@ def findCusp(a, b) -> tuple[float, float]:
 # L = L0 * (1 - t) + t * L1
 # C = t * C1
 # a and b must be normalized so a^2 + b^2 == 1
-def findGamutIntersection(a: float, b: float, L1: float, C1: float, L0: float) -> float:
+def findGamutIntersection(
+    a: float,
+    b: float,
+    L1: float,
+    C1: float,
+    L0: float,
+    cusp: tuple[float, float] | None = None,
+) -> float:
     # Find the cusp of the gamut triangle
-    Lcusp, Ccusp = findCusp(a, b)
+    Lcusp, Ccusp = findCusp(a, b) if cusp == None else cusp
 
     # Find the intersection for upper and lower half seprately
     t = None
@@ -1030,7 +1059,7 @@ def okhsvToSrgb(color: tuple[float, float, float]) -> tuple[float, float, float]
     a_ = math.cos(2.0 * math.pi * h)
     b_ = math.sin(2.0 * math.pi * h)
 
-    L_cusp, C_cusp = findCusp(a_, b_)
+    L_cusp, C_cusp, _, _ = cuspAt(h, a_, b_)
     S_max, T_max = toST(L_cusp, C_cusp)
     S_0 = 0.5
     k = 1 - S_0 / S_max
@@ -1073,8 +1102,8 @@ def srgbToOkhsv(rgb: tuple[float, float, float]) -> tuple[float, float, float]:
     L = lab[0]
     h = 0.5 + 0.5 * math.atan2(-lab[2], -lab[1]) / math.pi
 
-    cusp = findCusp(a_, b_)
-    S_max, T_max = toST(cusp[0], cusp[1])
+    L_cusp, C_cusp, _, _ = cuspAt(h, a_, b_)
+    S_max, T_max = toST(L_cusp, C_cusp)
     S_0 = 0.5
     k = 1 - S_0 / S_max
 
@@ -1144,10 +1173,108 @@ def get_ST_mid(a_: float, b_: float) -> tuple[float, float]:
     return S, T
 
 
-def get_Cs(L: float, a_: float, b_: float) -> tuple[float, float, float]:
-    cusp = findCusp(a_, b_)
+# Hue indexed table of `findCusp` and `get_ST_mid`, which only depend on hue
+# but are most of the cost of the Okhsv and Okhsl conversions. Each entry is
+# L_cusp, C_cusp, S_mid, T_mid, sampled at about `CUSP_TABLE_SIZE` hues in turns.
+#
+# The cusp has kinks at the hues of the sRGB primaries and secondaries, where
+# the channel limiting saturation or lightness changes, and jumps slightly
+# where `computeMaxSaturation` switches between its fits. Each of those hues is
+# sampled twice, once from either side, so interpolation never cuts across
+# them. The first entry is repeated at hue 1 so lookups interpolate across the wrap.
+#
+# Built on first use, `setExactCusp` switches back to the exact functions.
+CUSP_TABLE: tuple[array.array, array.array] | None = None
+EXACT_CUSP = False
+
+
+def setExactCusp(exact: bool):
+    global EXACT_CUSP
+    if EXACT_CUSP != exact:
+        EXACT_CUSP = exact
+        CONVERSION_CACHE.clear()
+
+
+def isExactCusp() -> bool:
+    return EXACT_CUSP
+
+
+# Returns the sampled hues and the flattened entries.
+def cuspTable() -> tuple[array.array, array.array]:
+    global CUSP_TABLE
+    if CUSP_TABLE != None:
+        return CUSP_TABLE
+
+    kinks = []
+    for rgb in [(1, 0, 0), (1, 1, 0), (0, 1, 0), (0, 1, 1), (0, 0, 1), (1, 0, 1)]:
+        lab = linearSrgbToOklab(rgb)
+        kinks.append(0.5 + 0.5 * math.atan2(-lab[2], -lab[1]) / math.pi)
+    # Hues where the lines selecting coefficients in `computeMaxSaturation` cross the unit circle.
+    for na, nb in [(-1.88170328, -0.80936493), (1.81444104, -1.19445276)]:
+        phi = math.atan2(nb, na)
+        spread = math.acos(1 / math.hypot(na, nb))
+        kinks.append((phi + spread) / (2.0 * math.pi) % 1.0)
+        kinks.append((phi - spread) / (2.0 * math.pi) % 1.0)
+    knots = [0.0] + sorted(kinks) + [1.0]
+
+    hues = array.array("d")
+    table = array.array("d")
+    for h0, h1 in zip(knots, knots[1:]):
+        n = max(round((h1 - h0) * CUSP_TABLE_SIZE), 1)
+        samples = [(h0 + (h1 - h0) * i / n, 0.0) for i in range(n)]
+        if h0 > 0.0:
+            samples[0] = h0, 1e-9
+        if h1 < 1.0:
+            samples.append((h1, -1e-9))
+
+        for h, bias in samples:
+            a_ = math.cos(2.0 * math.pi * (h + bias))
+            b_ = math.sin(2.0 * math.pi * (h + bias))
+            hues.append(h)
+            table.extend(findCusp(a_, b_))
+            table.extend(get_ST_mid(a_, b_))
+    hues.append(1.0)
+    table.extend(table[:4])
+
+    CUSP_TABLE = hues, table
+    return CUSP_TABLE
+
+
+# L_cusp, C_cusp, S_mid and T_mid at hue `h` in turns.
+# a_ and b_ must be the same hue as a unit vector, they're used in exact mode.
+def cuspAt(h: float, a_: float, b_: float) -> tuple[float, float, float, float]:
+    if EXACT_CUSP:
+        L_cusp, C_cusp = findCusp(a_, b_)
+        S_mid, T_mid = get_ST_mid(a_, b_)
+        return L_cusp, C_cusp, S_mid, T_mid
+
+    # NaN, from NaN or infinite colors, has no row, exact mode gives NaN too.
+    if not math.isfinite(h):
+        return math.nan, math.nan, math.nan, math.nan
+
+    hues, table = cuspTable()
+    x = h - math.floor(h)
+    i = min(max(bisect.bisect_right(hues, x) - 1, 0), len(hues) - 2)
+    t = (x - hues[i]) / (hues[i + 1] - hues[i])
+    i *= 4
+    return (
+        table[i] + t * (table[i + 4] - table[i]),
+        table[i + 1] + t * (table[i + 5] - table[i + 1]),
+        table[i + 2] + t * (table[i + 6] - table[i + 2]),
+        table[i + 3] + t * (table[i + 7] - table[i + 3]),
+    )
+
+
+def get_Cs(
+    L: float,
+    a_: float,
+    b_: float,
+    cusp: tuple[float, float, float, float] | None = None,
+) -> tuple[float, float, float]:
+    if cusp == None:
+        cusp = findCusp(a_, b_) + get_ST_mid(a_, b_)
 
-    C_max = findGamutIntersection(a_, b_, L, 1, L)
+    C_max = findGamutIntersection(a_, b_, L, 1, L, (cusp[0], cusp[1]))
     ST_max = toST(cusp[0], cusp[1])
 
     # Scale factor to compensate for the curved part of gamut shape:
@@ -1155,7 +1282,7 @@ def get_Cs(L: float, a_: float, b_: float) -> tuple[float, float, float]:
 
     C_mid = 0.0
 
-    ST_mid = get_ST_mid(a_, b_)
+    ST_mid = cusp[2], cusp[3]
 
     # Use a soft minimum function, instead of a sharp triangle shape to get a smooth value for chroma.
     C_a = L * ST_mid[0]
@@ -1191,7 +1318,7 @@ def okhslToSrgb(hsl: tuple[float, float, float]) -> tuple[float, float, float]:
     b_ = math.sin(2 * math.pi * h)
     L = toeInv(l)
 
-    cs = get_Cs(L, a_, b_)
+    cs = get_Cs(L, a_, b_, cuspAt(h, a_, b_))
     C_0 = cs[0]
     C_mid = cs[1]
     C_max = cs[2]
@@ -1244,7 +1371,7 @@ def srgbToOkhsl(rgb: tuple[float, float, float]) -> tuple[float, float, float]:
     L = lab[0]
     h = 0.5 + 0.5 * math.atan2(-lab[2], -lab[1]) / math.pi
 
-    cs = get_Cs(L, a_, b_)
+    cs = get_Cs(L, a_, b_, cuspAt(h, a_, b_))
     C_0 = cs[0]
     C_mid = cs[1]
     C_max = cs[2]
@@ -1275,6 +1402,226 @@ def srgbToOkhsl(rgb: tuple[float, float, float]) -> tuple[float, float, float]:
     return h * 360, s * 100, l * 100
 
 
+# Conversion graph
+#
+# Instead of always going through XYZ, conversions follow the shortest path in a
+# graph of the direct conversions we have. Each edge is a list of steps, either a
+# function or a `ColorMatrix`. Consecutive matrices on a path are folded into one,
+# so for example linear sRGB -> XYZ -> LMS costs a single matrix multiplication.
+
+
+class ColorMatrix:
+    __slots__ = ("rows",)
+
+    def __init__(
+        self,
+        rows: tuple[
+            tuple[float, float, float],
+            tuple[float, float, float],
+            tuple[float, float, float],
+        ],
+    ) -> None:
+        self.rows = rows
+
+    def __call__(self, color: tuple[float, float, float]) -> tuple[float, float, float]:
+        (m00, m01, m02), (m10, m11, m12), (m20, m21, m22) = self.rows
+        c0, c1, c2 = color
+        return (
+            m00 * c0 + m01 * c1 + m02 * c2,
+            m10 * c0 + m11 * c1 + m12 * c2,
+            m20 * c0 + m21 * c1 + m22 * c2,
+        )
+
+    # `a @ b` applies `b` first, then `a`.
+    def __matmul__(self, other: "ColorMatrix") -> "ColorMatrix":
+        a, b = self.rows, other.rows
+        return ColorMatrix(
+            tuple(  # type: ignore
+                tuple(sum(a[i][k] * b[k][j] for k in range(3)) for j in range(3))
+                for i in range(3)
+            )
+        )
+
+
+SRGB_TO_XYZ = ColorMatrix(
+    (
+        (0.4124564, 0.3575761, 0.1804375),
+        (0.2126729, 0.7151522, 0.072175),
+        (0.0193339, 0.119192, 0.9503041),
+    )
+)
+XYZ_TO_SRGB = ColorMatrix(
+    (
+        (3.2404542, -1.5371385, -0.4985314),
+        (-0.969266, 1.8760108, 0.041556),
+        (0.0556434, -0.2040259, 1.0572252),
+    )
+)
+XYZ_TO_LMS = ColorMatrix(
+    (
+        (0.8189330101, 0.3618667424, -0.1288597137),
+        (0.0329845436, 0.9293118715, 0.0361456387),
+        (0.0482003018, 0.2643662691, 0.6338517070),
+    )
+)
+LMS_TO_XYZ = ColorMatrix(
+    (
+        (1.2270138511, -0.5577999806, 0.2812561489),
+        (-0.0405801784, 1.1122568696, -0.0716766786),
+        (-0.0763812845, -0.4214819784, 1.5861632204),
+    )
+)
+LMS_TO_OKLAB = ColorMatrix(
+    (
+        (0.2104542553, 0.7936177850, -0.0040720468),
+        (1.9779984951, -2.4285922050, 0.4505937099),
+        (0.0259040371, 0.7827717662, -0.8086757660),
+    )
+)
+OKLAB_TO_LMS = ColorMatrix(
+    (
+        (0.9999999984, 0.3963377921, 0.2158037580),
+        (1.0000000088, -0.10556134232, -0.0638541747),
+        (1.0000000546, -0.08948418209, -1.2914855378),
+    )
+)
+
+
+def cbrtColor(color: tuple[float, float, float]) -> tuple[float, float, float]:
+    return cbrt(color[0]), cbrt(color[1]), cbrt(color[2])
+
+
+def cubeColor(color: tuple[float, float, float]) -> tuple[float, float, float]:
+    return color[0] ** 3, color[1] ** 3, color[2] ** 3
+
+
+def toeLightness(color: tuple[float, float, float]) -> tuple[float, float, float]:
+    return toe(color[0]), color[1], color[2]
+
+
+def toeInvLightness(color: tuple[float, float, float]) -> tuple[float, float, float]:
+    return toeInv(color[0]), color[1], color[2]
+
+
+def oklabToOklch(color: tuple[float, float, float]) -> tuple[float, float, float]:
+    l, a, b = color
+    hue = math.degrees(math.atan2(b, a))
+    return l, math.hypot(a, b), hue + 360.0 if hue < 0.0 else hue
+
+
+def oklchToOklab(color: tuple[float, float, float]) -> tuple[float, float, float]:
+    hue = math.radians(color[2])
+    return color[0], color[1] * math.cos(hue), color[1] * math.sin(hue)
+
+
+# Nodes of the conversion graph. The first nine share values with `ColorModel`,
+# the rest are intermediate spaces that no color model exposes directly.
+class ConversionNode(IntEnum):
+    Rgb = 0
+    Hsv = 1
+    Hsl = 2
+    Oklab = 3
+    Xyz = 4
+    Lab = 5
+    Oklch = 6
+    Okhsv = 7
+    Okhsl = 8
+    LinearSrgb = 9
+    Lms = 10
+
+
+ConversionStep = ColorMatrix | Callable[
+    [tuple[float, float, float]], tuple[float, float, float]
+]
+
+CONVERSION_EDGES: list[tuple[ConversionNode, ConversionNode, list[ConversionStep]]] = [
+    (ConversionNode.Rgb, ConversionNode.LinearSrgb, [srgbToLinear]),
+    (ConversionNode.LinearSrgb, ConversionNode.Rgb, [linearToSrgb]),
+    (ConversionNode.LinearSrgb, ConversionNode.Xyz, [SRGB_TO_XYZ]),
+    (ConversionNode.Xyz, ConversionNode.LinearSrgb, [XYZ_TO_SRGB]),
+    (ConversionNode.Xyz, ConversionNode.Lms, [XYZ_TO_LMS]),
+    (ConversionNode.Lms, ConversionNode.Xyz, [LMS_TO_XYZ]),
+    (ConversionNode.Lms, ConversionNode.Oklab, [cbrtColor, LMS_TO_OKLAB, toeLightness]),
+    (ConversionNode.Oklab, ConversionNode.Lms, [toeInvLightness, OKLAB_TO_LMS, cubeColor]),
+    (ConversionNode.Oklab, ConversionNode.Oklch, [oklabToOklch]),
+    (ConversionNode.Oklch, ConversionNode.Oklab, [oklchToOklab]),
+    (ConversionNode.Xyz, ConversionNode.Lab, [xyzToLab]),
+    (ConversionNode.Lab, ConversionNode.Xyz, [labToXyz]),
+    (ConversionNode.Rgb, ConversionNode.Hsv, [srgbToHsv]),
+    (ConversionNode.Hsv, ConversionNode.Rgb, [hsvToSrgb]),
+    (ConversionNode.Rgb, ConversionNode.Hsl, [srgbToHsl]),
+    (ConversionNode.Hsl, ConversionNode.Rgb, [hslToSrgb]),
+    (ConversionNode.Rgb, ConversionNode.Okhsv, [srgbToOkhsv]),
+    (ConversionNode.Okhsv, ConversionNode.Rgb, [okhsvToSrgb]),
+    (ConversionNode.Rgb, ConversionNode.Okhsl, [srgbToOkhsl]),
+    (ConversionNode.Okhsl, ConversionNode.Rgb, [okhslToSrgb]),
+]
+
+
+# Matrices are cheap compared to the non-linear functions, and folding makes a run of
+# them cost as much as one.
+def stepCost(step: ConversionStep) -> int:
+    return 1 if isinstance(step, ColorMatrix) else 4
+
+
+def foldMatrices(steps: list[ConversionStep]) -> tuple[ConversionStep, ...]:
+    folded: list[ConversionStep] = []
+    for step in steps:
+        if (
+            isinstance(step, ColorMatrix)
+            and len(folded) > 0
+            and isinstance(folded[-1], ColorMatrix)
+        ):
+            folded[-1] = step @ folded[-1]
+        else:
+            folded.append(step)
+    return tuple(folded)
+
+
+def findConversionPath(
+    fromNode: ConversionNode, toNode: ConversionNode
+) -> list[ConversionStep]:
+    adjacency: dict[ConversionNode, list[tuple[ConversionNode, list[ConversionStep]]]] = {}
+    for src, dst, steps in CONVERSION_EDGES:
+        adjacency.setdefault(src, []).append((dst, steps))
+
+    # Dijkstra, the graph is tiny so this only runs once per pair anyway.
+    queue: list[tuple[int, int, ConversionNode, list[ConversionStep]]] = [
+        (0, 0, fromNode, [])
+    ]
+    visited = set()
+    counter = 0
+    while len(queue) > 0:
+        cost, _, node, path = heapq.heappop(queue)
+        if node == toNode:
+            return path
+        if node in visited:
+            continue
+        visited.add(node)
+
+        for dst, steps in adjacency.get(node, []):
+            if dst in visited:
+                continue
+            counter += 1
+            folded = foldMatrices(path + steps)
+            heapq.heappush(
+                queue,
+                (sum([stepCost(s) for s in folded]), counter, dst, path + steps),
+            )
+
+    raise Exception(f"No conversion path from {fromNode.name} to {toNode.name}")
+
+
+# Steps converting unnormalized `fromModel` values into unnormalized `toModel` values.
+@lru_cache(maxsize=None)
+def compileConversion(
+    fromModel: ColorModel, toModel: ColorModel
+) -> tuple[ConversionStep, ...]:
+    return foldMatrices(
+        findConversionPath(ConversionNode(int(fromModel)), ConversionNode(int(toModel)))
+    )
+
+
 def getOrDefault(l: list[str], default: str) -> str:
     try:
         s = l.pop()
@@ -1311,6 +1658,7 @@ class SettingsPerColorModel:
         self.colorfulPrimaryChannel = getOrDefault(s, "False") == "True"
         self.clipToSrgbGamut = getOrDefault(s, "False") == "True"
         self.showChannelLockers = getOrDefault(s, "False") == "True"
+        self.clipToGamutShape = getOrDefault(s, "False") == "True"
 
     def write(self, colorModel: ColorModel):
         s = [
@@ -1332,6 +1680,7 @@ class SettingsPerColorModel:
             self.colorfulPrimaryChannel,
             self.clipToSrgbGamut,
             self.showChannelLockers,
+            self.clipToGamutShape,
         ]
         Krita.instance().writeSetting(DOCKER_NAME, colorModel.displayName(), ",".join([str(x) for x in s]))  # type: ignore
 
@@ -1366,6 +1715,7 @@ class GlobalSettings:
         self.pBarHeight = int(getOrDefault(s, "20"))
         self.pEnableColorModelSwitcher = getOrDefault(s, "False") == "True"
         self.currentColorModel = ColorModel(int(getOrDefault(s, "0")))
+        self.colorLutEnabled = getOrDefault(s, "False") == "True"
 
     def write(self):
         s = [
@@ -1379,6 +1729,7 @@ class GlobalSettings:
             self.pBarHeight,
             self.pEnableColorModelSwitcher,
             int(self.currentColorModel),
+            self.colorLutEnabled,
         ]
         Krita.instance().writeSetting(  # type: ignore
             DOCKER_NAME, "global", ",".join([str(x) for x in s])
@@ -0,0 +1,345 @@
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    FIRST_EXCEPTION,
+    wait,
+)
+from enum import IntEnum
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+import multiprocessing
+import os
+import sys
+import threading
+
+from .models import ColorModel
+from .batch_conversion import np, transferColorModelArray
+from .config import (
+    PARALLEL_SHARD_SIZE,
+    PARALLEL_MIN_THREAD_COLORS,
+    PARALLEL_MIN_PROCESS_COLORS,
+    PARALLEL_CANCEL_POLL_INTERVAL,
+)
+
+# Parallel backends for `transferColorModelArray` on large buffers.
+#
+# Colors are split in shards of `PARALLEL_SHARD_SIZE`. The process backend
+# copies the colors once into a shared memory block that every worker maps,
+# and workers write their shard of the result next to it, so nothing but
+# shard bounds is pickled. Pools are spawned (never forked, the host is a Qt
+# application) on first use and kept until `shutdownPools`.
+#
+# Inside Krita `sys.executable` is Krita itself, which can't run workers, so
+# processes are only used when it's a Python interpreter, and threads are
+# used instead otherwise, even when `ConversionBackend.Process` is asked for. NumPy releases the GIL for most of the work, so
+# threads still scale somewhat.
+
+
+class ConversionBackend(IntEnum):
+    Auto = 0
+    Serial = 1
+    Thread = 2
+    Process = 3
+
+
+class ConversionCancelled(Exception):
+    pass
+
+
+class CancellationToken:
+    def __init__(self) -> None:
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    def isCancelled(self) -> bool:
+        return self.event.is_set()
+
+
+# Bytes before the colors in the shared memory block, the first one is set to cancel.
+CONTROL_BYTES = 8
+
+POOLS: dict[ConversionBackend, tuple[int, Executor]] = {}
+POOLS_LOCK = threading.Lock()
+
+
+def canUseProcesses() -> bool:
+    return np is not None and Path(sys.executable).name.lower().startswith("python")
+
+
+def chooseBackend(count: int, workers: int) -> ConversionBackend:
+    if workers <= 1 or count < PARALLEL_MIN_THREAD_COLORS:
+        return ConversionBackend.Serial
+    if count >= PARALLEL_MIN_PROCESS_COLORS and canUseProcesses():
+        return ConversionBackend.Process
+    return ConversionBackend.Thread
+
+
+def getPool(backend: ConversionBackend, workers: int) -> Executor:
+    with POOLS_LOCK:
+        entry = POOLS.get(backend)
+        if entry != None:
+            if entry[0] == workers:
+                return entry[1]
+            entry[1].shutdown(wait=False, cancel_futures=True)
+
+        if backend == ConversionBackend.Process:
+            if not canUseProcesses():
+                raise ValueError(
+                    f"Unable to spawn conversion processes with {sys.executable}"
+                )
+            pool = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            pool = ThreadPoolExecutor(workers, thread_name_prefix="color_conversion")
+        POOLS[backend] = workers, pool
+        return pool
+
+
+def shutdownPools():
+    with POOLS_LOCK:
+        for _, pool in POOLS.values():
+            pool.shutdown(wait=True, cancel_futures=True)
+        POOLS.clear()
+
+
+def shardBounds(count: int) -> list[tuple[int, int]]:
+    return [
+        (start, min(start + PARALLEL_SHARD_SIZE, count))
+        for start in range(0, count, PARALLEL_SHARD_SIZE)
+    ]
+
+
+# Same as `transferColorModelArray`, split across `workers` threads or processes.
+#
+# Raises `ConversionCancelled` once `token` is cancelled. Shards already being
+# converted are finished first, so cancelling takes at most one shard per worker.
+def parallelTransferColorModelArray(
+    colors,
+    fromModel: ColorModel,
+    toModel: ColorModel,
+    referenceColors=None,
+    clamp: bool = True,
+    workers: int | None = None,
+    backend: ConversionBackend = ConversionBackend.Auto,
+    token: CancellationToken | None = None,
+):
+    if np is None:
+        checkCancelled(token)
+        return transferColorModelArray(
+            colors, fromModel, toModel, referenceColors, clamp
+        )
+
+    colors = np.asarray(colors, dtype=np.float64).reshape(-1, 3)
+    if referenceColors is not None:
+        referenceColors = np.asarray(referenceColors, dtype=np.float64).reshape(-1, 3)
+
+    if workers == None:
+        workers = os.cpu_count() or 1
+    if backend == ConversionBackend.Auto:
+        backend = chooseBackend(len(colors), workers)
+    elif backend == ConversionBackend.Process and not canUseProcesses():
+        backend = ConversionBackend.Thread
+
+    match backend:
+        case ConversionBackend.Process:
+            return _transferProcesses(
+                colors, fromModel, toModel, referenceColors, clamp, workers, token
+            )
+        case ConversionBackend.Thread:
+            return _transferThreads(
+                colors, fromModel, toModel, referenceColors, clamp, workers, token
+            )
+        case _:
+            result = np.empty(colors.shape, dtype=np.float64)
+            for start, end in shardBounds(len(colors)):
+                checkCancelled(token)
+                _convertShard(
+                    colors, result, referenceColors, start, end, fromModel, toModel, clamp
+                )
+            return result
+
+
+def checkCancelled(token: CancellationToken | None):
+    if token != None and token.isCancelled():
+        raise ConversionCancelled()
+
+
+def _convertShard(
+    colors,
+    result,
+    referenceColors,
+    start: int,
+    end: int,
+    fromModel: ColorModel,
+    toModel: ColorModel,
+    clamp: bool,
+):
+    references = referenceColors
+    if references is not None and len(references) != 1:
+        references = references[start:end]
+    result[start:end] = transferColorModelArray(
+        colors[start:end], fromModel, toModel, references, clamp
+    )
+
+
+def _waitForShards(
+    futures: list[Future], token: CancellationToken | None, onCancel
+):
+    pending = set(futures)
+
+    # Lets running shards finish before the caller frees their buffers.
+    def stop():
+        onCancel()
+        for future in pending:
+            future.cancel()
+        wait(pending)
+
+    while len(pending) > 0:
+        done, pending = wait(
+            pending, timeout=PARALLEL_CANCEL_POLL_INTERVAL, return_when=FIRST_EXCEPTION
+        )
+        for future in done:
+            if future.exception() != None:
+                stop()
+                raise future.exception()
+
+        if token != None and token.isCancelled():
+            stop()
+            raise ConversionCancelled()
+
+
+def _transferThreads(
+    colors,
+    fromModel: ColorModel,
+    toModel: ColorModel,
+    referenceColors,
+    clamp: bool,
+    workers: int,
+    token: CancellationToken | None,
+):
+    result = np.empty(colors.shape, dtype=np.float64)
+
+    def convert(start: int, end: int):
+        if token == None or not token.isCancelled():
+            _convertShard(
+                colors, result, referenceColors, start, end, fromModel, toModel, clamp
+            )
+
+    pool = getPool(ConversionBackend.Thread, workers)
+    futures = [
+        pool.submit(convert, start, end) for start, end in shardBounds(len(colors))
+    ]
+    _waitForShards(futures, token, lambda: None)
+    return result
+
+
+def _sharedViews(buffer, count: int, referenceCount: int):
+    colorBytes = count * 3 * 8
+    control = np.ndarray((CONTROL_BYTES,), dtype=np.uint8, buffer=buffer)
+    colors = np.ndarray((count, 3), dtype=np.float64, buffer=buffer, offset=CONTROL_BYTES)
+    result = np.ndarray(
+        (count, 3), dtype=np.float64, buffer=buffer, offset=CONTROL_BYTES + colorBytes
+    )
+    references = None
+    if referenceCount > 0:
+        references = np.ndarray(
+            (referenceCount, 3),
+            dtype=np.float64,
+            buffer=buffer,
+            offset=CONTROL_BYTES + colorBytes * 2,
+        )
+    return control, colors, result, references
+
+
+def _transferProcesses(
+    colors,
+    fromModel: ColorModel,
+    toModel: ColorModel,
+    referenceColors,
+    clamp: bool,
+    workers: int,
+    token: CancellationToken | None,
+):
+    count = len(colors)
+    referenceCount = 0 if referenceColors is None else len(referenceColors)
+    memory = SharedMemory(
+        create=True, size=CONTROL_BYTES + (count * 2 + referenceCount) * 3 * 8
+    )
+
+    # Views must all be released before the block can be closed.
+    views = None
+    try:
+        views = _sharedViews(memory.buf, count, referenceCount)
+        control, sharedColors, sharedResult, sharedReferences = views
+        control[:] = 0
+        sharedColors[:] = colors
+        if sharedReferences is not None:
+            sharedReferences[:] = referenceColors
+
+        pool = getPool(ConversionBackend.Process, workers)
+        futures = [
+            pool.submit(
+                _convertSharedShard,
+                memory.name,
+                count,
+                referenceCount,
+                start,
+                end,
+                int(fromModel),
+                int(toModel),
+                clamp,
+            )
+            for start, end in shardBounds(count)
+        ]
+
+        def cancel():
+            control[0] = 1
+
+        _waitForShards(futures, token, cancel)
+        return sharedResult.copy()
+    finally:
+        del views
+        control = sharedColors = sharedResult = sharedReferences = None
+        memory.close()
+        memory.unlink()
+
+
+# Runs in worker processes.
+def _convertSharedShard(
+    name: str,
+    count: int,
+    referenceCount: int,
+    start: int,
+    end: int,
+    fromModel: int,
+    toModel: int,
+    clamp: bool,
+) -> bool:
+    memory = SharedMemory(name)
+    views = None
+    try:
+        views = _sharedViews(memory.buf, count, referenceCount)
+        control, colors, result, references = views
+        if control[0] != 0:
+            return False
+
+        _convertShard(
+            colors,
+            result,
+            references,
+            start,
+            end,
+            ColorModel(fromModel),
+            ColorModel(toModel),
+            clamp,
+        )
+        return True
+    finally:
+        del views
+        control = colors = result = references = None
+        memory.close()
@@ -0,0 +1,225 @@
+from collections.abc import Iterator
+import math
+
+from .models import ColorModel, transferColorModel
+from .batch_conversion import np, transferColorModelArray
+from .config import PIXEL_CHUNK_SIZE
+
+# Streaming conversion of interleaved 4 channel pixel buffers, like the ones
+# returned by `Node.pixelData` for RGBA layers.
+#
+# Buffers are only accessed through `memoryview`, `chunkPixels` pixels at a
+# time, and results are written straight into the caller's destination
+# buffer. Peak memory is a few temporaries the size of one chunk, however
+# large the image is.
+#
+# The first three channels hold a normalized color of `fromModel` in the
+# source and of `toModel` in the destination, the fourth one is alpha and is
+# copied as is. Integer channels map [0, max] to [0, 1].
+
+
+class PixelFormat:
+    def __init__(
+        self,
+        depth: str,
+        format: str,
+        itemSize: int,
+        maxValue: float,
+        order: tuple[int, int, int, int],
+    ) -> None:
+        self.depth = depth
+        # `struct` format of one channel, as used by `memoryview.cast`.
+        self.format = format
+        self.itemSize = itemSize
+        self.maxValue = maxValue
+        # Positions of the first, second, third and alpha channel within a pixel.
+        self.order = order
+        self.isInteger = format != "f"
+
+    def pixelSize(self) -> int:
+        return self.itemSize * 4
+
+
+# Krita stores integer RGBA as BGRA, and floating point RGBA as RGBA.
+PIXEL_FORMATS: dict[str, PixelFormat] = {
+    "U8": PixelFormat("U8", "B", 1, 255, (2, 1, 0, 3)),
+    "U16": PixelFormat("U16", "H", 2, 65535, (2, 1, 0, 3)),
+    "F32": PixelFormat("F32", "f", 4, 1.0, (0, 1, 2, 3)),
+}
+
+
+def getPixelFormat(depth: str) -> PixelFormat:
+    format = PIXEL_FORMATS.get(depth)
+    if format == None:
+        raise ValueError(
+            f"Unsupported pixel depth {depth}, expected one of {', '.join(PIXEL_FORMATS)}"
+        )
+    return format
+
+
+def pixelCount(buffer, depth: str) -> int:
+    return memoryview(buffer).nbytes // getPixelFormat(depth).pixelSize()
+
+
+# Converts every pixel of `source` into `destination`, yielding the number of
+# pixels done and the total after each chunk. Nothing is converted until the
+# generator is iterated, use `convertPixels` to run it to completion.
+#
+# `destination` must be a writable buffer with room for as many pixels in
+# `destinationDepth` (same as `sourceDepth` by default). It may be `source`
+# itself when both depths are the same.
+def streamConvertPixels(
+    source,
+    destination,
+    fromModel: ColorModel,
+    toModel: ColorModel,
+    sourceDepth: str = "U8",
+    destinationDepth: str | None = None,
+    referenceColor: tuple[float, float, float] | None = None,
+    clamp: bool = True,
+    chunkPixels: int = PIXEL_CHUNK_SIZE,
+) -> Iterator[tuple[int, int]]:
+    sourceFormat = getPixelFormat(sourceDepth)
+    destinationFormat = getPixelFormat(
+        sourceDepth if destinationDepth == None else destinationDepth
+    )
+    if chunkPixels < 1:
+        raise ValueError(f"Chunk size must be at least 1 pixel: {chunkPixels}")
+
+    sourceView = memoryview(source).cast("B")
+    destinationView = memoryview(destination).cast("B")
+    if destinationView.readonly:
+        raise ValueError("Destination pixel buffer is read only")
+
+    total = sourceView.nbytes // sourceFormat.pixelSize()
+    if destinationView.nbytes < total * destinationFormat.pixelSize():
+        raise ValueError(
+            f"Destination pixel buffer too small: {destinationView.nbytes} bytes "
+            f"< {total} pixels of {destinationFormat.depth}"
+        )
+
+    convertChunk = _convertChunk if np is not None else _convertChunkFallback
+    for start in range(0, total, chunkPixels):
+        end = min(start + chunkPixels, total)
+        convertChunk(
+            sourceView[
+                start * sourceFormat.pixelSize() : end * sourceFormat.pixelSize()
+            ],
+            destinationView[
+                start
+                * destinationFormat.pixelSize() : end
+                * destinationFormat.pixelSize()
+            ],
+            sourceFormat,
+            destinationFormat,
+            fromModel,
+            toModel,
+            referenceColor,
+            clamp,
+        )
+        yield end, total
+
+
+def convertPixels(
+    source,
+    destination,
+    fromModel: ColorModel,
+    toModel: ColorModel,
+    sourceDepth: str = "U8",
+    destinationDepth: str | None = None,
+    referenceColor: tuple[float, float, float] | None = None,
+    clamp: bool = True,
+    chunkPixels: int = PIXEL_CHUNK_SIZE,
+):
+    for _ in streamConvertPixels(
+        source,
+        destination,
+        fromModel,
+        toModel,
+        sourceDepth,
+        destinationDepth,
+        referenceColor,
+        clamp,
+        chunkPixels,
+    ):
+        pass
+
+
+def _convertChunk(
+    source: memoryview,
+    destination: memoryview,
+    sourceFormat: PixelFormat,
+    destinationFormat: PixelFormat,
+    fromModel: ColorModel,
+    toModel: ColorModel,
+    referenceColor: tuple[float, float, float] | None,
+    clamp: bool,
+):
+    # Both arrays are views of the buffers, not copies.
+    pixels = np.frombuffer(source, dtype=sourceFormat.format).reshape(-1, 4)
+    output = np.frombuffer(destination, dtype=destinationFormat.format).reshape(-1, 4)
+
+    so, do = sourceFormat.order, destinationFormat.order
+    colors = pixels[:, list(so[:3])] * (1.0 / sourceFormat.maxValue)
+    converted = transferColorModelArray(colors, fromModel, toModel, referenceColor, clamp)
+    # Read alpha before writing colors, `destination` may be `source`.
+    alpha = pixels[:, so[3]] * (destinationFormat.maxValue / sourceFormat.maxValue)
+
+    # NaN, which conversions without `clamp` may give, is written as 0 and
+    # infinities are clamped, casting them to integers is undefined.
+    if destinationFormat.isInteger:
+        np.multiply(converted, destinationFormat.maxValue, out=converted)
+        for values in (converted, alpha):
+            np.nan_to_num(values, copy=False)
+            np.rint(values, out=values)
+            np.clip(values, 0, destinationFormat.maxValue, out=values)
+
+    output[:, do[0]] = converted[:, 0]
+    output[:, do[1]] = converted[:, 1]
+    output[:, do[2]] = converted[:, 2]
+    output[:, do[3]] = alpha
+
+
+def _convertChunkFallback(
+    source: memoryview,
+    destination: memoryview,
+    sourceFormat: PixelFormat,
+    destinationFormat: PixelFormat,
+    fromModel: ColorModel,
+    toModel: ColorModel,
+    referenceColor: tuple[float, float, float] | None,
+    clamp: bool,
+):
+    pixels = source.cast(sourceFormat.format)
+    output = destination.cast(destinationFormat.format)
+    so, do = sourceFormat.order, destinationFormat.order
+    sourceMax, destinationMax = sourceFormat.maxValue, destinationFormat.maxValue
+
+    # Same as `_convertChunk`, NaN is written as 0 and infinities are clamped.
+    def encode(value: float) -> float:
+        if destinationFormat.isInteger:
+            if math.isnan(value):
+                return 0
+            if math.isinf(value):
+                return 0 if value < 0 else destinationMax
+            return min(max(round(value * destinationMax), 0), destinationMax)
+        return value * destinationMax
+
+    for i in range(0, len(pixels), 4):
+        color = transferColorModel(
+            (
+                pixels[i + so[0]] / sourceMax,
+                pixels[i + so[1]] / sourceMax,
+                pixels[i + so[2]] / sourceMax,
+            ),
+            fromModel,
+            toModel,
+            referenceColor,
+            clamp,
+        )
+        alpha = pixels[i + so[3]] / sourceMax
+
+        output[i + do[0]] = encode(color[0])
+        output[i + do[1]] = encode(color[1])
+        output[i + do[2]] = encode(color[2])
+        output[i + do[3]] = encode(alpha)
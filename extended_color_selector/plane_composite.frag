@@ -0,0 +1,18 @@
+#version 410 core
+
+// Composites the retained images of the plane and, when RING is defined, of
+// the ring. They have the size of the widget, so texels are fetched as is.
+
+uniform sampler2D planeImage;
+uniform sampler2D ringImage;
+out vec4 out_color;
+
+void main() {
+    ivec2 texel = ivec2(gl_FragCoord.xy);
+    vec3 color = texelFetch(planeImage, texel, 0).rgb;
+#ifdef RING
+    vec4 ring = texelFetch(ringImage, texel, 0);
+    color = mix(color, ring.rgb, ring.a);
+#endif
+    out_color = vec4(color, 1.0);
+}
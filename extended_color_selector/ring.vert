@@ -0,0 +1,20 @@
+#version 410 core
+
+// A strip of RING_SEGMENTS quads around the ring, from the center of the
+// plane, so that the ring pass doesn't run for the rest of the widget. Its
+// outer edge circumscribes the ring, and both edges leave a pixel of margin.
+
+uniform float res;
+uniform float ringThickness;
+uniform vec2 viewportSize;
+
+void main() {
+    const float PI = 3.141592653589;
+    float angle = float(gl_VertexID / 2) / float(RING_SEGMENTS) * 2.0 * PI;
+    float outer = res * 0.5 / cos(PI / float(RING_SEGMENTS)) + 1.0;
+    float inner = max(res * 0.5 - ringThickness - 1.0, 0.0);
+    float radius = gl_VertexID % 2 == 0 ? inner : outer;
+
+    vec2 pos = vec2(res * 0.5) + radius * vec2(cos(angle), sin(angle));
+    gl_Position = vec4(pos / viewportSize * 2.0 - 1.0, 0.0, 1.0);
+}
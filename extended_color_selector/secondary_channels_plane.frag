@@ -1,25 +1,30 @@
 #version 410 core
 
-uniform int primaryIndex;
+// Besides the `#define`s of `channels.glsl` and `gamut_limits.glsl`, SWAP_AXES,
+// REVERSE_X, REVERSE_Y and RING_REVERSED are each defined when their setting
+// is on. RING_PASS is defined to render the ring instead of the plane.
+
 uniform float primaryValue;
 uniform vec2 secondaryValues;
-uniform vec3 lim_min;
-uniform vec3 lim_max;
-uniform vec3 outOfGamut;
-uniform int axesConfig;
 uniform float res;
 uniform float rotation;
 uniform float ringThickness;
 uniform float ringMargin;
 uniform float ringRotation;
-uniform vec4 axesLimits;
+uniform vec3 backgroundColor;
 out vec4 out_color;
 
-const vec3 BACKGROUND_COLOR = vec3(0.0);
+// Defines `colorToSrgb`.
+#include <colorModel>
+
+// Defines `withPrimary` and `channelsToSrgb`.
+#include "shader_components/channels.glsl"
 
-vec3 colorToSrgb(vec3 color);
+// Defines `getColorCoordAndAntialias`.
+#include <shape>
 
-vec3 getColorCoordAndAntialias(vec2 p, float normalizedRingThickness);
+// Defines `axesLimitsAt`, `gamutSpanAt`, `onClippedPlane` and `fadeOffClippedPlane`.
+#include "shader_components/gamut_limits.glsl"
 
 vec4 drawWheel(vec2 p) {
     float s = sin(rotation);
@@ -29,66 +34,42 @@ vec4 drawWheel(vec2 p) {
     vec3 colorCoordAndAntialias = getColorCoordAndAntialias(p, (ringThickness + ringMargin) / (res / 2.0));
     vec2 colorCoord = colorCoordAndAntialias.xy;
 
-    if(((axesConfig >> 1) & 1) == 1) {
-        colorCoord.x = 1.0 - colorCoord.x;
-    }
-    if(((axesConfig >> 2) & 1) == 1) {
-        colorCoord.y = 1.0 - colorCoord.y;
-    }
-    if(((axesConfig >> 0) & 1) == 1) {
-        colorCoord = colorCoord.yx;
-    }
+#ifdef REVERSE_X
+    colorCoord.x = 1.0 - colorCoord.x;
+#endif
+#ifdef REVERSE_Y
+    colorCoord.y = 1.0 - colorCoord.y;
+#endif
+#ifdef SWAP_AXES
+    colorCoord = colorCoord.yx;
+#endif
     float antialias = colorCoordAndAntialias.z;
 
     if(any(lessThan(colorCoord, vec2(0.0)))) {
         return vec4(0.0);
     }
 
-    if(all(greaterThanEqual(axesLimits, vec4(0.0)))) {
-        colorCoord = mix(axesLimits.xz, axesLimits.yw, colorCoord);
-    }
-
-    vec3 t;
-    switch(primaryIndex) {
-        case 0:
-            t = vec3(primaryValue, colorCoord.x, colorCoord.y);
-            break;
-        case 1:
-            t = vec3(colorCoord.x, primaryValue, colorCoord.y);
-            break;
-        case 2:
-            t = vec3(colorCoord.x, colorCoord.y, primaryValue);
-            break;
-    }
-
-    vec3 color = mix(lim_min, lim_max, t);
-    color = colorToSrgb(color);
-    if(any(greaterThan(color, vec3(1.0))) || any(lessThan(color, vec3(0.0)))) {
-        color = all(greaterThan(outOfGamut, vec3(0.0))) ? outOfGamut : clamp(color, vec3(0.0), vec3(1.0));
-    }
-
-    return vec4(color, antialias);
+#ifdef AXES_LIMITS
+    vec4 axesLimits = axesLimitsAt(PRIMARY_INDEX, primaryValue);
+    colorCoord.y = mix(axesLimits.z, axesLimits.w, colorCoord.y);
+#ifdef GAMUT_SPANS
+    vec2 span = gamutSpanAt(PRIMARY_INDEX, primaryValue, colorCoord.y);
+    colorCoord.x = mix(span.x, span.y, colorCoord.x);
+#else
+    colorCoord.x = mix(axesLimits.x, axesLimits.y, colorCoord.x);
+#endif
+#endif
+
+    return vec4(channelsToSrgb(withPrimary(primaryValue, colorCoord)), antialias);
 }
 
 vec4 drawRing(float x, float dist) {
-    vec3 t;
-    switch(primaryIndex) {
-        case 0:
-            t = vec3(x, secondaryValues.x, secondaryValues.y);
-            break;
-        case 1:
-            t = vec3(secondaryValues.x, x, secondaryValues.y);
-            break;
-        case 2:
-            t = vec3(secondaryValues.x, secondaryValues.y, x);
-            break;
-    }
-
-    vec3 color = mix(lim_min, lim_max, t);
-    color = colorToSrgb(color);
-    if(any(greaterThan(color, vec3(1.0))) || any(lessThan(color, vec3(0.0)))) {
-        color = all(greaterThan(outOfGamut, vec3(0.0))) ? outOfGamut : clamp(color, vec3(0.0), vec3(1.0));
+    vec3 color = channelsToSrgb(withPrimary(x, secondaryValues));
+#ifdef CLIPPED_RANGE
+    if(!onClippedPlane(PRIMARY_INDEX, x, secondaryValues, FOLLOW_GAMUT_SHAPE)) {
+        color = fadeOffClippedPlane(color);
     }
+#endif
 
     const float SMOOTH = 1.5;
     float antialiasing = abs(smoothstep(res * 0.5 - ringThickness - SMOOTH, res * 0.5 - ringThickness + SMOOTH, dist) - smoothstep(res * 0.5 - SMOOTH, res * 0.5 + SMOOTH, dist));
@@ -98,30 +79,27 @@ vec4 drawRing(float x, float dist) {
 void main() {
     vec2 coord = gl_FragCoord.xy;
     vec2 uv = coord / res;
-    if(any(greaterThan(uv, vec2(1.0)))) {
-        out_color = vec4(BACKGROUND_COLOR, 1.0);
-        return;
-    }
-
     vec2 p = uv * 2.0 - 1.0;
-    float d = distance(coord, vec2(res) * 0.5);
-
-    vec3 color = BACKGROUND_COLOR;
 
-    vec4 wheel = drawWheel(p);
-    color = mix(color, wheel.rgb, wheel.a);
-
-    // --BEGIN RING RENDERING--
+#ifdef RING_PASS
+    // Only the ring, transparent elsewhere, to be composited over the plane.
+    float d = distance(coord, vec2(res) * 0.5);
+    out_color = vec4(0.0);
     if(ringThickness > 0.0 && d < res * 0.5 && d > res * 0.5 - ringThickness) {
         float ringValue = fract((atan(p.y, p.x) + ringRotation) / 2.0 / 3.141592653589 + 0.5);
-        if(((axesConfig >> 3) & 1) == 1) {
-            ringValue = 1.0 - ringValue;
-        }
+#ifdef RING_REVERSED
+        ringValue = 1.0 - ringValue;
+#endif
 
-        vec4 ring = drawRing(ringValue, d);
-        color = mix(color, ring.rgb, ring.a);
+        out_color = drawRing(ringValue, d);
+    }
+#else
+    if(any(greaterThan(uv, vec2(1.0)))) {
+        out_color = vec4(backgroundColor, 1.0);
+        return;
     }
-    // --END RING RENDERING--
 
-    out_color = vec4(color, 1.0);
+    vec4 wheel = drawWheel(p);
+    out_color = vec4(mix(backgroundColor, wheel.rgb, wheel.a), 1.0);
+#endif
 }
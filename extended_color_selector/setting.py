@@ -25,6 +25,7 @@ from krita import *  # type: ignore
 from .models import ColorModel, WheelShape
 from .config import *
 from .internal_state import STATE
+from .conversion_lut import canBakeColorLuts, colorLutReports
 
 
 class OptionalColorPicker(QWidget):
@@ -121,6 +122,14 @@ class SettingsDialog(QDialog):
                 lambda x, cm=colorModel: self.changeSetting(cm, "clipToSrgbGamut", x)
             )
 
+            gamutShapeBox = QCheckBox("Follow Gamut Shape When Clipping")
+            gamutShapeBox.setChecked(settings.clipToGamutShape)
+            gamutShapeBox.setEnabled(settings.clipToSrgbGamut)
+            gamutShapeBox.clicked.connect(
+                lambda x, cm=colorModel: self.changeSetting(cm, "clipToGamutShape", x)
+            )
+            clipGamutBox.toggled.connect(gamutShapeBox.setEnabled)
+
             shapeButtonsAndRotLayout = QHBoxLayout()
             shapesGroup = QButtonGroup()
             for shape in WheelShape:
@@ -218,8 +227,10 @@ class SettingsDialog(QDialog):
             pageLayout.addWidget(channelLockersEnabled)
             if colorModel.isNotSrgbBased():
                 pageLayout.addWidget(clipGamutBox)
+                pageLayout.addWidget(gamutShapeBox)
             else:
                 clipGamutBox.deleteLater()
+                gamutShapeBox.deleteLater()
             pageLayout.addLayout(shapeButtonsAndRotLayout)
             pageLayout.addLayout(axesSettingsLayout)
             pageLayout.addWidget(ringEnabled)
@@ -367,9 +378,28 @@ class GlobalSettingsDialog(QDialog):
         pSettingsLayouts.addLayout(pSettingsLayout2)
         portableSelectorSettingsGroup.setLayout(pSettingsLayouts)
 
+        colorLutLayout = QHBoxLayout()
+        colorLutBox = QCheckBox("Look Up Colors Of OkLab, Lab And OkLch")
+        colorLutBox.setToolTip(
+            "Draws these color models from lookup tables rather than converting "
+            "every pixel, which can be faster on weak GPUs but is slightly less "
+            "precise. Looked up colors are off by at most 6.18/255."
+        )
+        colorLutBox.setChecked(settings.colorLutEnabled)
+        colorLutBox.clicked.connect(lambda x: self.changeSetting("colorLutEnabled", x))
+        colorLutPrecisionButton = QPushButton("Precision")
+        colorLutPrecisionButton.clicked.connect(self.showColorLutPrecision)
+        if not canBakeColorLuts():
+            colorLutBox.setEnabled(False)
+            colorLutPrecisionButton.setEnabled(False)
+            colorLutBox.setToolTip("Lookup tables require NumPy.")
+        colorLutLayout.addWidget(colorLutBox)
+        colorLutLayout.addWidget(colorLutPrecisionButton)
+
         self.mainLayout.addWidget(outOfGamutColorPicker)
         self.mainLayout.addWidget(dontSyncIfOutOfGamutBox)
         self.mainLayout.addLayout(barHeightLayout)
+        self.mainLayout.addLayout(colorLutLayout)
         self.mainLayout.addWidget(portableSelectorSettingsGroup)
         self.mainLayout.addStretch(1)
 
@@ -377,5 +407,13 @@ class GlobalSettingsDialog(QDialog):
         setattr(STATE.globalSettings, name, value)
         STATE.settingsChanged.emit()
 
+    # Differences between colors looked up and converted, in 8 bit levels.
+    def showColorLutPrecision(self):
+        QMessageBox.information(
+            self,
+            "Extended Color Selector - Lookup Table Precision",
+            "\n".join([str(report) for report in colorLutReports()]),
+        )
+
     def closeEvent(self, a0: QCloseEvent | None) -> None:
         STATE.globalSettings.write()
@@ -0,0 +1,58 @@
+#version 410 core
+
+// Specialized with the `#define`s of the settings the shader was built for:
+//
+//   PRIMARY_INDEX        index of the primary channel
+//   LIM_MIN, LIM_MAX     limits of the channels of the color model, as vec3
+//   OUT_OF_GAMUT_COLOR   defined when out of gamut colors are drawn with
+//                        `outOfGamut` instead of being clamped
+//   COLOR_LUT            defined when colors inside the domain of `colorLut`
+//                        are looked up rather than converted
+
+uniform vec3 outOfGamut;
+
+#ifdef COLOR_LUT
+// sRGB of the normalized colors from `colorLutMin` to `colorLutMax`, and in
+// alpha their signed distance to the sRGB gamut, negative out of it. The first
+// channel is the depth of the texture.
+uniform sampler3D colorLut;
+uniform vec3 colorLutMin;
+uniform vec3 colorLutMax;
+#endif
+
+// Normalized channels of the color with `primary` and `secondary` values.
+vec3 withPrimary(float primary, vec2 secondary) {
+#if PRIMARY_INDEX == 0
+    return vec3(primary, secondary.x, secondary.y);
+#elif PRIMARY_INDEX == 1
+    return vec3(secondary.x, primary, secondary.y);
+#else
+    return vec3(secondary.x, secondary.y, primary);
+#endif
+}
+
+// sRGB of normalized channels, out of gamut ones clamped or replaced.
+vec3 channelsToSrgb(vec3 t) {
+#ifdef COLOR_LUT
+    vec3 p = (t - colorLutMin) / (colorLutMax - colorLutMin);
+    if(all(greaterThanEqual(p, vec3(0.0))) && all(lessThanEqual(p, vec3(1.0)))) {
+        vec3 size = vec3(textureSize(colorLut, 0));
+        vec4 texel = texture(colorLut, ((p * (size - 1.0) + 0.5) / size).zyx);
+#ifdef OUT_OF_GAMUT_COLOR
+        if(texel.a < 0.0) {
+            return outOfGamut;
+        }
+#endif
+        return clamp(texel.rgb, vec3(0.0), vec3(1.0));
+    }
+#endif
+    vec3 color = colorToSrgb(mix(LIM_MIN, LIM_MAX, t));
+    if(any(greaterThan(color, vec3(1.0))) || any(lessThan(color, vec3(0.0)))) {
+#ifdef OUT_OF_GAMUT_COLOR
+        color = outOfGamut;
+#else
+        color = clamp(color, vec3(0.0), vec3(1.0));
+#endif
+    }
+    return color;
+}
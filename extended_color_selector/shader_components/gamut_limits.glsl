@@ -0,0 +1,58 @@
+#version 410 core
+
+// Specialized with the `#define`s of the gamut tables the shader was built
+// with:
+//
+//   AXES_LIMITS     defined when the plane is clipped to `axesLimitsTable`
+//   GAMUT_SPANS     defined when it also follows the spans of `gamutSpansTable`
+//   CLIPPED_RANGE   defined when values off the clipped plane are faded out
+
+#ifdef GAMUT_SPANS
+#define FOLLOW_GAMUT_SHAPE true
+#else
+#define FOLLOW_GAMUT_SHAPE false
+#endif
+
+// minX, maxX, minY, maxY of the in gamut region for every value of the
+// primary channel (columns), one row per primary channel.
+uniform sampler2D axesLimitsTable;
+// minX, maxX of the in gamut region for every row of the y axis (columns),
+// one row per value of the primary channel, primary channels one after another.
+uniform sampler2D gamutSpansTable;
+
+vec4 axesLimitsAt(int primary, float primaryValue) {
+    int segments = textureSize(axesLimitsTable, 0).x - 1;
+    float a = clamp(primaryValue, 0.0, 1.0) * float(segments);
+    int i = min(int(a), segments - 1);
+    vec4 lower = texelFetch(axesLimitsTable, ivec2(i, primary), 0);
+    vec4 upper = texelFetch(axesLimitsTable, ivec2(i + 1, primary), 0);
+    return mix(lower, upper, a - float(i));
+}
+
+vec2 gamutSpanAt(int primary, float primaryValue, float y) {
+    ivec2 size = textureSize(gamutSpansTable, 0);
+    int values = size.y / 3;
+    float a = clamp(primaryValue, 0.0, 1.0) * float(values - 1);
+    int i = min(int(a), values - 2);
+    float row = clamp(y, 0.0, 1.0) * float(size.x - 1);
+    int r = min(int(row), size.x - 2);
+
+    int v = primary * values + i;
+    vec2 lower = mix(texelFetch(gamutSpansTable, ivec2(r, v), 0).xy, texelFetch(gamutSpansTable, ivec2(r + 1, v), 0).xy, row - float(r));
+    vec2 upper = mix(texelFetch(gamutSpansTable, ivec2(r, v + 1), 0).xy, texelFetch(gamutSpansTable, ivec2(r + 1, v + 1), 0).xy, row - float(r));
+    return mix(lower, upper, a - float(i));
+}
+
+// Whether `secondaryValues` lie on the clipped plane of `primaryValue`, in its
+// bounding box or, when `followShape`, in the span of its row.
+bool onClippedPlane(int primary, float primaryValue, vec2 secondaryValues, bool followShape) {
+    const float EPSILON = 1e-4;
+    vec4 limits = axesLimitsAt(primary, primaryValue);
+    vec2 span = followShape ? gamutSpanAt(primary, primaryValue, secondaryValues.y) : limits.xy;
+    return secondaryValues.y >= limits.z - EPSILON && secondaryValues.y <= limits.w + EPSILON && secondaryValues.x >= span.x - EPSILON && secondaryValues.x <= span.y + EPSILON;
+}
+
+// Colors the plane can't reach are faded out on the bar and the ring.
+vec3 fadeOffClippedPlane(vec3 color) {
+    return mix(color, vec3(0.5), 0.75);
+}
@@ -0,0 +1,130 @@
+from pathlib import Path
+import re
+
+# Assembly of shaders from the GLSL sources of the plugin.
+#
+# Sources are read from disk once, on first use, and kept. Their `#version`
+# line is parsed off, the version header of the context is added before
+# compiling. The other directives are resolved when assembling, one per line:
+#
+#   #include "path"   replaced with the source at `path`, relative to the
+#                     plugin directory, like `shader_components/gamut_limits.glsl`
+#   #include <slot>   replaced with the source given for `slot` when
+#                     assembling, like the color model or the wheel shape
+#
+# A source is only included once per shader, later includes of it are
+# dropped. Sources that can't be read, slots that aren't given, and slots given
+# but never included, all raise `ShaderSourceError` rather than building a
+# shader that fails to compile, or silently misses a component.
+#
+# Assembled shaders are kept by their name, slots and defines, so that
+# rebuilding the program of a previous color model or shape doesn't assemble
+# it again.
+
+SHADER_SOURCES_DIRECTORY = Path(__file__).parent
+
+INCLUDE_DIRECTIVE = re.compile(r'^[ \t]*#[ \t]*include[ \t]+(?:"([^"]*)"|<([^>]*)>)[ \t]*$')
+VERSION_DIRECTIVE = re.compile(r"^[ \t]*#[ \t]*version\b(.*)$")
+
+
+class ShaderSourceError(Exception):
+    pass
+
+
+# Sources read so far, without their version line, by path.
+SHADER_SOURCES: dict[str, str] = {}
+ASSEMBLED_SHADERS: dict[tuple, str] = {}
+
+
+# Splits the `#version` directive off `source`. It may only be preceded by
+# blank lines and comments. Returns the version, like "410 core", and the rest
+# of the source, or `None` and the whole source when there's no directive.
+def splitVersion(source: str) -> tuple[str | None, str]:
+    lines = source.splitlines(keepends=True)
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped == "" or stripped.startswith("//"):
+            continue
+        match = VERSION_DIRECTIVE.match(line)
+        if match == None:
+            break
+        return match.group(1).strip(), "".join(lines[:i] + lines[i + 1 :])
+    return None, source
+
+
+def loadShaderSource(path: str) -> str:
+    source = SHADER_SOURCES.get(path)
+    if source == None:
+        try:
+            text = (SHADER_SOURCES_DIRECTORY / path).read_text(encoding="utf-8")
+        except OSError as e:
+            raise ShaderSourceError(f"Unable to read shader source {path}: {e}") from e
+        _, source = splitVersion(text)
+        SHADER_SOURCES[path] = source
+    return source
+
+
+# Source of the shader at `path` with its includes resolved, `slots` mapping
+# the name of every `#include <slot>` to the path of its source. `defines`
+# are added as `#define name value` lines before the shader. The version
+# header isn't included.
+def assembleShader(
+    path: str,
+    slots: dict[str, str] | None = None,
+    defines: dict[str, str] | None = None,
+) -> str:
+    slots = {} if slots == None else slots
+    defines = {} if defines == None else defines
+    key = (path, tuple(sorted(slots.items())), tuple(sorted(defines.items())))
+    shader = ASSEMBLED_SHADERS.get(key)
+    if shader != None:
+        return shader
+
+    included: set[str] = set()
+    usedSlots: set[str] = set()
+    lines = [f"#define {name} {value}\n" for name, value in defines.items()]
+    _include(path, slots, included, usedSlots, [], lines)
+
+    unused = sorted(set(slots) - usedSlots)
+    if len(unused) > 0:
+        raise ShaderSourceError(f"{path} has no include for {', '.join(unused)}")
+
+    shader = "".join(lines)
+    ASSEMBLED_SHADERS[key] = shader
+    return shader
+
+
+def clearShaderSources():
+    SHADER_SOURCES.clear()
+    ASSEMBLED_SHADERS.clear()
+
+
+def _include(
+    path: str,
+    slots: dict[str, str],
+    included: set[str],
+    usedSlots: set[str],
+    stack: list[str],
+    lines: list[str],
+):
+    if path in stack:
+        raise ShaderSourceError(f"{' -> '.join(stack + [path])} includes itself")
+    if path in included:
+        return
+    included.add(path)
+
+    stack.append(path)
+    for number, line in enumerate(loadShaderSource(path).splitlines(), 1):
+        match = INCLUDE_DIRECTIVE.match(line)
+        if match == None:
+            lines.append(line + "\n")
+            continue
+
+        target, slot = match.groups()
+        if slot != None:
+            target = slots.get(slot)
+            if target == None:
+                raise ShaderSourceError(f"{path}:{number} includes unknown slot <{slot}>")
+            usedSlots.add(slot)
+        _include(target, slots, included, usedSlots, stack, lines)
+    stack.pop()
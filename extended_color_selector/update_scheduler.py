@@ -0,0 +1,188 @@
+from PyQt5.QtCore import QEvent, QObject, QTimer, Qt, pyqtBoundSignal
+from PyQt5.QtGui import QGuiApplication
+from PyQt5.QtWidgets import QWidget
+from typing import Callable
+import math
+import time
+
+from .config import (
+    DOCKER_NAME,
+    LOG_UPDATE_COUNTS,
+    UPDATE_FRAME_INTERVAL_MS,
+)
+
+# Signals like `STATE.colorChanged` are emitted for every mouse or tablet
+# event while dragging, often several times per display frame. Consumers
+# subscribed here are only marked dirty by them, and called once at the next
+# frame, however many times the signal was emitted in between. Slow consumers
+# can be given a minimum interval between calls, they're called at most that
+# often, and once more after the last emit. Consumers owned by a hidden widget
+# stay dirty until it's shown again, so that hidden selectors cost nothing.
+
+
+# How many times every consumer was asked to update, actually updated, and
+# how many times its view painted.
+class UpdateCounters:
+    def __init__(self) -> None:
+        self.emits: dict[str, int] = {}
+        self.runs: dict[str, int] = {}
+        self.paints: dict[str, int] = {}
+        # Counts at the last log, to log the counts of the last second.
+        self.logged: tuple[dict[str, int], dict[str, int], dict[str, int]] = (
+            {},
+            {},
+            {},
+        )
+        self.lastLog = time.perf_counter()
+
+    def emitted(self, name: str):
+        self.emits[name] = self.emits.get(name, 0) + 1
+
+    def ran(self, name: str):
+        self.runs[name] = self.runs.get(name, 0) + 1
+
+    def painted(self, name: str):
+        self.paints[name] = self.paints.get(name, 0) + 1
+        if LOG_UPDATE_COUNTS and time.perf_counter() - self.lastLog >= 1.0:
+            self.log()
+
+    # Counts of every consumer since `since`, like
+    # `plane 120 emits, 31 runs, 31 paints`.
+    def summary(
+        self,
+        since: tuple[dict[str, int], dict[str, int], dict[str, int]] = ({}, {}, {}),
+    ) -> str:
+        counts = self.emits, self.runs, self.paints
+        names = list(dict.fromkeys(list(self.emits) + list(self.paints)))
+        return ", ".join(
+            [
+                f"{name} "
+                + ", ".join(
+                    [
+                        f"{count.get(name, 0) - previous.get(name, 0)} {kind}"
+                        for count, previous, kind in zip(
+                            counts, since, ("emits", "runs", "paints")
+                        )
+                    ]
+                )
+                for name in names
+            ]
+        )
+
+    def log(self):
+        now = time.perf_counter()
+        print(
+            f"{DOCKER_NAME}: in {now - self.lastLog:.1f} s, "
+            f"{self.summary(self.logged)}"
+        )
+        self.logged = dict(self.emits), dict(self.runs), dict(self.paints)
+        self.lastLog = now
+
+
+# A subscribed callback, dirty from the first emit until it's called.
+class Consumer:
+    def __init__(self, name: str, callback: Callable[[], None], interval: int):
+        self.name = name
+        self.callback = callback
+        owner = getattr(callback, "__self__", None)
+        self.owner = owner if isinstance(owner, QObject) else None
+        # Minimum milliseconds between calls, 0 for every frame.
+        self.interval = interval
+        self.dirty = False
+        self.lastRun = -math.inf
+
+
+class UpdateScheduler(QObject):
+    def __init__(self) -> None:
+        super().__init__()
+        self.consumers: list[Consumer] = []
+        self.counters = UpdateCounters()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self.flush)
+
+    # Calls `callback` at the next frame after `signal` is emitted, and at
+    # most once per `interval` milliseconds. Consumers owned by a widget are
+    # dropped along with it.
+    def subscribe(
+        self,
+        signal: pyqtBoundSignal,
+        name: str,
+        callback: Callable[[], None],
+        interval: int = 0,
+    ):
+        consumer = Consumer(name, callback, interval)
+        self.consumers.append(consumer)
+        markDirty = lambda *_: self.markDirty(consumer)
+        signal.connect(markDirty)
+
+        if consumer.owner != None:
+            consumer.owner.destroyed.connect(
+                lambda *_: self.unsubscribe(consumer, signal, markDirty)
+            )
+            consumer.owner.installEventFilter(self)
+
+    def unsubscribe(
+        self, consumer: Consumer, signal: pyqtBoundSignal, markDirty: Callable
+    ):
+        signal.disconnect(markDirty)
+        self.consumers.remove(consumer)
+
+    def markDirty(self, consumer: Consumer):
+        self.counters.emitted(consumer.name)
+        consumer.dirty = True
+        # A throttled consumer may be waiting longer than a frame.
+        interval = frameInterval()
+        if not self.timer.isActive() or self.timer.remainingTime() > interval:
+            self.timer.start(interval)
+
+    # Flushes consumers left dirty while their widget was hidden.
+    def eventFilter(self, a0: QObject | None, a1: QEvent | None) -> bool:
+        if (
+            a1 != None
+            and a1.type() == QEvent.Type.Show
+            and any([c.dirty and c.owner == a0 for c in self.consumers])
+        ):
+            self.timer.start(0)
+        return False
+
+    # Calls every dirty consumer whose interval has elapsed, and waits for
+    # the earliest of the others.
+    def flush(self):
+        now = time.perf_counter() * 1000
+        wait = None
+        for consumer in list(self.consumers):
+            if not consumer.dirty or suspended(consumer):
+                continue
+            remaining = consumer.lastRun + consumer.interval - now
+            if remaining > 0:
+                wait = remaining if wait == None else min(wait, remaining)
+                continue
+
+            consumer.dirty = False
+            consumer.lastRun = now
+            self.counters.ran(consumer.name)
+            consumer.callback()
+
+        if wait != None:
+            self.timer.start(max(int(wait + 0.5), frameInterval()))
+
+
+def suspended(consumer: Consumer) -> bool:
+    return isinstance(consumer.owner, QWidget) and not consumer.owner.isVisible()
+
+
+# Milliseconds between frames of the primary screen, or
+# `UPDATE_FRAME_INTERVAL_MS` when set.
+def frameInterval() -> int:
+    if UPDATE_FRAME_INTERVAL_MS != None:
+        return UPDATE_FRAME_INTERVAL_MS
+    screen = QGuiApplication.primaryScreen()
+    refreshRate = screen.refreshRate() if screen != None else 0.0
+    if refreshRate <= 0.0:
+        refreshRate = 60.0
+    return max(int(1000 / refreshRate), 1)
+
+
+UPDATE_SCHEDULER = UpdateScheduler()